@@ -0,0 +1,32 @@
+"""Add refresh lease column to tiktok_accounts
+
+Revision ID: 1e6b9d4f7a23
+Revises: 3c8a5f2e9b61
+Create Date: 2026-10-18 19:02:16.547903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1e6b9d4f7a23'
+down_revision: Union[str, None] = '3c8a5f2e9b61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    columns = [column['name'] for column in inspector.get_columns('tiktok_accounts')]
+
+    if 'refreshing_until' not in columns:
+        op.add_column('tiktok_accounts', sa.Column('refreshing_until', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('tiktok_accounts', 'refreshing_until')
@@ -0,0 +1,32 @@
+"""Add composite index on contents (user_id, scheduled_time)
+
+Revision ID: 3c8a5f2e9b61
+Revises: 5e9d2b7c4a18
+Create Date: 2026-10-18 18:27:44.086219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c8a5f2e9b61'
+down_revision: Union[str, None] = '5e9d2b7c4a18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+
+    # The calendar fetches one user's posts for the visible date range
+    if 'ix_contents_user_id_scheduled_time' not in [index['name'] for index in inspector.get_indexes('contents')]:
+        op.create_index('ix_contents_user_id_scheduled_time', 'contents', ['user_id', 'scheduled_time'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contents_user_id_scheduled_time', table_name='contents')
@@ -0,0 +1,38 @@
+"""Add refresh token and expiry columns to tiktok_accounts
+
+Revision ID: 4f7c2b9e1d36
+Revises: 8b3e6f1d2a94
+Create Date: 2026-10-18 14:10:52.381046
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f7c2b9e1d36'
+down_revision: Union[str, None] = '8b3e6f1d2a94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    columns = [column['name'] for column in inspector.get_columns('tiktok_accounts')]
+
+    if 'refresh_token' not in columns:
+        op.add_column('tiktok_accounts', sa.Column('refresh_token', sa.String(length=500), nullable=True))
+    if 'access_token_expires_at' not in columns:
+        op.add_column('tiktok_accounts', sa.Column('access_token_expires_at', sa.DateTime(), nullable=True))
+    if 'refresh_token_expires_at' not in columns:
+        op.add_column('tiktok_accounts', sa.Column('refresh_token_expires_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('tiktok_accounts', 'refresh_token_expires_at')
+    op.drop_column('tiktok_accounts', 'access_token_expires_at')
+    op.drop_column('tiktok_accounts', 'refresh_token')
@@ -0,0 +1,45 @@
+"""Add upload_sessions table for resumable uploads
+
+Revision ID: 5e9d2b7c4a18
+Revises: a3f6c18e5d72
+Create Date: 2026-10-18 16:41:09.553120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e9d2b7c4a18'
+down_revision: Union[str, None] = 'a3f6c18e5d72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+
+    if 'upload_sessions' not in inspector.get_table_names():
+        op.create_table(
+            'upload_sessions',
+            sa.Column('id', sa.String(length=32), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('filename', sa.String(length=255), nullable=False),
+            sa.Column('length', sa.BigInteger(), nullable=False),
+            sa.Column('offset', sa.BigInteger(), nullable=False, server_default='0'),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('expires_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+        # Purging abandoned uploads scans WHERE expires_at < now
+        op.create_index(op.f('ix_upload_sessions_expires_at'), 'upload_sessions', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_upload_sessions_expires_at'), table_name='upload_sessions')
+    op.drop_table('upload_sessions')
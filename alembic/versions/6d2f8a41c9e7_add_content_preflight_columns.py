@@ -0,0 +1,38 @@
+"""Add pre-flight media columns to contents
+
+Revision ID: 6d2f8a41c9e7
+Revises: e51b7d9c3a48
+Create Date: 2026-10-18 13:02:44.218391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d2f8a41c9e7'
+down_revision: Union[str, None] = 'e51b7d9c3a48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    columns = [column['name'] for column in inspector.get_columns('contents')]
+
+    if 'media_size' not in columns:
+        op.add_column('contents', sa.Column('media_size', sa.BigInteger(), nullable=True))
+    if 'media_checksum' not in columns:
+        op.add_column('contents', sa.Column('media_checksum', sa.String(length=64), nullable=True))
+    if 'prepared_at' not in columns:
+        op.add_column('contents', sa.Column('prepared_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('contents', 'prepared_at')
+    op.drop_column('contents', 'media_checksum')
+    op.drop_column('contents', 'media_size')
@@ -0,0 +1,32 @@
+"""Add publish_tolerance_seconds to users
+
+Revision ID: 8b3e6f1d2a94
+Revises: 6d2f8a41c9e7
+Create Date: 2026-10-18 13:41:19.604127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b3e6f1d2a94'
+down_revision: Union[str, None] = '6d2f8a41c9e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    columns = [column['name'] for column in inspector.get_columns('users')]
+
+    if 'publish_tolerance_seconds' not in columns:
+        op.add_column('users', sa.Column('publish_tolerance_seconds', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'publish_tolerance_seconds')
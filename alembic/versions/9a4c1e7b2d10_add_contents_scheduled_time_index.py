@@ -0,0 +1,32 @@
+"""Add index on contents.scheduled_time
+
+Revision ID: 9a4c1e7b2d10
+Revises: 2cb40e7d48c4
+Create Date: 2026-10-18 10:12:31.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4c1e7b2d10'
+down_revision: Union[str, None] = '2cb40e7d48c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+
+    # The dispatcher refills its window with a range scan on scheduled_time
+    if 'ix_contents_scheduled_time' not in [index['name'] for index in inspector.get_indexes('contents')]:
+        op.create_index('ix_contents_scheduled_time', 'contents', ['scheduled_time'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contents_scheduled_time', table_name='contents')
@@ -0,0 +1,43 @@
+"""Add idempotency columns to contents
+
+Revision ID: b7e2d4a9c153
+Revises: 4f7c2b9e1d36
+Create Date: 2026-10-18 14:38:06.917254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2d4a9c153'
+down_revision: Union[str, None] = '4f7c2b9e1d36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    columns = [column['name'] for column in inspector.get_columns('contents')]
+
+    if 'publish_key' not in columns:
+        op.add_column('contents', sa.Column('publish_key', sa.String(length=64), nullable=True))
+    if 'publish_id' not in columns:
+        op.add_column('contents', sa.Column('publish_id', sa.String(length=64), nullable=True))
+    if 'publishing_started_at' not in columns:
+        op.add_column('contents', sa.Column('publishing_started_at', sa.DateTime(), nullable=True))
+
+    # One publish attempt key can only ever be taken once
+    if 'uq_contents_publish_key' not in [constraint['name'] for constraint in inspector.get_unique_constraints('contents')]:
+        op.create_unique_constraint('uq_contents_publish_key', 'contents', ['publish_key'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_contents_publish_key', 'contents', type_='unique')
+    op.drop_column('contents', 'publishing_started_at')
+    op.drop_column('contents', 'publish_id')
+    op.drop_column('contents', 'publish_key')
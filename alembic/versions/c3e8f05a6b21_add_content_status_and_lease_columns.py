@@ -0,0 +1,43 @@
+"""Add status and lease columns to contents
+
+Revision ID: c3e8f05a6b21
+Revises: 9a4c1e7b2d10
+Create Date: 2026-10-18 11:04:52.718230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e8f05a6b21'
+down_revision: Union[str, None] = '9a4c1e7b2d10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    columns = [column['name'] for column in inspector.get_columns('contents')]
+
+    if 'status' not in columns:
+        op.add_column('contents', sa.Column('status', sa.String(20), nullable=False, server_default='scheduled'))
+    if 'claimed_by' not in columns:
+        op.add_column('contents', sa.Column('claimed_by', sa.String(255), nullable=True))
+    if 'lease_until' not in columns:
+        op.add_column('contents', sa.Column('lease_until', sa.DateTime(), nullable=True))
+
+    # Workers claim with WHERE status = ... AND scheduled_time <= now ORDER BY scheduled_time
+    if 'ix_contents_status_scheduled_time' not in [index['name'] for index in inspector.get_indexes('contents')]:
+        op.create_index('ix_contents_status_scheduled_time', 'contents', ['status', 'scheduled_time'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contents_status_scheduled_time', table_name='contents')
+    op.drop_column('contents', 'lease_until')
+    op.drop_column('contents', 'claimed_by')
+    op.drop_column('contents', 'status')
@@ -0,0 +1,62 @@
+"""Add content_series table and contents.series_id
+
+Revision ID: d94a1c6e8f27
+Revises: b7e2d4a9c153
+Create Date: 2026-10-18 15:12:33.472910
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd94a1c6e8f27'
+down_revision: Union[str, None] = 'b7e2d4a9c153'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+
+    if 'content_series' not in inspector.get_table_names():
+        op.create_table(
+            'content_series',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('platform', sa.String(length=50), nullable=False),
+            sa.Column('media_url', sa.String(length=255), nullable=False),
+            sa.Column('title', sa.String(length=255), nullable=True),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('tags', sa.String(length=255), nullable=True),
+            sa.Column('rrule', sa.String(length=500), nullable=False),
+            sa.Column('dtstart', sa.DateTime(), nullable=False),
+            sa.Column('next_occurrence_at', sa.DateTime(), nullable=True),
+            sa.Column('active', sa.Boolean(), nullable=False, server_default='1'),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_content_series_id'), 'content_series', ['id'], unique=False)
+        # Expansion scans WHERE active AND next_occurrence_at <= horizon
+        op.create_index('ix_content_series_active_next_occurrence_at', 'content_series', ['active', 'next_occurrence_at'])
+
+    columns = [column['name'] for column in inspector.get_columns('contents')]
+    if 'series_id' not in columns:
+        op.add_column('contents', sa.Column('series_id', sa.Integer(), nullable=True))
+        op.create_foreign_key('fk_contents_series_id', 'contents', 'content_series', ['series_id'], ['id'])
+    if 'uq_contents_series_occurrence' not in [constraint['name'] for constraint in inspector.get_unique_constraints('contents')]:
+        op.create_unique_constraint('uq_contents_series_occurrence', 'contents', ['series_id', 'scheduled_time'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_contents_series_occurrence', 'contents', type_='unique')
+    op.drop_constraint('fk_contents_series_id', 'contents', type_='foreignkey')
+    op.drop_column('contents', 'series_id')
+    op.drop_index('ix_content_series_active_next_occurrence_at', table_name='content_series')
+    op.drop_index(op.f('ix_content_series_id'), table_name='content_series')
+    op.drop_table('content_series')
@@ -0,0 +1,43 @@
+"""Add retry tracking columns to contents
+
+Revision ID: e51b7d9c3a48
+Revises: c3e8f05a6b21
+Create Date: 2026-10-18 12:21:07.553914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e51b7d9c3a48'
+down_revision: Union[str, None] = 'c3e8f05a6b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    columns = [column['name'] for column in inspector.get_columns('contents')]
+
+    if 'attempt_count' not in columns:
+        op.add_column('contents', sa.Column('attempt_count', sa.Integer(), nullable=False, server_default='0'))
+    if 'next_attempt_at' not in columns:
+        op.add_column('contents', sa.Column('next_attempt_at', sa.DateTime(), nullable=True))
+    if 'last_error' not in columns:
+        op.add_column('contents', sa.Column('last_error', sa.Text(), nullable=True))
+
+    # Retry pickup scans WHERE status = 'retry' AND next_attempt_at <= now
+    if 'ix_contents_status_next_attempt_at' not in [index['name'] for index in inspector.get_indexes('contents')]:
+        op.create_index('ix_contents_status_next_attempt_at', 'contents', ['status', 'next_attempt_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contents_status_next_attempt_at', table_name='contents')
+    op.drop_column('contents', 'last_error')
+    op.drop_column('contents', 'next_attempt_at')
+    op.drop_column('contents', 'attempt_count')
@@ -14,6 +14,120 @@ class Settings:
     # Construct the database URL for MySQL
     SQLALCHEMY_DATABASE_URL = f"mysql+mysqldb://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+    # "web" for the FastAPI app, "worker" for `python -m app.worker`
+    PROCESS_ROLE = os.getenv("PROCESS_ROLE", "web")
+    # Set to false when a separate app.worker process does the publishing
+    RUN_SCHEDULER_IN_WEB = os.getenv("RUN_SCHEDULER_IN_WEB", "true").lower() == "true"
+
+    # Connection pool per process; the worker reads WORKER_DB_POOL_SIZE / WORKER_DB_MAX_OVERFLOW
+    _POOL_ENV_PREFIX = "WORKER_" if PROCESS_ROLE == "worker" else ""
+    DB_POOL_SIZE = int(os.getenv(f"{_POOL_ENV_PREFIX}DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.getenv(f"{_POOL_ENV_PREFIX}DB_MAX_OVERFLOW", 10))
+    # Seconds a checkout waits for a free connection before raising
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+    # Connections older than this are replaced, ahead of MySQL's wait_timeout
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    # Liveness check on checkout: "always" (every checkout), "idle" (only after DB_PRE_PING_IDLE_SECONDS unused), "off"
+    DB_PRE_PING = os.getenv("DB_PRE_PING", "idle").lower()
+    DB_PRE_PING_IDLE_SECONDS = float(os.getenv("DB_PRE_PING_IDLE_SECONDS", 30))
+    # Async driver URL for request handlers; defaults to the same MySQL database via aiomysql
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+
+    # Publishing engine: max posts in flight and shared HTTP client pool size
+    PUBLISH_CONCURRENCY = int(os.getenv("PUBLISH_CONCURRENCY", 50))
+    PUBLISH_HTTP_MAX_CONNECTIONS = int(os.getenv("PUBLISH_HTTP_MAX_CONNECTIONS", 100))
+    PUBLISH_HTTP_TIMEOUT = float(os.getenv("PUBLISH_HTTP_TIMEOUT", 60))
+
+    # Outbound TikTok pacing: per account (keyed by openid) and app-wide; 0 turns a limit off.
+    # These are totals for the whole app. Limiters are per process, so each publishing process
+    # (every worker, plus the web app when RUN_SCHEDULER_IN_WEB) enforces 1/TIKTOK_RATE_WORKERS of them:
+    # set it to the number of processes that publish.
+    TIKTOK_RATE_WORKERS = max(int(os.getenv("TIKTOK_RATE_WORKERS", 1)), 1)
+    TIKTOK_ACCOUNT_RATE_PER_MINUTE = float(os.getenv("TIKTOK_ACCOUNT_RATE_PER_MINUTE", 6))
+    TIKTOK_ACCOUNT_BURST = float(os.getenv("TIKTOK_ACCOUNT_BURST", 6))
+    TIKTOK_GLOBAL_RATE_PER_MINUTE = float(os.getenv("TIKTOK_GLOBAL_RATE_PER_MINUTE", 600))
+    TIKTOK_GLOBAL_BURST = float(os.getenv("TIKTOK_GLOBAL_BURST", 60))
+
+    # TikTok app credentials, also used by the worker to refresh access tokens
+    TIKTOK_CLIENT_KEY = os.getenv("TIKTOK_CLIENT_KEY")
+    TIKTOK_CLIENT_SECRET = os.getenv("TIKTOK_CLIENT_SECRET")
+    # Refresh tokens of accounts with posts due within this window, before they expire
+    TOKEN_REFRESH_WINDOW_MINUTES = int(os.getenv("TOKEN_REFRESH_WINDOW_MINUTES", 120))
+    TOKEN_REFRESH_POLL_SECONDS = int(os.getenv("TOKEN_REFRESH_POLL_SECONDS", 300))
+    TOKEN_REFRESH_BATCH_SIZE = int(os.getenv("TOKEN_REFRESH_BATCH_SIZE", 500))
+    TOKEN_REFRESH_CONCURRENCY = int(os.getenv("TOKEN_REFRESH_CONCURRENCY", 20))
+    # How long a worker holds an account while refreshing it; a crashed worker's claim lapses after this
+    TOKEN_REFRESH_LEASE_SECONDS = int(os.getenv("TOKEN_REFRESH_LEASE_SECONDS", 300))
+
+    # Incoming uploads: streamed to disk as the body arrives, rejected with 413 past these sizes
+    MAX_MEDIA_UPLOAD_BYTES = int(os.getenv("MAX_MEDIA_UPLOAD_BYTES", 1024 * 1024 * 1024))
+    MAX_PROFILE_PHOTO_BYTES = int(os.getenv("MAX_PROFILE_PHOTO_BYTES", 5 * 1024 * 1024))
+    # Media storage: "local" (static/ on this machine) or "s3" (any S3-compatible endpoint, e.g. MinIO)
+    MEDIA_STORAGE_BACKEND = os.getenv("MEDIA_STORAGE_BACKEND", "local")
+    MEDIA_S3_BUCKET = os.getenv("MEDIA_S3_BUCKET")
+    MEDIA_S3_PREFIX = os.getenv("MEDIA_S3_PREFIX", "")
+    MEDIA_S3_ENDPOINT_URL = os.getenv("MEDIA_S3_ENDPOINT_URL")  # e.g. http://minio:9000
+    MEDIA_S3_REGION = os.getenv("MEDIA_S3_REGION")
+    # Unfinished uploads; share it between web nodes (or use sticky sessions) for resumable uploads
+    MEDIA_STAGING_DIR = os.getenv("MEDIA_STAGING_DIR", os.path.join(os.getcwd(), "media_staging"))
+    # Processes decoding and resizing profile photos
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+    # Resumable uploads: suggested PATCH size, and how long an unfinished upload is kept
+    RESUMABLE_CHUNK_SIZE = int(os.getenv("RESUMABLE_CHUNK_SIZE", 8 * 1024 * 1024))
+    RESUMABLE_UPLOAD_TTL_HOURS = int(os.getenv("RESUMABLE_UPLOAD_TTL_HOURS", 24))
+
+    # Chunked FILE_UPLOAD publishing
+    TIKTOK_UPLOAD_CHUNK_SIZE = int(os.getenv("TIKTOK_UPLOAD_CHUNK_SIZE", 10 * 1024 * 1024))
+    TIKTOK_CHUNK_MAX_RETRIES = int(os.getenv("TIKTOK_CHUNK_MAX_RETRIES", 3))
+    TIKTOK_PRIVACY_LEVEL = os.getenv("TIKTOK_PRIVACY_LEVEL", "SELF_ONLY")
+
+    # "jobs": one persisted APScheduler job per post; "dispatcher": rolling in-memory window;
+    # "claim": workers lease due rows with SELECT ... FOR UPDATE SKIP LOCKED (multi-node safe)
+    SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "jobs")
+    DISPATCH_WINDOW_MINUTES = int(os.getenv("DISPATCH_WINDOW_MINUTES", 10))
+    DISPATCH_REFILL_SECONDS = int(os.getenv("DISPATCH_REFILL_SECONDS", 60))
+    DISPATCH_TICK_SECONDS = int(os.getenv("DISPATCH_TICK_SECONDS", 1))
+    CLAIM_BATCH_SIZE = int(os.getenv("CLAIM_BATCH_SIZE", 100))
+    CLAIM_LEASE_SECONDS = int(os.getenv("CLAIM_LEASE_SECONDS", 600))
+    CLAIM_POLL_SECONDS = int(os.getenv("CLAIM_POLL_SECONDS", 2))
+    JOB_STORE_POLL_SECONDS = int(os.getenv("JOB_STORE_POLL_SECONDS", 5))
+
+    # Pre-flight: validate and hash media this long before scheduled_time (0 disables)
+    PREFLIGHT_LEAD_MINUTES = int(os.getenv("PREFLIGHT_LEAD_MINUTES", 15))
+    PREFLIGHT_POLL_SECONDS = int(os.getenv("PREFLIGHT_POLL_SECONDS", 60))
+    PREFLIGHT_BATCH_SIZE = int(os.getenv("PREFLIGHT_BATCH_SIZE", 100))
+
+    # Burst smoothing (opt-in): spread posts over up to this many seconds after the chosen
+    # time; users can set their own window. Admission caps posts entering publishing per second.
+    PUBLISH_SMOOTHING_SECONDS = int(os.getenv("PUBLISH_SMOOTHING_SECONDS", 0))
+    PUBLISH_TOLERANCE_MAX_SECONDS = int(os.getenv("PUBLISH_TOLERANCE_MAX_SECONDS", 900))  # Upper bound for a user's window
+    PUBLISH_ADMISSION_RATE = float(os.getenv("PUBLISH_ADMISSION_RATE", 0))  # 0 = unbounded
+    PUBLISH_ADMISSION_BURST = float(os.getenv("PUBLISH_ADMISSION_BURST", max(PUBLISH_ADMISSION_RATE, 1)))
+
+    # Port for the worker's own /metrics listener (0 disables); the web app serves /metrics itself
+    WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", 0))
+
+    # Recurring series: occurrences become Content rows this far ahead of their time
+    SERIES_EXPANSION_WINDOW_MINUTES = int(os.getenv("SERIES_EXPANSION_WINDOW_MINUTES", 60))
+    SERIES_EXPANSION_POLL_SECONDS = int(os.getenv("SERIES_EXPANSION_POLL_SECONDS", 60))
+    SERIES_MIN_INTERVAL_MINUTES = int(os.getenv("SERIES_MIN_INTERVAL_MINUTES", 60))  # Closest two occurrences may be
+
+    # Failed posts: jittered exponential backoff, then dead-letter
+    PUBLISH_RECONCILE_SECONDS = int(os.getenv("PUBLISH_RECONCILE_SECONDS", 60))  # Checks posts stuck mid-publish
+    PUBLISH_MAX_ATTEMPTS = int(os.getenv("PUBLISH_MAX_ATTEMPTS", 5))
+    PUBLISH_RETRY_BASE_SECONDS = float(os.getenv("PUBLISH_RETRY_BASE_SECONDS", 30))
+    PUBLISH_RETRY_MAX_SECONDS = float(os.getenv("PUBLISH_RETRY_MAX_SECONDS", 3600))
+
+    # Dashboard profile cache: an in-process LRU, backed by a shared Redis tier when REDIS_URL is set
+    REDIS_URL = os.getenv("REDIS_URL")
+    PROFILE_CACHE_TTL_SECONDS = int(os.getenv("PROFILE_CACHE_TTL_SECONDS", 300))
+    # Local entries expire sooner: another process's invalidation never reaches this process's LRU,
+    # so without Redis a multi-process deployment serves edits made elsewhere up to this late.
+    # A single web process without Redis can set PROFILE_CACHE_SINGLE_PROCESS to keep entries for the full TTL.
+    PROFILE_CACHE_LOCAL_TTL_SECONDS = int(os.getenv("PROFILE_CACHE_LOCAL_TTL_SECONDS", 30))
+    PROFILE_CACHE_SINGLE_PROCESS = os.getenv("PROFILE_CACHE_SINGLE_PROCESS", "false").lower() == "true"
+    PROFILE_CACHE_MAX_ENTRIES = int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", 10000))
+
 settings = Settings()
 
 
@@ -1,21 +1,38 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.pool import instrument_pool, pool_options
 
 # Create an engine connected to MySQL
 SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{settings.DB_USER}:{settings.DB_PASSWORD}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
 
-# Create an engine with connection pooling and pre-ping enabled
+# Create an engine with an instrumented connection pool (size, timeout and pre-ping from settings)
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     echo=False,  # Disable SQL echoing in logs
-    pool_recycle=1800,  # Refresh connections every 30 minutes
-    pool_pre_ping=True  # Check if the connection is alive before using it
+    **pool_options(),
 )
+instrument_pool(engine.pool, "sync")
 # Create a session factory bound to the engine
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for `async def` route handlers, so a query awaits instead of blocking the event loop.
+# ASYNC_DATABASE_URL overrides it, e.g. sqlite+aiosqlite:///./test.db for local testing.
+ASYNC_SQLALCHEMY_DATABASE_URL = settings.ASYNC_DATABASE_URL or (
+    f"mysql+aiomysql://{settings.DB_USER}:{settings.DB_PASSWORD}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
+)
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    echo=False,
+    # SQLite has no server connections to pool
+    **({} if ASYNC_SQLALCHEMY_DATABASE_URL.startswith("sqlite") else pool_options(asyncio=True)),
+)
+instrument_pool(async_engine.sync_engine.pool, "async")
+# Objects stay usable after commit: attribute access can't lazily hit the database in async code
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Base class for models
 Base = declarative_base()
 
@@ -25,4 +42,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
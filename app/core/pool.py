@@ -0,0 +1,113 @@
+"""
+Connection pool options and instrumentation shared by the sync and async engines.
+
+The pool classes time every checkout (including waiting for a free connection
+and opening a new one) into DB_POOL_CHECKOUT_SECONDS and count the threads or tasks
+that found the pool exhausted and are waiting for a connection to come back, so
+exhaustion shows up in /metrics before it shows up as request latency.
+Checked-out and overflow counts are read live at scrape time.
+"""
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from app.core.config import settings
+from app.utils.metrics import (
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_CHECKOUT_SECONDS,
+    DB_POOL_IDLE,
+    DB_POOL_OVERFLOW,
+    DB_POOL_TIMEOUTS,
+    DB_POOL_WAITING,
+)
+
+PRE_PING_STRATEGIES = ("always", "idle", "off")
+
+_pools = {}
+
+
+class _InstrumentedPoolMixin:
+    pool_label = "sync"
+
+    def _exhausted(self) -> bool:
+        # QueuePool only blocks once every connection (pool_size + max_overflow) is checked out
+        return self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow
+
+    def _do_get(self):
+        waiting = self._exhausted()
+        if waiting:
+            DB_POOL_WAITING.inc(pool=self.pool_label)
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            DB_POOL_TIMEOUTS.inc(pool=self.pool_label)
+            raise
+        finally:
+            if waiting:
+                DB_POOL_WAITING.dec(pool=self.pool_label)
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start, pool=self.pool_label)
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pool_label = "sync"
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pool_label = "async"
+
+
+def pool_options(asyncio: bool = False) -> dict:
+    """create_engine()/create_async_engine() keyword arguments for a pooled server database."""
+    if settings.DB_PRE_PING not in PRE_PING_STRATEGIES:
+        raise ValueError(f"DB_PRE_PING must be one of {PRE_PING_STRATEGIES}, got {settings.DB_PRE_PING!r}")
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if asyncio else InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,  # Sized per process role (web or worker)
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_PRE_PING == "always",
+    }
+
+
+def _ping_idle_connections(pool, idle_seconds: float):
+    """
+    Pre-ping only connections that sat idle for `idle_seconds`: those are the ones a
+    server-side timeout or failover may have dropped. A busy pool skips the round-trip.
+    """
+
+    @event.listens_for(pool, "checkin")
+    def remember_checkin(dbapi_connection, connection_record):
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(pool, "checkout")
+    def ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if checked_in_at is None or time.monotonic() - checked_in_at < idle_seconds:
+            return
+        try:
+            cursor = dbapi_connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+        except Exception:
+            # The pool discards this connection and retries the checkout with a fresh one
+            raise exc.DisconnectionError()
+
+
+def instrument_pool(pool, label: str):
+    """Export a pool's live stats under `label` and apply the idle pre-ping strategy."""
+    _pools[label] = pool
+    pool.pool_label = label
+    if settings.DB_PRE_PING == "idle" and isinstance(pool, QueuePool):
+        _ping_idle_connections(pool, settings.DB_PRE_PING_IDLE_SECONDS)
+
+
+def _queue_pools():
+    # SQLite URLs (local testing) keep SQLAlchemy's default pool, which has no size accounting
+    return [(label, pool) for label, pool in _pools.items() if isinstance(pool, QueuePool)]
+
+
+DB_POOL_CHECKED_OUT.set_function(lambda: {(label,): pool.checkedout() for label, pool in _queue_pools()})
+DB_POOL_IDLE.set_function(lambda: {(label,): pool.checkedin() for label, pool in _queue_pools()})
+# QueuePool counts overflow from -pool_size until the pool has filled
+DB_POOL_OVERFLOW.set_function(lambda: {(label,): max(pool.overflow(), 0) for label, pool in _queue_pools()})
@@ -10,6 +10,8 @@ from app.models import user as user_model
 from app.utils.password import hash_password
 from app.schemas.user import UserCreate
 from app.models.user import PendingUser, User
+from app.core.config import settings
+from app.utils.profile_cache import invalidate_profile
 
 # Create User
 # Get a user by email
@@ -59,7 +61,12 @@ def update_user(db: Session, user_id: int, user_data: user_schema.UserUpdate):
             db_user.hashed_password = user_data.password
         if user_data.full_name:
             db_user.full_name = user_data.full_name
+        if user_data.publish_tolerance_seconds is not None:
+            db_user.publish_tolerance_seconds = min(
+                max(user_data.publish_tolerance_seconds, 0), settings.PUBLISH_TOLERANCE_MAX_SECONDS
+            )
         db.commit()
+        invalidate_profile(user_id)
         db.refresh(db_user)
         return db_user
     return None
@@ -70,6 +77,7 @@ def delete_user(db: Session, user_id: int):
     if db_user:
         db.delete(db_user)
         db.commit()
+        invalidate_profile(user_id)
         return db_user
     return None
 
@@ -6,12 +6,14 @@ from fastapi.responses import HTMLResponse, FileResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import httpx
+from app.core.config import settings
 from app.core.database import engine, Base, SessionLocal
 from app.models.user import User, TikTokAccount
 from app.routers.user import router as user_router
 # from app.routers.auth import router as auth_router
 from app.routers.pages import router as pages_router
 from app.routers.dashboard import router as dashboard_router
+from app.routers.media import router as media_router
 from fastapi.middleware.cors import CORSMiddleware
 import os
 import requests
@@ -19,12 +21,19 @@ import datetime
 from dotenv import load_dotenv
 from jose import jwt, JWTError
 from app.utils.jwt import  get_email_from_token, get_valid_daily_token, is_month_token_valid
+from app.utils.session_user import load_session_user
+from app.utils.profile_cache import invalidate_profile_async
 from oauthlib.oauth2 import WebApplicationClient
 import urllib.parse
 from starlette.middleware.sessions import SessionMiddleware
-from app.core.database import get_db
+from app.core.database import get_async_db, get_db
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.utils.scheduler import start_scheduler
+from app.utils.scheduler import start_scheduler, stop_scheduler
+from app.utils.metrics import CONTENT_TYPE_LATEST, render_metrics
+from app.utils.tiktok_auth import token_fields
+from app.utils.image_pipeline import shutdown_pool as shutdown_image_pool
+from app.utils.uploads import MULTIPART_OVERHEAD, UploadSizeLimitMiddleware
 from itsdangerous import TimestampSigner, BadSignature
 
 # Initialize database models
@@ -76,6 +85,15 @@ app.add_middleware(
     same_site="Lax",                      # Controls cross-site behavior
     https_only=True,                      # Ensures security over HTTPS
 )
+# Reject oversized uploads from their Content-Length / streamed size, before the body is parsed
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={
+        "/dashboard/api/content-data": settings.MAX_MEDIA_UPLOAD_BYTES + MULTIPART_OVERHEAD,
+        "/dashboard/api/content-series": settings.MAX_MEDIA_UPLOAD_BYTES + MULTIPART_OVERHEAD,
+        "/dashboard/upload-profile-photo": settings.MAX_PROFILE_PHOTO_BYTES + MULTIPART_OVERHEAD,
+    },
+)
 COOKIE_SECRET_KEY = os.getenv("COOKIE_SECRET_KEY")
 signer = TimestampSigner(COOKIE_SECRET_KEY)
 YOUR_SECRET_KEY = os.getenv("YOUR_SECRET_KEY")
@@ -99,6 +117,9 @@ ALGORITHM = os.getenv("ALGORITHM")
 logger = logging.getLogger(__name__)
 
 # Static files and templates
+if settings.MEDIA_STORAGE_BACKEND != "local":
+    # Uploaded media lives in the storage backend; registered ahead of the static mount so it wins
+    app.include_router(media_router, tags=["media"])
 app.mount("/static", StaticFiles(directory="static"), name="static")
 # Serve static files from the 'uploads' folder
 templates = Jinja2Templates(directory="templates")
@@ -112,7 +133,9 @@ os.makedirs("uploads", exist_ok=True)
 
 @app.on_event("startup")
 async def startup_event():
-    start_scheduler()
+    # With a dedicated `python -m app.worker`, the web app only enqueues posts
+    if settings.RUN_SCHEDULER_IN_WEB:
+        start_scheduler()
     global httpx_client
     httpx_client = httpx.AsyncClient()
     print(f"CLIENT_KEY: ")
@@ -120,6 +143,17 @@ async def startup_event():
     print(f"cooke key : ")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    stop_scheduler()
+    shutdown_image_pool()
+
+
+# ✅ Prometheus scrape endpoint; sync so the pending-posts count runs off the event loop
+@app.get("/metrics")
+def metrics():
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 
 
 # Serve the HTML verification file for domain/app verification
@@ -152,7 +186,7 @@ async def landing_page(request: Request):
 async def register_page(
     request: Request,
     form: str = "signup",
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Handles user authentication by checking session and database.
@@ -169,22 +203,19 @@ async def register_page(
         logger.info("Rendering signup page.")
         return templates.TemplateResponse("registerr.html", {"request": request, "form_type": "signup"})
 
-    user_id = request.session.get("user_id")
-    logger.info(f"Checking session | user_id: {user_id}")
-
-    if user_id:
-        user = db.query(User).filter(User.id == user_id).first()
-
-        if user:
-            # 🔹 Step 1: If month token exists and is valid, go to dashboard
-            if user.month_token and is_month_token_valid(request, user.month_token, db):
-                request.session["daily_token"] = get_valid_daily_token(request)
-                logger.info(f"Valid session restored for user {user.id}, redirecting to dashboard.")
-                return RedirectResponse(url="/dashboard", status_code=302)
-            else:
-                # 🔹 Step 2: If month token expired/missing, require re-login
-                logger.warning(f"Month token expired for user {user.id}, redirecting to signin.")
-                return templates.TemplateResponse("registerr.html", {"request": request, "form_type": "signin"})
+    user = await load_session_user(request, db)
+    logger.info(f"Checking session | user_id: {request.session.get('user_id')}")
+
+    if user:
+        # 🔹 Step 1: If month token exists and is valid, go to dashboard
+        if user.month_token and is_month_token_valid(request, user):
+            request.session["daily_token"] = get_valid_daily_token(request)
+            logger.info(f"Valid session restored for user {user.id}, redirecting to dashboard.")
+            return RedirectResponse(url="/dashboard", status_code=302)
+        else:
+            # 🔹 Step 2: If month token expired/missing, require re-login
+            logger.warning(f"Month token expired for user {user.id}, redirecting to signin.")
+            return templates.TemplateResponse("registerr.html", {"request": request, "form_type": "signin"})
 
     # 🔹 Step 3: No session, show signin page
     logger.info("No valid session found, rendering signin page.")
@@ -316,13 +347,14 @@ async def tiktok_callback(request: Request, db: requests.Session = Depends(get_d
         error_message = response.json().get("message", "Unknown error")
         raise HTTPException(status_code=400, detail=f"Failed to get access token: {error_message}")
 
-    # Extract access token and openid
+    # Extract access token and openid; keep the refresh token and expiries so the worker can refresh ahead of posts
     response_data = response.json()
     access_token = response_data.get("access_token")
     openid = response_data.get("open_id")  # TikTok's unique user ID
 
     if not access_token or not openid:
         raise HTTPException(status_code=400, detail="Access token or open_id not found")
+    tokens = token_fields(response_data)
 
     # Step 3: Fetch user profile info
     user_info_url = "https://open.tiktokapis.com/v2/user/info/"
@@ -364,6 +396,9 @@ async def tiktok_callback(request: Request, db: requests.Session = Depends(get_d
         tiktok_account.username = user_info.get("display_name")
         tiktok_account.profile_picture = user_info.get("avatar_url")
         tiktok_account.access_token = access_token  # Update the access token
+        tiktok_account.refresh_token = tokens["refresh_token"]
+        tiktok_account.access_token_expires_at = tokens.get("access_token_expires_at")
+        tiktok_account.refresh_token_expires_at = tokens.get("refresh_token_expires_at")
     else:
         # Create a new TikTok account record
         new_tiktok_account = TikTokAccount(
@@ -371,11 +406,15 @@ async def tiktok_callback(request: Request, db: requests.Session = Depends(get_d
             openid=openid,
             username=user_info.get("display_name"),
             profile_picture=user_info.get("avatar_url"),
-            access_token=access_token   # Store the access token
+            access_token=access_token,   # Store the access token
+            refresh_token=tokens["refresh_token"],
+            access_token_expires_at=tokens.get("access_token_expires_at"),
+            refresh_token_expires_at=tokens.get("refresh_token_expires_at"),
         )
         db.add(new_tiktok_account)
 
     db.commit()  # Commit the transaction to save the TikTok account details in the database
+    await invalidate_profile_async(user.id)  # The dashboard shows the new TikTok name and picture
 
 
     user_id = request.session.get("user_id")
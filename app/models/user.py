@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, DateTime, Text, Boolean, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.core.database import Base
@@ -14,12 +14,14 @@ class User(Base):
     verification_code = Column(String(5))
     profile_photo_url = Column(String(255), default=None)
     month_token = Column(String(255), nullable=True)
+    publish_tolerance_seconds = Column(Integer, nullable=True)  # Burst smoothing window, None = app default
 
 
     # Relationships
     pending_user = relationship("PendingUser", back_populates="owner", uselist=False)
     tiktok_account = relationship("TikTokAccount", back_populates="user", uselist=False)
     contents = relationship("Content", back_populates="user")
+    content_series = relationship("ContentSeries", back_populates="user")
 
 class PendingUser(Base):
     __tablename__ = "pending_users"
@@ -47,9 +49,23 @@ class TikTokAccount(Base):
     username = Column(String(255), nullable=False)
     profile_picture = Column(String(500), nullable=True)  # Increase to 500 characters
     access_token = Column(String(500), nullable=True)  # ➜ Store TikTok Access Token
+    refresh_token = Column(String(500), nullable=True)
+    access_token_expires_at = Column(DateTime, nullable=True)  # ~24h after issue
+    refresh_token_expires_at = Column(DateTime, nullable=True)  # ~365 days after issue
+    refreshing_until = Column(DateTime, nullable=True)  # Lease of the worker refreshing the token
 
     user = relationship("User", back_populates="tiktok_account")
 
+class ContentStatus:
+    """Values of Content.status as a post moves through publishing."""
+    SCHEDULED = "scheduled"
+    READY = "ready"  # Media validated and hashed by the pre-flight stage
+    CLAIMED = "claimed"  # Leased by a worker until lease_until
+    PUBLISHING = "publishing"  # Upstream call under way; never reclaimed blindly, only reconciled
+    PUBLISHED = "published"
+    RETRY = "retry"  # Failed transiently, due again at next_attempt_at
+    DEAD = "dead"  # Out of attempts or failed permanently; re-drive to try again
+
 class Content(Base):
     __tablename__ = "contents"
 
@@ -60,6 +76,87 @@ class Content(Base):
     title = Column(String(255), nullable=True)
     description = Column(Text, nullable=True)
     tags = Column(String(255), nullable=True)  # Comma-separated tags
-    scheduled_time = Column(DateTime, nullable=True)  # When to post
+    scheduled_time = Column(DateTime, nullable=True, index=True)  # When to post
+    status = Column(String(20), nullable=False, default=ContentStatus.SCHEDULED, server_default=ContentStatus.SCHEDULED)
+    claimed_by = Column(String(255), nullable=True)  # Worker holding the lease
+    lease_until = Column(DateTime, nullable=True)  # Lease expiry, reclaimable after this
+    attempt_count = Column(Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = Column(DateTime, nullable=True)  # When a retry, or a smoothed first attempt, is due
+    last_error = Column(Text, nullable=True)
+    media_size = Column(BigInteger, nullable=True)  # Bytes, recorded by pre-flight
+    media_checksum = Column(String(64), nullable=True)  # SHA-256 hex of the media file
+    prepared_at = Column(DateTime, nullable=True)  # When pre-flight marked the row ready
+    publish_key = Column(String(64), nullable=True, unique=True)  # Idempotency key of the current attempt
+    publish_id = Column(String(64), nullable=True)  # TikTok's id for the upload, once init succeeded
+    publishing_started_at = Column(DateTime, nullable=True)
+    series_id = Column(Integer, ForeignKey("content_series.id"), nullable=True)  # Set on occurrences of a recurring series
+
+    __table_args__ = (
+        Index("ix_contents_status_scheduled_time", "status", "scheduled_time"),
+        Index("ix_contents_status_next_attempt_at", "status", "next_attempt_at"),
+        # The calendar reads one user's posts in a scheduled_time range
+        Index("ix_contents_user_id_scheduled_time", "user_id", "scheduled_time"),
+        # An occurrence is expanded at most once, however many workers run the expansion
+        UniqueConstraint("series_id", "scheduled_time", name="uq_contents_series_occurrence"),
+    )
 
     user = relationship("User", back_populates="contents")
+    series = relationship("ContentSeries", back_populates="occurrences")
+
+class ContentSeries(Base):
+    """
+    A recurring post: a content template plus an RFC 5545 RRULE.
+    Only the next occurrence is stored (next_occurrence_at); each one becomes a
+    Content row shortly before it is due, so storage grows with series, not dates.
+    """
+    __tablename__ = "content_series"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    platform = Column(String(50), nullable=False, default="tiktok")
+    media_url = Column(String(255), nullable=False)
+    title = Column(String(255), nullable=True)
+    description = Column(Text, nullable=True)
+    tags = Column(String(255), nullable=True)
+    rrule = Column(String(500), nullable=False)  # e.g. FREQ=WEEKLY;BYDAY=MO,TH;BYHOUR=18;BYMINUTE=0
+    dtstart = Column(DateTime, nullable=False)
+    next_occurrence_at = Column(DateTime, nullable=True)  # None once the rule is exhausted
+    active = Column(Boolean, nullable=False, default=True, server_default="1")
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_content_series_active_next_occurrence_at", "active", "next_occurrence_at"),
+    )
+
+    user = relationship("User", back_populates="content_series")
+    occurrences = relationship("Content", back_populates="series")
+
+class MediaBlob(Base):
+    """
+    One stored media file, keyed by the SHA-256 of its bytes (see app.utils.media_store).
+    ref_count is the number of Content, ContentSeries and User rows whose URL points
+    at it; the file is deleted when the last reference is released.
+    """
+    __tablename__ = "media_blobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), nullable=False, unique=True)
+    size = Column(BigInteger, nullable=False)
+    extension = Column(String(16), nullable=False, default="")  # Kept from the first upload, e.g. ".mp4"
+    ref_count = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class UploadSession(Base):
+    """
+    A resumable upload in progress (see app.utils.resumable_uploads). Bytes are
+    appended to a staging file; `offset` is how many of `length` have arrived.
+    """
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(32), primary_key=True)  # Random hex, also the staging file name
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    filename = Column(String(255), nullable=False)
+    length = Column(BigInteger, nullable=False)  # Declared total size in bytes
+    offset = Column(BigInteger, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)  # Abandoned uploads are purged after this
@@ -1,127 +1,122 @@
 import logging
-import os
-import shutil
-from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from typing import Optional
+from fastapi import APIRouter, Depends, Form, Header, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-import urllib.parse
-from app.core.database import get_db
-from app.models.user import User, Content, TikTokAccount
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.database import get_async_db, get_db
+from app.models.user import User, Content, ContentSeries, TikTokAccount
 from app.utils.jwt import get_current_user, get_email_from_Ctoken, verify_access_token
-from app.utils.random_profile_generator import generate_random_profile_photo
+from app.utils.random_profile_generator import random_avatar_url
 from datetime import datetime, timedelta
 from fastapi import Query
 from datetime import datetime
 from app.models.user import User, Content, TikTokAccount
-from app.utils.GetTiktok import get_tiktok_info
-from app.utils.scheduler import schedule_content_post
+from app.utils.scheduler import expand_due_series, redrive_dead_posts, schedule_content_post, smooth_content_schedule
+from app.utils.series import check_min_interval, next_occurrence
+from app.utils.avatars import avatar_fallback_url, create_avatar_variants
+from app.utils.image_pipeline import ImageProcessingError
+from app.utils.media_store import receive_media_form, reference_media, release_media, store_media
+from app.utils.profile_cache import get_session_profile, invalidate_profile_async, require_session_profile
+from app.utils.session_user import load_session_user
+from app.utils.resumable_uploads import abort_upload, append_chunk, create_upload, finalize_upload, get_upload
+from app.schemas.user import RedriveRequest, UploadCreateRequest
 
 router = APIRouter()
 
 
 templates = Jinja2Templates(directory="templates")
 
-PROFILE_PHOTO_DIR = os.path.join(os.getcwd(), "static", "profile_photos")
+# Widest /api/events range: the calendar's largest view (month) asks for six weeks (42 days), plus slack
+MAX_EVENTS_RANGE_DAYS = 62
+
+
+def wall_time(value: datetime) -> datetime:
+    """
+    The naive wall-clock time of `value`. scheduled_time is stored as the browser's
+    local wall time, so the calendar's UTC offset is dropped rather than applied.
+    """
+    return value.replace(tzinfo=None)
 
 
 @router.get("/", response_class=HTMLResponse)
-async def dashboard(request: Request, db: Session = Depends(get_db)):
+async def dashboard(
+    request: Request,
+    profile: Optional[dict] = Depends(get_session_profile),
+    db: AsyncSession = Depends(get_async_db),
+):
     """
     Dashboard page that isolates user data based on session authentication.
     Ensures only the logged-in user's data is retrieved.
     """
 
-    # Retrieve the user ID from the session
-    user_id = request.session.get("user_id")
-
-    if not user_id:
-        # If no user ID in session, redirect to login
-        return RedirectResponse(url="/register?form=signin", status_code=302)
-
-    # Fetch the user from the database
-    user = db.query(User).filter(User.id == user_id).first()
-
-    if not user:
-        # If user does not exist, clear session and redirect to login
+    if not profile:
+        # No session, or its user no longer exists: clear session and redirect to login
         request.session.clear()
         return RedirectResponse(url="/register?form=signin", status_code=302)
 
     # Check if TikTok is linked to the user
-    tiktok_account = db.query(TikTokAccount).filter(TikTokAccount.user_id == user.id).first()
+    if profile["tiktok_linked"]:
+        # If TikTok account is linked, redirect to /dashboard/me
+        return RedirectResponse(url="/dashboard/me", status_code=302)
 
     # Prepare user data for the template
     user_data = {
-        "user_id": user.id,
-        "username": user.full_name,  # Assuming `full_name` is the correct field
-        "email": user.email,
+        "user_id": profile["user_id"],
+        "username": profile["full_name"],  # Assuming `full_name` is the correct field
+        "email": profile["email"],
+        "profile_photo_url": profile["profile_photo_url"],
     }
 
     # Check if the user has a profile photo
-    if user.profile_photo_url:
-        # If the user has a profile picture, use that
+    if not profile["profile_photo_url"]:
+        # If not, generate a random profile picture and save it
+        user = await load_session_user(request, db)
+        user.profile_photo_url = random_avatar_url()
+        await db.commit()
+        await invalidate_profile_async(user.id)
         user_data["profile_photo_url"] = user.profile_photo_url
-    else:
-        # If not, generate a random profile picture
-        user_data["profile_photo_url"] = generate_random_profile_photo(user,db)  # Call the function to generate
-
-    # Add TikTok details to user_data if TikTok account is linked
-    if tiktok_account:
-        user_data["tiktok_username"] = tiktok_account.username
-        user_data["tiktok_profile_picture"] = tiktok_account.profile_picture
-
-    # Check if TikTok account is linked to the user
-    if tiktok_account:
-        # If TikTok account is linked, redirect to /dashboard/me
-        return RedirectResponse(url="/dashboard/me", status_code=302)
+    user_data["profile_photo_fallback_url"] = avatar_fallback_url(user_data["profile_photo_url"])
 
     # If TikTok is not linked, render dashboard with user data
     return templates.TemplateResponse("dashboard.html", {"request": request, **user_data})
 
 
 @router.get("/me", response_class=HTMLResponse)
-async def get_user_profile(request: Request, db: Session = Depends(get_db)):
+async def get_user_profile(request: Request, profile: Optional[dict] = Depends(get_session_profile)):
     """
     Endpoint to get the logged-in user's profile information and verify their TikTok account.
     Only allows access to users with a linked TikTok account.
     """
 
-    # Retrieve the user ID from the session
-    user_id = request.session.get("user_id")
-
-    if not user_id:
+    if not request.session.get("user_id"):
         # If no user ID in session, redirect to login
         return RedirectResponse(url="/register?form=signin", status_code=302)
 
-    # Fetch the user from the database
-    user = db.query(User).filter(User.id == user_id).first()
-
-    if not user:
+    if not profile:
         # If user does not exist, clear session and redirect to login
         request.session.clear()
         raise HTTPException(status_code=401, detail="Invalid session. Please log in again.")
 
-    # Fetch TikTok info linked to the logged-in user (if exists)
-    tiktok_account = db.query(TikTokAccount).filter(TikTokAccount.user_id == user.id).first()
-
     # If no TikTok account is linked, redirect to the dashboard or another page
-    if not tiktok_account:
+    if not profile["tiktok_linked"]:
         return RedirectResponse(url="/dashboard", status_code=302)
 
-    # If TikTok account exists, prepare user profile data
-    tiktok_username = tiktok_account.username if tiktok_account else None
-    tiktok_profile_picture = tiktok_account.profile_picture if tiktok_account else None
-
-    # Prepare user profile data, including TikTok information (if available)
+    # Prepare user profile data, including TikTok information
     user_profile_data = {
-        "user_id": user.id,
-        "username": user.full_name,  # Assuming `full_name` is the correct field
-        "email": user.email,
-        "profile_photo_url": user.profile_photo_url or "default_profile_photo_url.png",
-        "tiktok_username": tiktok_username,
-        "tiktok_profile_picture": tiktok_profile_picture,
-        "tiktok_account_exists": bool(tiktok_account),  # Add a flag indicating if TikTok account is linked
+        "user_id": profile["user_id"],
+        "username": profile["full_name"],  # Assuming `full_name` is the correct field
+        "email": profile["email"],
+        "profile_photo_url": profile["profile_photo_url"] or "default_profile_photo_url.png",
+        "profile_photo_fallback_url": avatar_fallback_url(profile["profile_photo_url"]),
+        "tiktok_username": profile["tiktok_username"],
+        "tiktok_profile_picture": profile["tiktok_profile_picture"],
+        "tiktok_account_exists": True,  # Add a flag indicating if TikTok account is linked
     }
     # Render the user profile template with the data
     return templates.TemplateResponse("dashboard.html", {"request": request, **user_profile_data})
@@ -129,39 +124,28 @@ async def get_user_profile(request: Request, db: Session = Depends(get_db)):
 
 
 @router.get("/me/{section}", response_class=HTMLResponse)
-async def load_section(request: Request, section: str, db: Session = Depends(get_db)):
+async def load_section(request: Request, section: str, profile: Optional[dict] = Depends(get_session_profile)):
     """
     Load dynamic content based on the section parameter.
     Ensures that only authenticated users can access their own data.
     """
 
-    # Retrieve the user ID from session
-    user_id = request.session.get("user_id")
-
-    if not user_id:
+    if not request.session.get("user_id"):
         # If no user ID in session, redirect to login
         return RedirectResponse(url="/register?form=signin", status_code=302)
 
-    # Fetch the user from the database
-    user = db.query(User).filter(User.id == user_id).first()
-
-    if not user:
+    if not profile:
         # If user not found, clear session and redirect
         request.session.clear()
         raise HTTPException(status_code=401, detail="Invalid session. Please log in again.")
-    tiktok_account = db.query(TikTokAccount).filter(TikTokAccount.user_id == user.id).first()
-    tiktok_username = tiktok_account.username if tiktok_account else None
-    tiktok_profile_picture = tiktok_account.profile_picture if tiktok_account else None
-    print("tiktok_username",tiktok_username)
-    print("tiktok_profile_picture",tiktok_profile_picture)
     # Prepare user-specific data
     user_data = {
-        "userId": user.id,
-        "username": user.full_name,  # Assuming `full_name` is correct
-        "profilePhotoUrl": user.profile_photo_url or "default_profile_photo_url.png",
-        "email": user.email,
-        "tiktokUsername": tiktok_username,
-        "tiktokProfilePicture": tiktok_profile_picture,
+        "userId": profile["user_id"],
+        "username": profile["full_name"],  # Assuming `full_name` is correct
+        "profilePhotoUrl": profile["profile_photo_url"] or "default_profile_photo_url.png",
+        "email": profile["email"],
+        "tiktokUsername": profile["tiktok_username"],
+        "tiktokProfilePicture": profile["tiktok_profile_picture"],
     }
 
     # Render the requested section
@@ -175,124 +159,229 @@ async def load_section(request: Request, section: str, db: Session = Depends(get
         return HTMLResponse(content="Section Not Found", status_code=404)
 
 
-@router.post("/upload-profile-photo")
-async def upload_profile_photo(
-    email: str = Form(...),
-    profile_photo: UploadFile = File(...),
-    db: Session = Depends(get_db)
-):
-    try:
-        # Generate a unique filename for the uploaded profile photo
-        file_extension = profile_photo.filename.split('.')[-1]
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        new_filename = f"profile_{timestamp}.{file_extension}"
-        file_path = os.path.join(PROFILE_PHOTO_DIR, new_filename)
+def _set_profile_photo(db: Session, user_id: int, photo_url: str):
+    db.query(User).filter(User.id == user_id).update({User.profile_photo_url: photo_url}, synchronize_session=False)
+    db.commit()
 
-        # Save the uploaded photo to the specified directory
-        with open(file_path, "wb") as f:
-            shutil.copyfileobj(profile_photo.file, f)
 
+@router.post("/upload-profile-photo")
+async def upload_profile_photo(request: Request, db: Session = Depends(get_db)):
+    # Multipart form: email and profile_photo, the photo streamed straight into staging
+    form = await receive_media_form(request, "profile_photo", settings.MAX_PROFILE_PHOTO_BYTES)
+    try:
         # Fetch the user from the database using the email
-        user = db.query(User).filter(User.email == email).first()
+        user = await run_in_threadpool(db.query(User).filter(User.email == form.field("email")).first)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
+        # Read now: commits expire the instance, and reloading it would block the loop
+        user_id, previous_photo_url = user.id, user.profile_photo_url
+
+        # Reference the photo's blob (deduplicated by content); only its variants are stored
+        stored = await run_in_threadpool(reference_media, db, form)
 
-        # Update the user's profile photo URL in the database
-        user.profile_photo_url = f"/static/profile_photos/{new_filename}"
-        db.commit()
+        # Resize into small WebP/JPEG avatars in the image process pool, straight from staging
+        try:
+            photo_url = await create_avatar_variants(stored.url, form.upload.path)
+        except ImageProcessingError as e:
+            await run_in_threadpool(release_media, db, stored.url)
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # Update the user's profile photo URL in the database, then drop the old photo's reference
+        await run_in_threadpool(_set_profile_photo, db, user_id, photo_url)
+        await invalidate_profile_async(user_id)
+        await run_in_threadpool(release_media, db, previous_photo_url)
 
         # Return a success response with the new profile photo URL
-        return JSONResponse(content={"success": True, "newPhotoUrl": f"/static/profile_photos/{new_filename}"})
+        return JSONResponse(
+            content={"success": True, "newPhotoUrl": photo_url, "newPhotoFallbackUrl": avatar_fallback_url(photo_url)}
+        )
 
+    except HTTPException:
+        raise
     except Exception as e:
         # Log the error and raise an HTTPException
         logging.error(f"Error uploading profile photo: {e}")
         raise HTTPException(status_code=500, detail="Error uploading profile photo")
+    finally:
+        form.discard()
 
 
 
-@router.post("/api/content-data/")
-async def create_content_data(
-    request: Request,  # Get the request object to access the session
-    title: str = Form(...),
-    description: str = Form(...),
-    tags: str = Form(...),
-    end_time: str = Form(...),
-    image: UploadFile = File(...),
-    db: Session = Depends(get_db),
-):
-    try:
-        # Ensure `uploads_dir` is defined inside static
-        uploads_dir = os.path.abspath(os.path.join(os.getcwd(), "static", "uploads"))
-        if not os.path.exists(uploads_dir):
-            return {"status": "error", "message": "Uploads directory does not exist"}
+def linked_tiktok_user_id(db: Session, user_id: int):
+    """`user_id` when that user has linked a TikTok account, else None (blocking; run it in the threadpool)."""
+    return db.query(TikTokAccount.user_id).filter(TikTokAccount.user_id == user_id).scalar()
 
-        # Step 1: Try to retrieve TikTok session from the session
-        tiktok_session = request.session.get("tiktok_session")
-        user_id = None
 
-        if tiktok_session:
-            user_id = tiktok_session.get("user_id")
+async def get_content_user_id(request: Request, db: Session) -> int:
+    """The user posting content: from the TikTok session, else the logged-in user's linked account."""
+    # Step 1: Try to retrieve TikTok session from the session
+    tiktok_session = request.session.get("tiktok_session")
+    user_id = None
 
-        # Step 2: If no session found, fetch TikTok info from the database
-        if not user_id:
-            tiktok_info = await get_tiktok_info(request, db)
-            user_id = tiktok_info.get("user_id")  # Retrieve user_id from the function
+    if tiktok_session:
+        user_id = tiktok_session.get("user_id")
 
-        # Step 3: If still no user_id, return login prompt
+    # Step 2: If no session found, look the linked account up in the database
+    if not user_id:
+        session_user_id = request.session.get("user_id")
+        if not session_user_id:
+            raise HTTPException(status_code=401, detail="User not authenticated")
+        user_id = await run_in_threadpool(linked_tiktok_user_id, db, session_user_id)
         if not user_id:
-            raise HTTPException(status_code=401, detail="User not authenticated with TikTok. Please log in to TikTok.")
-
-        # Convert the string end time into a datetime object
-        end_datetime = datetime.fromisoformat(end_time).replace(tzinfo=None)  # Make naive
-
-        # Ensure the folder exists
-        os.makedirs(uploads_dir, exist_ok=True)
+            raise HTTPException(status_code=404, detail="TikTok account not linked to the user")
 
-        # Save the image file to the uploads directory inside static
-        encoded_filename = urllib.parse.quote(image.filename)
-        file_location = os.path.join(uploads_dir, encoded_filename)
-        media_url = "/static/uploads/" + encoded_filename
-
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
+    # Step 3: If still no user_id, return login prompt
+    if not user_id:
+        raise HTTPException(status_code=401, detail="User not authenticated with TikTok. Please log in to TikTok.")
+    return user_id
+
+
+def create_scheduled_content(db: Session, user_id: int, stored, title: str, description: str, tags: str, end_time: str) -> int:
+    """Insert a post for media already in the store and schedule it. Returns its id. Blocking; run it in the threadpool."""
+    # Convert the string end time into a datetime object
+    end_datetime = datetime.fromisoformat(end_time).replace(tzinfo=None)  # Make naive
+
+    # Create content instance and insert into the database
+    new_content = Content(
+        user_id=user_id,  # Use the dynamically fetched user_id
+        platform="tiktok",  # or another platform if necessary
+        media_url=stored.url,  # Save the image/video path in the media_url
+        title=title,
+        description=description,
+        tags=tags,
+        scheduled_time=end_datetime,
+        media_size=stored.size,
+        media_checksum=stored.sha256,
+    )
+
+    # Add content to the database and commit
+    db.add(new_content)
+    db.commit()
+    # Spread round-minute spikes inside the user's tolerance window (opt-in), then schedule
+    run_at = smooth_content_schedule(db, new_content)
+    schedule_content_post(new_content.id, run_at)
+    return new_content.id
 
-        # Create content instance and insert into the database
-        new_content = Content(
-            user_id=user_id,  # Use the dynamically fetched user_id
-            platform="tiktok",  # or another platform if necessary
-            media_url=media_url,  # Save the image/video path in the media_url
-            title=title,
-            description=description,
-            tags=tags,
-            scheduled_time=end_datetime,
-        )
+@router.post("/api/content-data/")
+async def create_content_data(
+    request: Request,  # Get the request object to access the session
+    db: Session = Depends(get_db),
+):
+    # Authenticate before reading the body, which streams the media (image) into staging
+    user_id = await get_content_user_id(request, db)
+    form = await receive_media_form(request, "image", settings.MAX_MEDIA_UPLOAD_BYTES)
+    try:
+        title, description, tags, end_time = (form.field(name) for name in ("title", "description", "tags", "end_time"))
+        # Validate the time before storing anything
+        datetime.fromisoformat(end_time)
 
-        # Add content to the database and commit
-        db.add(new_content)
-        db.commit()
-        # Schedule content posting
-        schedule_content_post(new_content.id, end_datetime)
+        # Move the media into the content-addressed store; identical files are kept once
+        stored = await store_media(db, form)
+        await run_in_threadpool(create_scheduled_content, db, user_id, stored, title, description, tags, end_time)
         return {"status": "success", "message": "Content data saved successfully"}
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error: {str(e)}")  # Log the full error
         raise HTTPException(status_code=500, detail=f"Error saving content data: {str(e)}")
+    finally:
+        form.discard()
+
+
+
+# ✅ Resumable uploads (tus-style): create, PATCH chunks at offsets, HEAD to resume, finalize into a post
+def _upload_headers(upload) -> dict:
+    return {"Upload-Offset": str(upload.offset), "Upload-Length": str(upload.length), "Cache-Control": "no-store"}
+
+@router.post("/api/uploads", status_code=201)
+async def create_resumable_upload(request: Request, payload: UploadCreateRequest, db: Session = Depends(get_db)):
+    user_id = await get_content_user_id(request, db)
+    upload = await create_upload(db, user_id, payload.filename, payload.length)
+    return JSONResponse(
+        status_code=201,
+        content={"upload_id": upload.id, "offset": 0, "length": upload.length, "chunk_size": settings.RESUMABLE_CHUNK_SIZE},
+        headers={**_upload_headers(upload), "Location": f"/dashboard/api/uploads/{upload.id}"},
+    )
+
+@router.head("/api/uploads/{upload_id}")
+async def get_resumable_upload_offset(upload_id: str, request: Request, db: Session = Depends(get_db)):
+    upload = await run_in_threadpool(get_upload, db, upload_id, await get_content_user_id(request, db))
+    return Response(status_code=200, headers=_upload_headers(upload))
+
+@router.patch("/api/uploads/{upload_id}")
+async def append_resumable_upload(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+    db: Session = Depends(get_db),
+):
+    upload = await run_in_threadpool(get_upload, db, upload_id, await get_content_user_id(request, db))
+    offset = await append_chunk(db, upload, upload_offset, request.stream())
+    return Response(status_code=204, headers={"Upload-Offset": str(offset), "Cache-Control": "no-store"})
+
+@router.delete("/api/uploads/{upload_id}", status_code=204)
+async def abort_resumable_upload(upload_id: str, request: Request, db: Session = Depends(get_db)):
+    upload = await run_in_threadpool(get_upload, db, upload_id, await get_content_user_id(request, db))
+    await abort_upload(db, upload)
+    return Response(status_code=204)
+
+@router.post("/api/uploads/{upload_id}/finalize")
+async def finalize_resumable_upload(
+    upload_id: str,
+    request: Request,
+    title: str = Form(...),
+    description: str = Form(...),
+    tags: str = Form(...),
+    end_time: str = Form(...),
+    db: Session = Depends(get_db),
+):
+    """Turn a completed upload into a scheduled post; the Content row is only created here."""
+    user_id = await get_content_user_id(request, db)
+    upload = await run_in_threadpool(get_upload, db, upload_id, user_id)
+    try:
+        datetime.fromisoformat(end_time)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid end_time")
 
+    stored = await finalize_upload(db, upload)
+    content_id = await run_in_threadpool(create_scheduled_content, db, user_id, stored, title, description, tags, end_time)
+    return {"status": "success", "message": "Content data saved successfully", "content_id": content_id}
 
 
 @router.get("/api/events")
-async def get_events(request: Request, db: Session = Depends(get_db)):
+async def get_events(
+    request: Request,
+    start: Optional[datetime] = Query(None),  # FullCalendar's visible range, end exclusive
+    end: Optional[datetime] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+):
     """
-    Fetch events (scheduled content) for the logged-in user only.
+    Fetch events (scheduled content) for the logged-in user only, limited to the
+    calendar's visible range when `start`/`end` are given.
     """
     user_id = request.session.get("user_id")
 
     if not user_id:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    # Fetch user events (scheduled content) from the Content table
-    events = db.query(Content).filter(Content.user_id == user_id, Content.scheduled_time >= datetime.utcnow()).all()
+    start = wall_time(start) if start else None
+    end = wall_time(end) if end else None
+    if start and end:
+        if end <= start:
+            raise HTTPException(status_code=400, detail="end must be after start")
+        if end - start > timedelta(days=MAX_EVENTS_RANGE_DAYS):
+            raise HTTPException(status_code=400, detail=f"Range exceeds {MAX_EVENTS_RANGE_DAYS} days")
+
+    # Upcoming posts only, as before; the range narrows them to what the calendar shows
+    now = datetime.utcnow()
+    # Only the columns the calendar renders, as a range scan on (user_id, scheduled_time)
+    query = select(Content.title, Content.scheduled_time, Content.description, Content.media_url).where(
+        Content.user_id == user_id, Content.scheduled_time >= (max(start, now) if start else now)
+    )
+    if end:
+        query = query.where(Content.scheduled_time < end)
+    events = (await db.execute(query.order_by(Content.scheduled_time))).all()
 
         # Return events data, filter or format as needed
     return [
@@ -306,30 +395,126 @@ async def get_events(request: Request, db: Session = Depends(get_db)):
         for event in events
     ]
 
-@router.get("/api/tiktok-profile",)
-async def get_tiktok_profile(request: Request, db: Session = Depends(get_db)):
+@router.post("/api/content/redrive")
+async def redrive_dead_content(request: Request, payload: RedriveRequest = None, db: Session = Depends(get_db)):
     """
-    Endpoint to fetch the logged-in user's TikTok profile data.
-    This endpoint is called dynamically by JavaScript in the SPA.
+    Re-drive the logged-in user's dead-letter posts (all of them, or only `content_ids`).
+    Each gets a fresh attempt budget and is published again as soon as possible.
     """
     user_id = request.session.get("user_id")
 
     if not user_id:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    # Fetch the user from the database
-    user = db.query(User).filter(User.id == user_id).first()
+    content_ids = payload.content_ids if payload else None
+    redriven = await run_in_threadpool(redrive_dead_posts, db, user_id, content_ids)
+    return {"status": "success", "redriven": len(redriven), "content_ids": redriven}
 
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid session. Please log in again.")
+def _commit_new_row(db: Session, row) -> int:
+    """Commit a pending insert and return its id (blocking; run it in the threadpool)."""
+    db.commit()
+    return row.id
+
+@router.post("/api/content-series")
+async def create_content_series(request: Request, db: Session = Depends(get_db)):
+    """
+    Create a recurring post. Only its next occurrence is tracked; each occurrence
+    becomes a scheduled post shortly before it is due.
+
+    Multipart form: title, description, tags, rrule (RFC 5545, e.g.
+    FREQ=WEEKLY;BYDAY=MO;BYHOUR=18;BYMINUTE=0), start_time and the image file.
+    """
+    user_id = request.session.get("user_id")
 
-    # Fetch TikTok account linked to the user
-    tiktok_account = db.query(TikTokAccount).filter(TikTokAccount.user_id == user.id).first()
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    form = await receive_media_form(request, "image", settings.MAX_MEDIA_UPLOAD_BYTES)
+    try:
+        title, description, tags, rrule = (form.field(name) for name in ("title", "description", "tags", "rrule"))
+        try:
+            dtstart = datetime.fromisoformat(form.field("start_time")).replace(tzinfo=None)  # Make naive
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid start time")
+        try:
+            check_min_interval(rrule, dtstart, timedelta(minutes=settings.SERIES_MIN_INTERVAL_MINUTES))
+            first_occurrence = next_occurrence(rrule, dtstart, datetime.utcnow(), inclusive=True)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid recurrence rule: {e}")
+        if first_occurrence is None:
+            raise HTTPException(status_code=400, detail="The recurrence rule has no future occurrences")
+
+        stored = await store_media(db, form)
+        series = ContentSeries(
+            user_id=user_id,
+            platform="tiktok",
+            media_url=stored.url,
+            title=title,
+            description=description,
+            tags=tags,
+            rrule=rrule.strip(),
+            dtstart=dtstart,
+            next_occurrence_at=first_occurrence,
+        )
+        db.add(series)
+        series_id = await run_in_threadpool(_commit_new_row, db, series)
+    finally:
+        form.discard()
+
+    # An occurrence due within the expansion window is scheduled right away
+    await run_in_threadpool(expand_due_series, [series_id])
+    return {"status": "success", "series_id": series_id, "next_occurrence_at": first_occurrence.isoformat()}
+
+@router.get("/api/content-series")
+async def list_content_series(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """The logged-in user's active recurring posts."""
+    user_id = request.session.get("user_id")
+
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    series_list = (await db.scalars(
+        select(ContentSeries).where(ContentSeries.user_id == user_id, ContentSeries.active.is_(True))
+    )).all()
+    return [
+        {
+            "id": series.id,
+            "title": series.title,
+            "rrule": series.rrule,
+            "dtstart": series.dtstart.isoformat(),
+            "next_occurrence_at": series.next_occurrence_at.isoformat() if series.next_occurrence_at else None,
+            "media_url": series.media_url,
+        }
+        for series in series_list
+    ]
+
+@router.delete("/api/content-series/{series_id}")
+async def stop_content_series(series_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Stop a recurring post. Occurrences already scheduled are kept as ordinary posts."""
+    user_id = request.session.get("user_id")
+
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    series = await db.scalar(
+        select(ContentSeries).where(ContentSeries.id == series_id, ContentSeries.user_id == user_id)
+    )
+    if not series:
+        raise HTTPException(status_code=404, detail="Series not found")
 
-    if not tiktok_account:
-        return {"tiktok_username": None, "tiktok_profile_picture": None}
+    series.active = False
+    series.next_occurrence_at = None
+    await db.commit()
+    return {"status": "success", "series_id": series_id}
 
+@router.get("/api/tiktok-profile",)
+async def get_tiktok_profile(profile: dict = Depends(require_session_profile)):
+    """
+    Endpoint to fetch the logged-in user's TikTok profile data.
+    This endpoint is called dynamically by JavaScript in the SPA.
+    """
+    # Served from the profile cache; None for both when no TikTok account is linked
     return {
-        "tiktok_username": tiktok_account.username,
-        "tiktok_profile_picture": tiktok_account.profile_picture
+        "tiktok_username": profile["tiktok_username"],
+        "tiktok_profile_picture": profile["tiktok_profile_picture"]
     }
@@ -0,0 +1,57 @@
+import mimetypes
+import re
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from app.utils.storage import get_storage, url_to_key
+
+router = APIRouter()
+
+RANGE_HEADER = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def parse_range(header: str, size: int):
+    """(start, end) for a single-range "bytes=a-b" header, end exclusive. None means the whole object."""
+    match = RANGE_HEADER.fullmatch(header.strip()) if header else None
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size
+    else:
+        start, end = int(first), min(int(last) + 1, size) if last else size
+    if start >= size or start >= end:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+# ✅ Media from the storage backend, for deployments where it isn't on this machine's disk.
+# Sync handler: storage calls block, so Starlette runs it (and the body iterator) in the thread pool.
+@router.api_route("/static/media/{path:path}", methods=["GET", "HEAD"])
+def serve_media(path: str, request: Request):
+    try:
+        key = url_to_key(f"/static/media/{path}")
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Not found")
+    storage = get_storage()
+    try:
+        size = storage.size(key)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Not found")
+
+    byte_range = parse_range(request.headers.get("range"), size)
+    start, end = byte_range or (0, size)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(end - start),
+        # Keys are content hashes, so a URL's bytes never change
+        "Cache-Control": "public, max-age=31536000, immutable",
+    }
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    status_code = 206 if byte_range else 200
+    media_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    return StreamingResponse(storage.iter_range(key, start, end), status_code=status_code, headers=headers, media_type=media_type)
@@ -106,7 +106,7 @@ async def signin(
             raise HTTPException(status_code=400, detail="Invalid password")
 
     # 🔹 Step 4: Check or generate month token
-    if not user.month_token or not is_month_token_valid(request, user.month_token, db):
+    if not user.month_token or not is_month_token_valid(request, user):
         logger.info(f"Generating new month token for user {user.id}")
         user.month_token = generate_month_token(user.id)
 
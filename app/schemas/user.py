@@ -1,6 +1,6 @@
 # app/schemas/user.py
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 
 
 # Shared properties (e.g., response data)
@@ -44,6 +44,7 @@ class UserUpdate(BaseModel):
     email: Optional[str] = None
     password: Optional[str] = None
     full_name: Optional[str] = None
+    publish_tolerance_seconds: Optional[int] = None  # Burst smoothing window; 0 opts out
 
     class Config:
         from_attributes = True  # Again, using 'from_attributes' instead of 'orm_mode' in V2
@@ -74,3 +75,11 @@ class PasswordResetRequest(BaseModel):
 class ResetPasswordRequest(BaseModel):
     token: str
     new_password: str
+
+
+class RedriveRequest(BaseModel):
+    content_ids: Optional[List[int]] = None  # Omit to re-drive all of the user's dead posts
+
+class UploadCreateRequest(BaseModel):
+    filename: str
+    length: int  # Total size of the file in bytes
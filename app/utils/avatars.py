@@ -0,0 +1,63 @@
+import logging
+import os
+import shutil
+import tempfile
+from starlette.concurrency import run_in_threadpool
+from app.utils.image_pipeline import (
+    AVATAR_FORMATS,
+    AVATAR_SIZES,
+    DEFAULT_AVATAR_FORMAT,
+    DEFAULT_AVATAR_SIZE,
+    render_in_pool,
+)
+from app.utils.media_store import STAGING_ROOT, media_key, variant_url
+from app.utils.storage import get_storage, url_to_key
+
+logger = logging.getLogger(__name__)
+
+
+def avatar_variant_url(photo_url: str, size: int = DEFAULT_AVATAR_SIZE, extension: str = DEFAULT_AVATAR_FORMAT) -> str:
+    """URL of one avatar variant of a stored profile photo (its original or any of its variants)."""
+    return variant_url(photo_url, str(size), f".{extension}")
+
+
+def avatar_fallback_url(photo_url: str):
+    """JPEG twin of a stored WebP avatar, for browsers without WebP; None for any other URL."""
+    if media_key(photo_url) is None or photo_url != avatar_variant_url(photo_url):
+        return None
+    return avatar_variant_url(photo_url, extension="jpg")
+
+
+def _missing_variants(photo_url: str) -> dict:
+    storage = get_storage()
+    keys = {
+        (size, extension): url_to_key(avatar_variant_url(photo_url, size, extension))
+        for size in AVATAR_SIZES
+        for extension in AVATAR_FORMATS
+    }
+    return {variant: key for variant, key in keys.items() if not storage.exists(key)}
+
+
+async def create_avatar_variants(photo_url: str, source_path: str) -> str:
+    """
+    Render every avatar size and format of the photo at `source_path` (still in
+    staging) next to its blob URL `photo_url`. Only the variants are stored; the
+    original, with its EXIF, never reaches public storage. Variants already stored
+    (the same photo uploaded before) are reused.
+    Returns the URL to store in User.profile_photo_url.
+    """
+    storage = get_storage()
+    missing = await run_in_threadpool(_missing_variants, photo_url)
+    if missing:
+        # The pool renders into a scratch directory; results are then put into storage
+        os.makedirs(STAGING_ROOT, exist_ok=True)
+        scratch = await run_in_threadpool(tempfile.mkdtemp, dir=STAGING_ROOT)
+        try:
+            targets = {variant: os.path.join(scratch, os.path.basename(key)) for variant, key in missing.items()}
+            await render_in_pool(source_path, targets)
+            for variant, key in missing.items():
+                await run_in_threadpool(storage.put_file, key, targets[variant])
+        finally:
+            await run_in_threadpool(shutil.rmtree, scratch, True)
+        logger.info(f"🖼️ Rendered {len(missing)} avatar variant(s) for {photo_url}")
+    return avatar_variant_url(photo_url)
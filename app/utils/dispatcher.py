@@ -0,0 +1,128 @@
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func
+from app.models.user import Content, ContentStatus
+
+logger = logging.getLogger(__name__)
+
+
+class DueContentDispatcher:
+    """
+    Keeps only the next `window` of due content in an in-memory heap.
+
+    refill() loads the slice of contents.scheduled_time between the last loaded
+    horizon and now + window with indexed range queries, and dispatch_due()
+    pops everything whose time has come and hands it to `dispatch_batch` in one
+    call. Memory is bounded by the posts due inside the window, however far
+    ahead users schedule.
+
+    Rows inserted by another process for a time that is already inside the loaded
+    window are caught on the next refill through an id high-water mark.
+    """
+
+    def __init__(self, session_factory, dispatch_batch, window: timedelta, lookback: timedelta):
+        self.session_factory = session_factory
+        self.dispatch_batch = dispatch_batch
+        self.window = window
+        self.lookback = lookback  # How far back the first refill looks for missed posts
+        self._heap = []  # (scheduled_time, content_id)
+        self._queued = set()
+        self._dispatched = set()  # Dispatched while a refill is in flight
+        self._horizon = None  # Upper bound of what has been loaded so far
+        self._high_water = None  # Highest Content.id seen by the previous refill
+        self._loading_upper = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def _push(self, content_id: int, scheduled_time: datetime):
+        if content_id in self._queued:
+            return
+        self._queued.add(content_id)
+        heapq.heappush(self._heap, (scheduled_time, content_id))
+
+    def add(self, content_id: int, scheduled_time: datetime):
+        """Track content scheduled from this process if it falls inside the loaded window."""
+        with self._lock:
+            bound = max(filter(None, (self._horizon, self._loading_upper)), default=None)
+            if bound is not None and scheduled_time <= bound:
+                self._push(content_id, scheduled_time)
+
+    def _refill_branches(self, lower: datetime, upper: datetime):
+        """
+        The kinds of row a refill loads, each a separate query served by one index;
+        OR-ing them together would make MySQL scan the whole table.
+        """
+        pending = [ContentStatus.SCHEDULED, ContentStatus.READY]
+        # (status, scheduled_time): one range per status
+        branches = [
+            and_(Content.status == status, Content.scheduled_time > lower, Content.scheduled_time <= upper)
+            for status in pending
+        ]
+        if self._high_water is not None:
+            # Primary key range: rows inserted since the last refill for a time already loaded
+            branches.append(
+                and_(Content.id > self._high_water, Content.status.in_(pending), Content.scheduled_time <= upper)
+            )
+        # (status, next_attempt_at): retry rows are few, so they are matched without a lower bound
+        branches.append(and_(Content.status == ContentStatus.RETRY, Content.next_attempt_at <= upper))
+        return branches
+
+    def refill(self, now: datetime = None) -> int:
+        """Load the next slice of the window from the database. Returns rows added."""
+        now = now or datetime.utcnow()
+        upper = now + self.window
+        with self._lock:
+            lower = self._horizon if self._horizon is not None else now - self.lookback
+            if upper <= lower:
+                return 0
+            self._loading_upper = upper
+            self._dispatched = set()
+
+        db = self.session_factory()
+        try:
+            high_water = db.query(func.max(Content.id)).scalar() or 0
+            rows = {}
+            for condition in self._refill_branches(lower, upper):
+                rows.update(
+                    db.query(Content.id, func.coalesce(Content.next_attempt_at, Content.scheduled_time))
+                    .filter(condition)
+                    .all()
+                )
+        finally:
+            db.close()
+
+        with self._lock:
+            before = len(self._heap)
+            for content_id, scheduled_time in rows.items():
+                if content_id not in self._dispatched:
+                    self._push(content_id, scheduled_time)
+            self._horizon = upper
+            self._high_water = high_water
+            self._loading_upper = None
+            added = len(self._heap) - before
+
+        logger.info(f"🪣 Dispatcher window refilled up to {upper} | +{added} post(s), {len(self._heap)} queued")
+        return added
+
+    def dispatch_due(self, now: datetime = None, limit: int = None) -> int:
+        """
+        Pop every post that is due (at most `limit`, earliest first) and dispatch
+        them as one batch. Posts over the limit stay queued for the next tick.
+        Returns the batch size.
+        """
+        now = now or datetime.utcnow()
+        batch = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and (limit is None or len(batch) < limit):
+                _, content_id = heapq.heappop(self._heap)
+                self._queued.discard(content_id)
+                self._dispatched.add(content_id)
+                batch.append(content_id)
+
+        if batch:
+            self.dispatch_batch(batch)
+        return len(batch)
@@ -0,0 +1,93 @@
+"""
+Profile photo processing: square thumbnails in WebP and JPEG (the <picture> fallback), metadata stripped.
+
+Decoding and resizing run in a process pool, so a large photo neither blocks the
+event loop nor holds the GIL for the other requests. This module stays free of
+app imports beyond settings, since pool workers import it on start.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image, ImageOps, UnidentifiedImageError
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Edge lengths in pixels: the dashboard avatar is 42 CSS px, so 128 covers up to 3x density
+AVATAR_SIZES = (128,)
+AVATAR_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+DEFAULT_AVATAR_SIZE = 128
+DEFAULT_AVATAR_FORMAT = "webp"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class ImageProcessingError(Exception):
+    pass
+
+
+def render_avatar_variants(source_path: str, targets: dict):
+    """
+    Pool worker: decode `source_path` once and write each (size, format) in
+    `targets` ({(size, ext): path}) as a centre-cropped square. Pixels are copied
+    into a new image, so EXIF (GPS, camera), ICC and text chunks are not carried over.
+    """
+    try:
+        with Image.open(source_path) as image:
+            # Let JPEG decode at a reduced scale when the output is much smaller
+            image.draft("RGB", (max(AVATAR_SIZES) * 2, max(AVATAR_SIZES) * 2))
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ("RGBA", "LA", "P"):
+                rgba = image.convert("RGBA")
+                image = Image.new("RGB", rgba.size, (255, 255, 255))
+                image.paste(rgba, mask=rgba.getchannel("A"))
+            else:
+                image = image.convert("RGB")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise ImageProcessingError(f"Unsupported image ({type(e).__name__})")
+
+    for (size, extension), path in targets.items():
+        thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        pil_format, options = AVATAR_FORMATS[extension]
+        partial_path = f"{path}.part"
+        thumbnail.save(partial_path, pil_format, **options)
+        os.replace(partial_path, path)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the web process runs threads (scheduler, thread pool) that fork would copy mid-flight
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+async def render_in_pool(source_path: str, targets: dict):
+    """Run render_avatar_variants in the process pool. Raises ImageProcessingError for unusable images."""
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(get_pool(), render_avatar_variants, source_path, targets)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool for the next request
+        logger.error("❌ Image process pool broke, restarting it")
+        shutdown_pool()
+        raise
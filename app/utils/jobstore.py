@@ -0,0 +1,49 @@
+import pickle
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.util import datetime_to_utc_timestamp
+
+# Rows per INSERT statement, keeps each packet well under MySQL's max_allowed_packet
+BULK_INSERT_CHUNK_SIZE = 1000
+
+
+class BulkSQLAlchemyJobStore(SQLAlchemyJobStore):
+    """
+    SQLAlchemy job store that shares the application engine and can persist
+    many jobs with a handful of multi-row INSERTs instead of one per job.
+    """
+
+    _table_checked = False
+
+    def add_job_states(self, states, replace_existing: bool = False):
+        """
+        Insert serialized job states (dicts shaped like Job.__getstate__()) in
+        chunks. Works without a running scheduler, so a process that never starts
+        one can still enqueue jobs for a worker. Returns the number of rows written.
+        """
+        rows = [
+            {
+                "id": state["id"],
+                "next_run_time": datetime_to_utc_timestamp(state["next_run_time"]),
+                "job_state": pickle.dumps(state, self.pickle_protocol),
+            }
+            for state in states
+        ]
+        if not rows:
+            return 0
+
+        if not self._table_checked:
+            # start() normally creates the table, but enqueueing may happen without a scheduler
+            self.jobs_t.create(self.engine, checkfirst=True)
+            self._table_checked = True
+
+        with self.engine.begin() as connection:
+            for start in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+                chunk = rows[start:start + BULK_INSERT_CHUNK_SIZE]
+                if replace_existing:
+                    connection.execute(self.jobs_t.delete().where(self.jobs_t.c.id.in_([row["id"] for row in chunk])))
+                connection.execute(self.jobs_t.insert(), chunk)
+        return len(rows)
+
+    def shutdown(self):
+        # The engine belongs to app.core.database, so don't dispose it with the scheduler
+        pass
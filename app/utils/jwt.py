@@ -110,18 +110,13 @@ def generate_month_token(user_id: int):
     token = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
     return token
 
-def is_month_token_valid(request: Request, user_id: int, db: Session):
+def is_month_token_valid(request: Request, user: User):
     """
     Check if the month token is valid:
     - Token should match the one stored in the database for the user.
     - Token should not be expired.
     """
-    # 1️⃣ Get the month token stored in the database for the user
-    user = db.query(User).filter(User.id == user_id).first()
-
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
+    # 1️⃣ Get the month token stored in the database for the (already loaded) user
     db_month_token = user.month_token
 
     # 2️⃣ Get the month token from the session
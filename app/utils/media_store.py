@@ -0,0 +1,200 @@
+"""
+Content-addressed media store.
+
+Uploaded files are stored once per distinct content, under the storage key
+media/<sha[0:2]>/<sha[2:4]>/<sha256><ext> (see app.utils.storage), and served
+from the matching /static/media/... URL. A MediaBlob row per file counts the Content, ContentSeries
+and User rows that reference it; the file is removed with its last reference.
+URLs outside the store (legacy /static/uploads files, external avatars) are
+left alone by every function here.
+"""
+import logging
+import os
+import re
+from dataclasses import dataclass
+from fastapi import Request
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.models.user import MediaBlob
+from app.utils.preflight import hash_file
+from app.utils.storage import STATIC_URL_PREFIX, get_storage
+from app.utils.uploads import StagedForm, receive_form
+
+logger = logging.getLogger(__name__)
+
+MEDIA_URL_PREFIX = "/static/media/"
+# Unfinished uploads, kept out of static/ so they are never served. With local
+# storage, keep it on the same filesystem as static/ so placing a file is a rename.
+STAGING_ROOT = settings.MEDIA_STAGING_DIR
+INCOMING_DIR = os.path.join(STAGING_ROOT, "incoming")
+
+_EXTENSION = re.compile(r"\.[a-z0-9]{1,10}")
+# Derived variants (e.g. avatar thumbnails) sit next to their blob as <sha256>_<name><ext>
+_MEDIA_URL = re.compile(r"/static/media/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})(?:_[a-z0-9]{1,16})?(\.[a-z0-9]{1,10})?")
+
+
+@dataclass
+class StoredMedia:
+    url: str
+    size: int
+    sha256: str
+
+
+def media_storage_key(sha256: str, extension: str) -> str:
+    """Sharded storage key of a blob: two levels of 256 directories."""
+    return f"media/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+
+def media_url(sha256: str, extension: str) -> str:
+    return STATIC_URL_PREFIX + media_storage_key(sha256, extension)
+
+
+def variant_url(url: str, name: str, extension: str) -> str:
+    """URL of a derived file stored next to the blob behind `url`."""
+    sha256 = media_key(url)
+    return media_url(f"{sha256}_{name}", extension)
+
+
+def _remove_blob_files(sha256: str):
+    """Delete a blob and any variants derived from it; they all share the key prefix."""
+    get_storage().delete_prefix(media_storage_key(sha256, ""))
+
+
+def media_key(url: str):
+    """SHA-256 of a media store URL, or None for any other URL."""
+    match = _MEDIA_URL.fullmatch(url or "")
+    return match.group(1) if match else None
+
+
+def _clean_extension(filename: str) -> str:
+    extension = os.path.splitext(filename or "")[1].lower()
+    return extension if _EXTENSION.fullmatch(extension) else ""
+
+
+def _reference(db: Session, sha256: str, size: int, extension: str) -> MediaBlob:
+    """Add one reference to the blob, creating its row on first upload. Returns the row."""
+    updated = (
+        db.query(MediaBlob)
+        .filter(MediaBlob.sha256 == sha256)
+        .update({MediaBlob.ref_count: MediaBlob.ref_count + 1}, synchronize_session=False)
+    )
+    if not updated:
+        try:
+            with db.begin_nested():
+                db.add(MediaBlob(sha256=sha256, size=size, extension=extension, ref_count=1))
+        except IntegrityError:
+            # Another upload of the same bytes created the row first
+            db.query(MediaBlob).filter(MediaBlob.sha256 == sha256).update(
+                {MediaBlob.ref_count: MediaBlob.ref_count + 1}, synchronize_session=False
+            )
+    return db.query(MediaBlob).filter(MediaBlob.sha256 == sha256).one()
+
+
+def _place(incoming_path: str, key: str) -> bool:
+    """Move a finished upload into storage. Returns False when the blob was already there."""
+    storage = get_storage()
+    if storage.exists(key):
+        os.remove(incoming_path)
+        return False
+    storage.put_file(key, incoming_path)
+    return True
+
+
+def _commit_reference(db: Session, sha256: str, size: int, extension: str):
+    """Add and commit one reference to the blob. Returns (extension, ref_count) of its row. Blocking."""
+    try:
+        blob = _reference(db, sha256, size, extension)
+        db.commit()
+        return blob.extension, blob.ref_count
+    except BaseException:
+        db.rollback()
+        raise
+
+
+async def adopt_media_file(db: Session, path: str, filename: str, size: int = None, sha256: str = None) -> StoredMedia:
+    """
+    Move a complete file from the staging area into the store and take one
+    reference to it, committing the reference. Identical bytes land on the same
+    blob however they are named, so a re-upload costs no extra disk. Pass size and
+    sha256 when already known; otherwise the file is hashed off the event loop.
+    """
+    try:
+        if sha256 is None:
+            size = await run_in_threadpool(os.path.getsize, path)
+            sha256 = await run_in_threadpool(hash_file, path)
+        # Referenced before the file is placed, so a concurrent release can't delete it under us
+        extension, ref_count = await run_in_threadpool(_commit_reference, db, sha256, size, _clean_extension(filename))
+        url = media_url(sha256, extension)
+        try:
+            placed = await run_in_threadpool(_place, path, media_storage_key(sha256, extension))
+        except BaseException:
+            # Undo the committed reference, or the row would count a file that never arrived
+            await run_in_threadpool(release_media, db, url)
+            raise
+        if not placed:
+            logger.info(f"♻️ Reused stored media {sha256[:12]} ({ref_count} references)")
+    except BaseException:
+        if os.path.exists(path):
+            await run_in_threadpool(os.remove, path)
+        raise
+    return StoredMedia(url=url, size=size, sha256=sha256)
+
+
+def reference_media(db: Session, form: StagedForm) -> StoredMedia:
+    """
+    Take one reference to a received file's blob without putting the file itself in
+    the store, for uploads only served through derived variants (profile photos,
+    whose originals carry EXIF such as GPS). The staged file is left for the caller
+    to derive variants from and then discard. Commits; blocking.
+    """
+    upload = form.upload
+    extension, _ = _commit_reference(db, upload.sha256, upload.size, _clean_extension(form.filename))
+    return StoredMedia(url=media_url(upload.sha256, extension), size=upload.size, sha256=upload.sha256)
+
+
+async def receive_media_form(request: Request, file_field: str, max_bytes: int) -> StagedForm:
+    """Parse a multipart upload, streaming its `file_field` part into the staging area."""
+    return await receive_form(request, file_field, INCOMING_DIR, max_bytes)
+
+
+async def store_media(db: Session, form: StagedForm) -> StoredMedia:
+    """Move a received form's file into the store and take one reference to it. The caller stores the returned URL on its row."""
+    upload = form.upload
+    return await adopt_media_file(db, upload.path, form.filename, upload.size, upload.sha256)
+
+
+def add_media_refs(db: Session, url: str, count: int = 1):
+    """Count `count` more rows pointing at a stored blob (e.g. series occurrences). The caller commits."""
+    sha256 = media_key(url)
+    if sha256 is None or count <= 0:
+        return
+    db.query(MediaBlob).filter(MediaBlob.sha256 == sha256).update(
+        {MediaBlob.ref_count: MediaBlob.ref_count + count}, synchronize_session=False
+    )
+
+
+def release_media(db: Session, url: str, count: int = 1):
+    """
+    Drop references to a stored blob and delete it once none are left. Commits.
+    The file is removed while the row is still locked, so an upload of the same
+    bytes either re-references the row first or waits and re-creates the file.
+    """
+    sha256 = media_key(url)
+    if sha256 is None or count <= 0:
+        return
+    try:
+        db.query(MediaBlob).filter(MediaBlob.sha256 == sha256).update(
+            {MediaBlob.ref_count: MediaBlob.ref_count - count}, synchronize_session=False
+        )
+        blob = db.query(MediaBlob).filter(MediaBlob.sha256 == sha256, MediaBlob.ref_count <= 0).first()
+        if blob is not None:
+            db.delete(blob)
+            db.flush()
+            _remove_blob_files(blob.sha256)
+            logger.info(f"🗑️ Deleted unreferenced media {sha256[:12]}")
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Error releasing media {url}: {e}")
@@ -0,0 +1,128 @@
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.user import Content, ContentStatus, TikTokAccount
+from app.utils.publisher import PublishError
+from app.utils.storage import get_storage
+from app.utils.tiktok_auth import refresh_due_tokens
+from app.utils.tiktok_upload import probe_video, resolve_media_key
+
+logger = logging.getLogger(__name__)
+
+HASH_READ_SIZE = 1024 * 1024
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 of a file, read in fixed-size blocks so large videos aren't loaded whole."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_stored(media_key: str) -> str:
+    """SHA-256 of a stored object, streamed from the storage backend."""
+    digest = hashlib.sha256()
+    for block in get_storage().iter_range(media_key, chunk_size=HASH_READ_SIZE):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def prepare_media(media_url: str, known_size: int = None, known_checksum: str = None):
+    """
+    Validate a post's media ahead of time. Returns (size, sha256 hex).
+    A checksum recorded at upload is reused while the file size still matches.
+    """
+    media_key = resolve_media_key(media_url)
+    media_size = probe_video(media_key)
+    if known_checksum and known_size == media_size:
+        return media_size, known_checksum
+    return media_size, hash_stored(media_key)
+
+
+def prepare_due_posts(lead: timedelta = None, batch_size: int = None, grace: timedelta = timedelta(hours=1)) -> int:
+    """
+    Pre-flight stage: validate, measure and hash media for scheduled posts due
+    within `lead`, then mark them ready. Media that can't be posted goes to dead
+    now rather than failing at the scheduled instant. Returns the rows marked ready.
+
+    The status transitions are conditional on the row still being scheduled, so a
+    row claimed for publishing meanwhile is left alone, and several processes can
+    run this concurrently at the cost of some duplicated hashing.
+    """
+    lead = lead if lead is not None else timedelta(minutes=settings.PREFLIGHT_LEAD_MINUTES)
+    batch_size = batch_size or settings.PREFLIGHT_BATCH_SIZE
+    now = datetime.utcnow()
+
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(
+                Content.id, Content.user_id, Content.media_url, Content.media_size, Content.media_checksum,
+                TikTokAccount.access_token,
+            )
+            .outerjoin(TikTokAccount, TikTokAccount.user_id == Content.user_id)
+            .filter(
+                Content.status == ContentStatus.SCHEDULED,
+                Content.scheduled_time <= now + lead,
+                Content.scheduled_time >= now - grace,
+            )
+            .order_by(Content.scheduled_time)
+            .limit(batch_size)
+            .all()
+        )
+        # Release the connection while files are read
+        db.commit()
+
+        ready = 0
+        ready_owners = set()
+        for row in rows:
+            values = {}
+            try:
+                media_size, media_checksum = prepare_media(row.media_url, row.media_size, row.media_checksum)
+                values = {
+                    Content.status: ContentStatus.READY,
+                    Content.media_size: media_size,
+                    Content.media_checksum: media_checksum,
+                    Content.prepared_at: datetime.utcnow(),
+                }
+                if not row.access_token:
+                    # Not fatal yet: the user may reconnect TikTok before the post is due
+                    logger.warning(f"⚠️ Content ID {row.id} is ready but its owner has no TikTok access token.")
+            except PublishError as e:
+                logger.error(f"💀 Content ID {row.id} failed pre-flight: {e}")
+                values = {Content.status: ContentStatus.DEAD, Content.last_error: f"Pre-flight: {e}"}
+            except OSError as e:
+                # Unreadable right now (permissions, NFS hiccup); try again next pass
+                logger.warning(f"⚠️ Pre-flight could not read media for Content ID {row.id}: {e}")
+                continue
+
+            updated = db.query(Content).filter(
+                Content.id == row.id,
+                Content.status == ContentStatus.SCHEDULED,
+            ).update(values, synchronize_session=False)
+            db.commit()
+            if updated and values[Content.status] == ContentStatus.READY:
+                ready += 1
+                ready_owners.add(row.user_id)
+
+        if rows:
+            logger.info(f"🧪 Pre-flight marked {ready}/{len(rows)} post(s) ready.")
+        warm_access_tokens(ready_owners, lead)
+        return ready
+    finally:
+        db.close()
+
+
+def warm_access_tokens(user_ids, lead: timedelta):
+    """Refresh the tokens of ready posts' owners that would expire before the posts go out."""
+    if not user_ids or not settings.TIKTOK_CLIENT_KEY:
+        return
+    try:
+        refresh_due_tokens(lead, user_ids=list(user_ids))
+    except Exception as e:
+        # The periodic refresh job tries again; the post itself is ready either way
+        logger.warning(f"⚠️ Pre-flight could not warm access tokens: {e}")
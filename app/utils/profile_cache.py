@@ -0,0 +1,203 @@
+"""
+Cache of the dashboard's profile view, keyed by user id.
+
+The view is what the dashboard pages and /api/tiktok-profile show: the user's
+name, email and photo plus the linked TikTok account's name and picture. Reads
+check an in-process LRU first, then Redis when REDIS_URL is set (shared by every
+web process), and only then MySQL. Write paths that change any of these fields
+call invalidate_profile() after they commit; entries also expire after a TTL.
+
+Invalidation clears this process's LRU and Redis, never another process's LRU,
+so local entries only live PROFILE_CACHE_LOCAL_TTL_SECONDS. Without Redis that
+is how stale other web processes can be after an edit; set
+PROFILE_CACHE_SINGLE_PROCESS only when one process serves the dashboard.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import get_async_db
+from app.utils.metrics import PROFILE_CACHE_LOOKUPS
+from app.utils.session_user import load_session_user
+
+try:
+    import redis
+except ImportError:  # Only needed when REDIS_URL is set
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "profile:"
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def profile_view(user) -> dict:
+    """The cached fields of a user loaded with its tiktok_account."""
+    tiktok_account = user.tiktok_account
+    return {
+        "user_id": user.id,
+        "full_name": user.full_name,
+        "email": user.email,
+        "profile_photo_url": user.profile_photo_url,
+        "tiktok_linked": tiktok_account is not None,
+        "tiktok_username": tiktok_account.username if tiktok_account else None,
+        "tiktok_profile_picture": tiktok_account.profile_picture if tiktok_account else None,
+    }
+
+
+class ProfileCache:
+    """In-process LRU with per-entry TTL, optionally backed by Redis."""
+
+    def __init__(self, ttl: int, max_entries: int, redis_url: str = None, local_ttl: int = None, single_process: bool = False):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._redis = None
+        if redis_url:
+            if redis is None:
+                raise RuntimeError("REDIS_URL needs the redis package; install it with `pip install redis`")
+            # Short timeouts: a slow Redis falls back to MySQL instead of stalling the page
+            self._redis = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        # Another process's invalidation never reaches this LRU, so local copies are kept briefly
+        self.local_ttl = ttl if single_process or not local_ttl else min(local_ttl, ttl)
+        if self._redis is None and not single_process:
+            logger.info(f"ℹ️ Profile cache has no Redis tier; other processes' edits show within {self.local_ttl}s")
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a load that raced one isn't cached
+        self.epoch = 0
+
+    @property
+    def shared(self) -> bool:
+        return self._redis is not None
+
+    def get_local(self, user_id: int) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, profile = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+        PROFILE_CACHE_LOOKUPS.inc(result="local")
+        return profile
+
+    def _set_local(self, user_id: int, profile: dict):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.local_ttl, profile)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_shared(self, user_id: int) -> Optional[dict]:
+        """Look the profile up in Redis (blocking), filling the local tier on a hit."""
+        try:
+            raw = self._redis.get(f"{REDIS_KEY_PREFIX}{user_id}")
+        except redis.RedisError as e:
+            logger.warning(f"⚠️ Profile cache read from Redis failed: {e}")
+            return None
+        if raw is None:
+            return None
+        profile = json.loads(raw)
+        self._set_local(user_id, profile)
+        PROFILE_CACHE_LOOKUPS.inc(result="redis")
+        return profile
+
+    def put(self, user_id: int, profile: dict, epoch: int):
+        """Cache a profile loaded when `epoch` was current (blocking with Redis). Skipped if an invalidation ran since."""
+        if epoch != self.epoch:
+            return
+        self._set_local(user_id, profile)
+        if self._redis is not None:
+            try:
+                self._redis.set(f"{REDIS_KEY_PREFIX}{user_id}", json.dumps(profile), ex=self.ttl)
+            except redis.RedisError as e:
+                logger.warning(f"⚠️ Profile cache write to Redis failed: {e}")
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self.epoch += 1
+            self._entries.pop(user_id, None)
+        if self._redis is not None:
+            try:
+                self._redis.delete(f"{REDIS_KEY_PREFIX}{user_id}")
+            except redis.RedisError as e:
+                logger.error(f"❌ Profile cache invalidation in Redis failed for user {user_id}: {e}")
+
+
+def get_profile_cache() -> ProfileCache:
+    """The process-wide cache, created on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ProfileCache(
+                settings.PROFILE_CACHE_TTL_SECONDS,
+                settings.PROFILE_CACHE_MAX_ENTRIES,
+                redis_url=settings.REDIS_URL,
+                local_ttl=settings.PROFILE_CACHE_LOCAL_TTL_SECONDS,
+                single_process=settings.PROFILE_CACHE_SINGLE_PROCESS,
+            )
+        return _cache
+
+
+def invalidate_profile(user_id: int):
+    """Drop a user's cached profile. Call after committing a change to any cached field."""
+    if user_id is not None:
+        get_profile_cache().invalidate(user_id)
+
+
+async def invalidate_profile_async(user_id: int):
+    """invalidate_profile() for async handlers: the Redis round-trip runs off the event loop."""
+    cache = get_profile_cache()
+    if user_id is None:
+        return
+    if cache.shared:
+        await asyncio.to_thread(cache.invalidate, user_id)
+    else:
+        cache.invalidate(user_id)
+
+
+async def load_session_profile(request: Request, db: AsyncSession) -> Optional[dict]:
+    """The session user's profile view, from the cache when possible. None when not logged in."""
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return None
+    cache = get_profile_cache()
+    profile = cache.get_local(user_id)
+    if profile is None and cache.shared:
+        profile = await asyncio.to_thread(cache.get_shared, user_id)
+    if profile is not None:
+        return profile
+
+    PROFILE_CACHE_LOOKUPS.inc(result="miss")
+    epoch = cache.epoch
+    user = await load_session_user(request, db)
+    if user is None:
+        return None
+    profile = profile_view(user)
+    if cache.shared:
+        await asyncio.to_thread(cache.put, user_id, profile, epoch)
+    else:
+        cache.put(user_id, profile, epoch)
+    return profile
+
+
+async def get_session_profile(request: Request, db: AsyncSession = Depends(get_async_db)) -> Optional[dict]:
+    """Dependency for pages: the logged-in user's profile view, or None."""
+    return await load_session_profile(request, db)
+
+
+async def require_session_profile(profile: Optional[dict] = Depends(get_session_profile)) -> dict:
+    """Dependency for API routes: the logged-in user's profile view, or 401."""
+    if profile is None:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return profile
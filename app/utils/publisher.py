@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import threading
+import httpx
+from app.core.config import settings
+from app.utils.metrics import PUBLISH_IN_FLIGHT
+from app.utils.rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class PublishError(Exception):
+    """
+    A failed publish attempt. Transient failures are retried with backoff, others go to dead.
+    `in_doubt` marks failures where TikTok may have accepted the post anyway.
+    `auth_failed` marks a rejected access token, which is refreshed before the retry.
+    """
+
+    def __init__(self, message: str, transient: bool = True, retry_after: float = None, in_doubt: bool = False,
+                 auth_failed: bool = False):
+        super().__init__(message)
+        self.transient = transient
+        self.retry_after = retry_after
+        self.in_doubt = in_doubt
+        self.auth_failed = auth_failed
+
+
+class PublishingEngine:
+    """
+    Runs publishing coroutines on one long-lived event loop in a background thread.
+
+    All posts share a single pooled httpx.AsyncClient, so connections to TikTok are
+    reused instead of paying a TCP+TLS handshake per post, and a semaphore caps how
+    many posts are in flight at once. Scheduler threads hand work over with submit()
+    and return immediately. Work submitted with a rate_key is paced by the rate
+    limiter before it takes a concurrency slot, so a throttled account never holds
+    up posts for other accounts.
+    """
+
+    def __init__(self, concurrency: int, max_connections: int, timeout: float, transport=None, rate_limiter=None):
+        self.concurrency = concurrency
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.transport = transport  # Injectable for benchmarks (e.g. httpx.MockTransport)
+        self.rate_limiter = rate_limiter
+        self.client = None
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+        self._pending = 0  # Submitted and not finished: waiting for pacing, a slot, or running
+        self._pending_lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the event loop thread and the shared HTTP client (idempotent)."""
+        with self._lock:
+            if self.running:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                loop.run_until_complete(self._open())
+                ready.set()
+                loop.run_forever()
+                loop.run_until_complete(self._close())
+                loop.close()
+
+            self._loop = loop
+            self._thread = threading.Thread(target=run, name="publishing-engine", daemon=True)
+            self._thread.start()
+            ready.wait()
+            logger.info(f"🟢 Publishing engine started (concurrency={self.concurrency}, max_connections={self.max_connections})")
+
+    def stop(self, timeout: float = 30):
+        """Stop the loop once queued posts are handed off and close the HTTP client."""
+        with self._lock:
+            if not self.running:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+            self._thread = None
+            self._loop = None
+            logger.info("🛑 Publishing engine stopped")
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def free_capacity(self, horizon: float) -> int:
+        """
+        How many more submissions could start within `horizon` seconds: free
+        concurrency slots, capped by what the global rate budget admits by then.
+        """
+        free = max(self.concurrency - self._pending, 0)
+        budget = self.rate_limiter.budget(horizon) if self.rate_limiter else None
+        if budget is not None:
+            free = min(free, budget)
+        return free
+
+    def submit(self, func, *args, rate_key=None):
+        """Schedule func(*args) on the engine loop, paced for rate_key and under the concurrency limit."""
+        if not self.running:
+            self.start()
+        with self._pending_lock:
+            self._pending += 1
+        future = asyncio.run_coroutine_threadsafe(self._run_limited(func, *args, rate_key=rate_key), self._loop)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future):
+        with self._pending_lock:
+            self._pending -= 1
+
+    def call(self, func, *args):
+        """Run func(*args) on the engine loop without pacing or a concurrency slot, for housekeeping calls."""
+        if not self.running:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(func(*args), self._loop)
+
+    async def _run_limited(self, func, *args, rate_key=None):
+        if self.rate_limiter:
+            waited = await self.rate_limiter.acquire(rate_key)
+            if waited > 1:
+                logger.info(f"⏱️ Paced {rate_key or 'global'} call by {waited:.1f}s")
+        async with self._semaphore:
+            PUBLISH_IN_FLIGHT.inc()
+            try:
+                return await func(*args)
+            finally:
+                PUBLISH_IN_FLIGHT.dec()
+
+    async def _open(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            timeout=self.timeout,
+            transport=self.transport,
+        )
+
+    async def _close(self):
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        await self.client.aclose()
+        self.client = None
+
+
+publisher = PublishingEngine(
+    concurrency=settings.PUBLISH_CONCURRENCY,
+    max_connections=settings.PUBLISH_HTTP_MAX_CONNECTIONS,
+    timeout=settings.PUBLISH_HTTP_TIMEOUT,
+    # This process's share of the app's TikTok quota
+    rate_limiter=RateLimiter(
+        rate_per_key=settings.TIKTOK_ACCOUNT_RATE_PER_MINUTE / 60 / settings.TIKTOK_RATE_WORKERS,
+        burst_per_key=settings.TIKTOK_ACCOUNT_BURST / settings.TIKTOK_RATE_WORKERS,
+        global_rate=settings.TIKTOK_GLOBAL_RATE_PER_MINUTE / 60 / settings.TIKTOK_RATE_WORKERS,
+        global_burst=settings.TIKTOK_GLOBAL_BURST / settings.TIKTOK_RATE_WORKERS,
+    ),
+)
@@ -2,6 +2,12 @@ import random
 from app.models import User  # Ensure to import your User model
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
+from app.utils.profile_cache import invalidate_profile
+
+def random_avatar_url() -> str:
+    """A random Multiavatar image URL."""
+    avatar_id = random.randint(1, 1000)  # Random ID for unique avatars
+    return f"https://api.multiavatar.com/{avatar_id}.png"
 
 def generate_random_profile_photo(user: User, db: Session):
     """
@@ -14,12 +20,12 @@ def generate_random_profile_photo(user: User, db: Session):
 
     try:
         # Generate a unique avatar URL using Multiavatar
-        avatar_id = random.randint(1, 1000)  # Random ID for unique avatars
-        avatar_url = f"https://api.multiavatar.com/{avatar_id}.png"
+        avatar_url = random_avatar_url()
 
         # Save the avatar URL to the user in the database
         user.profile_photo_url = avatar_url
         db.commit()  # Commit the changes to the database
+        invalidate_profile(user.id)
 
         return avatar_url  # Return the avatar URL
 
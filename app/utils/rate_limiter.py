@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available (0 if one is available now)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def peek(self, now: float) -> float:
+        """Tokens available at `now`, without updating the bucket (safe to call from another thread)."""
+        return min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class RateLimiter:
+    """
+    Per-key token buckets plus one global bucket, for pacing outbound calls.
+
+    acquire() waits until both the key's bucket and the global bucket have a
+    token instead of rejecting, so a burst is spread out rather than failing
+    upstream. Checks are O(1) dict lookups and float math; it is meant to be
+    used from a single event loop, so no locking is needed. A rate of 0 or
+    less leaves that limit off, like AdmissionGate.
+
+    Buckets live in this process: with several publishing processes, give each
+    its share of the upstream quota (see TIKTOK_RATE_WORKERS).
+    """
+
+    def __init__(self, rate_per_key: float, burst_per_key: float, global_rate: float, global_burst: float,
+                 max_idle_keys: int = 10000):
+        self.rate_per_key = rate_per_key
+        self.burst_per_key = max(burst_per_key, 1)
+        self.global_bucket = TokenBucket(global_rate, max(global_burst, 1)) if global_rate > 0 else None
+        self.max_idle_keys = max_idle_keys
+        self._buckets = {}
+        self.waiting = 0  # Calls blocked in acquire()
+
+    def _bucket(self, key):
+        if key is None or self.rate_per_key <= 0:
+            return None
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_idle_keys:
+                self._evict_idle()
+            bucket = self._buckets[key] = TokenBucket(self.rate_per_key, self.burst_per_key)
+        return bucket
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        for key in [key for key, bucket in self._buckets.items() if bucket.is_idle(now)]:
+            del self._buckets[key]
+
+    async def acquire(self, key=None) -> float:
+        """Wait for a token for `key` (global budget only if None). Returns seconds waited."""
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            while True:
+                now = time.monotonic()
+                bucket = self._bucket(key)
+                wait = max(
+                    self.global_bucket.wait_time(now) if self.global_bucket else 0.0,
+                    bucket.wait_time(now) if bucket else 0.0,
+                )
+                if wait <= 0:
+                    if self.global_bucket:
+                        self.global_bucket.take()
+                    if bucket:
+                        bucket.take()
+                    return now - started
+                await asyncio.sleep(wait)
+        finally:
+            self.waiting -= 1
+
+    def budget(self, seconds: float):
+        """Calls the global bucket can admit within `seconds`, less those already waiting for it; None if unbounded."""
+        if self.global_bucket is None:
+            return None
+        available = self.global_bucket.peek(time.monotonic()) + self.global_bucket.rate * seconds
+        return max(int(available) - self.waiting, 0)
+
+
+class AdmissionGate:
+    """
+    Thread-safe token bucket that bounds how many posts enter publishing per second,
+    so a spike of due posts is fed to the database and upstream at a steady rate.
+    A rate of 0 or less admits everything.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.bucket = TokenBucket(rate, max(burst, 1)) if rate > 0 else None
+        self._lock = threading.Lock()
+
+    def admit(self, limit: int = None):
+        """Take up to `limit` admissions (all available if None) and return the count; unbounded returns `limit`."""
+        if self.bucket is None:
+            return limit
+        with self._lock:
+            self.bucket.wait_time(time.monotonic())  # Refills the bucket
+            admitted = int(self.bucket.tokens)
+            if limit is not None:
+                admitted = min(admitted, limit)
+            self.bucket.tokens -= admitted
+            return admitted
+
+    def refund(self, count: int):
+        """Return admissions that were taken but not used."""
+        if self.bucket is None or not count:
+            return
+        with self._lock:
+            self.bucket.tokens = min(self.bucket.capacity, self.bucket.tokens + count)
+
+    def wait(self):
+        """Block the calling thread until one post may be admitted."""
+        if self.bucket is None:
+            return
+        while True:
+            with self._lock:
+                wait = self.bucket.wait_time(time.monotonic())
+                if wait <= 0:
+                    self.bucket.take()
+                    return
+            time.sleep(wait)
@@ -0,0 +1,208 @@
+"""
+Resumable uploads, modelled on the tus protocol.
+
+The client creates an upload with its total length, then PATCHes the bytes in
+order, each request carrying the offset it starts at. Bytes are appended to a
+staging file and the offset is recorded even when a request is cut off, so after
+a dropped connection the client asks for the offset (HEAD) and carries on from
+there. Once every byte has arrived the upload is finalized into the media store.
+"""
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from app.core.config import settings
+from app.models.user import UploadSession
+from app.utils.media_store import STAGING_ROOT, StoredMedia, adopt_media_file
+
+logger = logging.getLogger(__name__)
+
+RESUMABLE_DIR = os.path.join(STAGING_ROOT, "resumable")
+
+
+def staging_path(upload_id: str) -> str:
+    return os.path.join(RESUMABLE_DIR, upload_id)
+
+
+def _remove_staging_file(upload_id: str):
+    path = staging_path(upload_id)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _create_staging_file(upload_id: str):
+    os.makedirs(RESUMABLE_DIR, exist_ok=True)
+    open(staging_path(upload_id), "xb").close()
+
+
+def purge_expired_uploads(db: Session, now: datetime = None, limit: int = 100) -> int:
+    """Delete abandoned uploads and their staging files. Returns how many were removed."""
+    now = now or datetime.utcnow()
+    expired = db.query(UploadSession.id).filter(UploadSession.expires_at < now).limit(limit).all()
+    for (upload_id,) in expired:
+        _remove_staging_file(upload_id)
+    if expired:
+        db.query(UploadSession).filter(UploadSession.id.in_([upload_id for (upload_id,) in expired])).delete(
+            synchronize_session=False
+        )
+        db.commit()
+        logger.info(f"🧹 Purged {len(expired)} abandoned upload(s).")
+    return len(expired)
+
+
+async def create_upload(db: Session, user_id: int, filename: str, length: int) -> UploadSession:
+    if length <= 0:
+        raise HTTPException(status_code=400, detail="Upload length must be positive")
+    if length > settings.MAX_MEDIA_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413, detail=f"Upload exceeds the {settings.MAX_MEDIA_UPLOAD_BYTES // (1024 * 1024)} MB limit"
+        )
+
+    await run_in_threadpool(purge_expired_uploads, db)
+    upload = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        filename=os.path.basename(filename)[:255] or "upload",
+        length=length,
+        offset=0,
+        expires_at=datetime.utcnow() + timedelta(hours=settings.RESUMABLE_UPLOAD_TTL_HOURS),
+    )
+    await run_in_threadpool(_create_staging_file, upload.id)
+    db.add(upload)
+    await run_in_threadpool(db.commit)
+    # Loaded back off the event loop; the caller reads its columns
+    await run_in_threadpool(db.refresh, upload)
+    return upload
+
+
+def get_upload(db: Session, upload_id: str, user_id: int) -> UploadSession:
+    """The user's unexpired upload, or 404."""
+    upload = db.query(UploadSession).filter(UploadSession.id == upload_id, UploadSession.user_id == user_id).first()
+    if upload is None or upload.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+
+def _lock_upload(db: Session, upload_id: str) -> UploadSession:
+    """
+    SELECT ... FOR UPDATE NOWAIT the upload's row, opening the transaction that
+    serializes writers. A request finding it locked gets 409 instead of waiting.
+    Blocking; run it in the threadpool.
+    """
+    try:
+        upload = (
+            db.query(UploadSession)
+            .filter(UploadSession.id == upload_id)
+            .populate_existing()
+            .with_for_update(nowait=True)
+            .one_or_none()
+        )
+    except OperationalError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Another request is writing to this upload")
+    if upload is None:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+
+def _commit_part(db: Session, upload_id: str, start: int, part_path: str, written: int):
+    """
+    Append a PATCH's part file at `start` and advance the offset, but only if the
+    offset is still `start`: the row is locked and the offset compare-and-set
+    before the staging file is touched, and the file is written before the commit.
+    Blocking; run it in the threadpool.
+    """
+    _lock_upload(db, upload_id)
+    try:
+        moved = db.query(UploadSession).filter(UploadSession.id == upload_id, UploadSession.offset == start).update(
+            {UploadSession.offset: start + written}, synchronize_session=False,
+        )
+        if not moved:
+            raise HTTPException(status_code=409, detail=f"Upload-Offset {start} is no longer the current offset")
+        with open(staging_path(upload_id), "r+b") as file, open(part_path, "rb") as part:
+            # Bytes past the offset are left over from an append whose commit failed; drop them
+            file.truncate(start)
+            file.seek(start)
+            shutil.copyfileobj(part, file)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+
+
+async def append_chunk(db: Session, upload: UploadSession, offset: int, chunks) -> int:
+    """
+    Write the bytes of one PATCH (an async iterator of chunks) at `offset`, which
+    must be the upload's current offset. Whatever arrived is kept and recorded if
+    the client disconnects part way. Returns the new offset.
+
+    The body is streamed into a part file of its own with no transaction open, so
+    a slow client holds neither the row lock nor a pooled connection. The part is
+    then appended under a short row lock, only if the offset has not moved since:
+    of two PATCHes racing for the same offset, one lands and the other gets 409.
+    """
+    upload_id, length, start = upload.id, upload.length, upload.offset
+    # End the transaction that loaded the upload before waiting on the client
+    await run_in_threadpool(db.rollback)
+    if offset != start:
+        raise HTTPException(status_code=409, detail=f"Upload-Offset {offset} does not match the current offset {start}")
+
+    part_path = f"{staging_path(upload_id)}.{uuid.uuid4().hex}.part"
+    written = 0
+    try:
+        file = await run_in_threadpool(open, part_path, "xb")
+        try:
+            try:
+                async for chunk in chunks:
+                    if start + written + len(chunk) > length:
+                        raise HTTPException(status_code=413, detail="Chunk runs past the declared upload length")
+                    await run_in_threadpool(file.write, chunk)
+                    written += len(chunk)
+            except ClientDisconnect:
+                logger.info(f"📶 Upload {upload_id} interrupted after {start + written}/{length} bytes")
+        finally:
+            await run_in_threadpool(file.close)
+
+        if written:
+            await run_in_threadpool(_commit_part, db, upload_id, start, part_path, written)
+    finally:
+        if os.path.exists(part_path):
+            await run_in_threadpool(os.remove, part_path)
+    return start + written
+
+
+async def finalize_upload(db: Session, upload: UploadSession) -> StoredMedia:
+    """Move a complete upload into the media store and forget the upload. Returns the stored media."""
+    upload = await run_in_threadpool(_lock_upload, db, upload.id)
+    try:
+        if upload.offset != upload.length:
+            raise HTTPException(status_code=409, detail=f"Upload incomplete: {upload.offset}/{upload.length} bytes received")
+        # The recorded offset is only as good as the staging file behind it
+        size = await run_in_threadpool(os.path.getsize, staging_path(upload.id))
+        if size != upload.length:
+            logger.error(f"❌ Upload {upload.id} staging file has {size} bytes, expected {upload.length}")
+            raise HTTPException(status_code=409, detail=f"Upload incomplete: {size}/{upload.length} bytes stored")
+
+        upload_id, filename = upload.id, upload.filename
+        # Claim the upload first, so a second finalize can't adopt the same file
+        db.delete(upload)
+        await run_in_threadpool(db.commit)
+    except BaseException:
+        await run_in_threadpool(db.rollback)
+        raise
+    return await adopt_media_file(db, staging_path(upload_id), filename)
+
+
+async def abort_upload(db: Session, upload: UploadSession):
+    upload = await run_in_threadpool(_lock_upload, db, upload.id)
+    upload_id = upload.id
+    db.delete(upload)
+    await run_in_threadpool(db.commit)
+    await run_in_threadpool(_remove_staging_file, upload_id)
@@ -1,16 +1,50 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED
-from datetime import datetime
+from apscheduler.job import Job
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.triggers.date import DateTrigger
+from datetime import datetime, timedelta
+import asyncio
 import logging
-import httpx
 import os
+import random
+import socket
+import uuid
+from sqlalchemy import String, and_, cast, func, literal, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from asgiref.sync import async_to_sync
-from app.models.user import Content, TikTokAccount
-from app.core.database import SessionLocal  # Import database session factory
+from app.models.user import Content, ContentSeries, ContentStatus, TikTokAccount, User
+from app.core.config import settings
+from app.core.database import SessionLocal, engine  # Import database session factory
+from app.utils.dispatcher import DueContentDispatcher
+from app.utils.jobstore import BulkSQLAlchemyJobStore
+from app.utils.metrics import DISPATCH_LAG_SECONDS, PENDING_POSTS, PUBLISH_LAG_SECONDS, PUBLISH_RESULTS, SCHEDULER_JOB_EVENTS
+from app.utils.publisher import PublishError, publisher
+from app.utils.rate_limiter import AdmissionGate
+from app.utils.series import expand_series
+from app.utils.tiktok_auth import refresh_due_tokens, refresh_user_token
+from app.utils.preflight import prepare_due_posts
+from app.utils.storage import get_storage
+from app.utils.tiktok_upload import fetch_publish_status, probe_video, resolve_media_key, upload_video
 
-# Initialize the scheduler
-scheduler = BackgroundScheduler()
+JOB_ID_PREFIX = "content_post_"
+JOB_MISFIRE_GRACE_TIME = 3600  # Allow retry if missed
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"  # Prefix of this process's lease tokens
+UPLOAD_URL_TTL = timedelta(hours=1)  # TikTok upload URLs expire an hour after init
+
+# Initialize the scheduler with a durable job store on the app's database,
+# plus an in-memory store for per-process housekeeping jobs
+job_store = BulkSQLAlchemyJobStore(engine=engine, tablename="apscheduler_jobs")
+scheduler = BackgroundScheduler(
+    jobstores={
+        "default": job_store,
+        "memory": MemoryJobStore(),
+    },
+    job_defaults={"misfire_grace_time": JOB_MISFIRE_GRACE_TIME, "coalesce": True, "max_instances": 1},
+)
+
+# Bounds how many due posts per second are handed to the publishing engine
+admission = AdmissionGate(settings.PUBLISH_ADMISSION_RATE, settings.PUBLISH_ADMISSION_BURST)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -19,107 +53,856 @@ logger = logging.getLogger(__name__)
 # ✅ APScheduler Job Listener to Catch Errors and Executions
 def job_listener(event):
     """Logs whenever a scheduled job is executed, fails, or is missed."""
+    if event.code == EVENT_JOB_MISSED:
+        SCHEDULER_JOB_EVENTS.inc(event="missed")
+    else:
+        SCHEDULER_JOB_EVENTS.inc(event="error" if event.exception else "executed")
+
     if event.exception:
         logger.error(f"❌ Job failed: {event.job_id} | Exception: {event.exception}")
     elif event.code == EVENT_JOB_MISSED:
         logger.warning(f"⚠️ Job MISSED: {event.job_id} | Time: {datetime.utcnow()}")
-    else:
+    elif event.job_id.startswith(JOB_ID_PREFIX):
         logger.info(f"✅ Job SUCCESS: {event.job_id} | Time: {datetime.utcnow()}")
 
 # Add listener for job events
 scheduler.add_listener(job_listener, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
 
-async def post_content_to_tiktok(content_id: int, request=None):
-    """Function to post scheduled content to TikTok"""
-    logger.info(f"🟢 Starting TikTok post process for Content ID {content_id} at {datetime.utcnow()}")
+def count_pending_posts():
+    """Scrape-time gauge value: posts still waiting to be published, by status."""
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(Content.status, func.count(Content.id))
+            .filter(Content.status.in_([
+                ContentStatus.SCHEDULED, ContentStatus.READY, ContentStatus.CLAIMED, ContentStatus.PUBLISHING, ContentStatus.RETRY,
+            ]))
+            .group_by(Content.status)
+            .all()
+        )
+        return {(status,): count for status, count in rows}
+    finally:
+        db.close()
+
+PENDING_POSTS.set_function(count_pending_posts)
+
+def stored_size(media_key: str):
+    """Size of a stored media file, or None when it is missing."""
+    try:
+        return get_storage().size(media_key)
+    except FileNotFoundError:
+        return None
 
+def load_post_contexts(content_ids):
+    """
+    Blocking DB lookup for a batch of posts, run off the publishing loop.
+    One query joins each Content row to its owner's TikTok account; returns
+    {content_id: context} with plain values so no session outlives this call.
+    """
     db = SessionLocal()  # Manually create a database session
     try:
-        # ✅ Fetch content data
-        content = db.query(Content).filter(Content.id == content_id).first()
-        if not content:
-            logger.error(f"❌ Content ID {content_id} not found in the database.")
-            return
+        rows = (
+            db.query(
+                Content.id, Content.user_id, Content.title, Content.media_url, Content.attempt_count, Content.media_size,
+                Content.prepared_at,
+                Content.scheduled_time, func.coalesce(Content.next_attempt_at, Content.scheduled_time).label("due_at"),
+                TikTokAccount.openid, TikTokAccount.access_token,
+            )
+            .outerjoin(TikTokAccount, TikTokAccount.user_id == Content.user_id)
+            .filter(Content.id.in_(content_ids))
+            .all()
+        )
+        return {
+            row.id: {
+                "user_id": row.user_id,
+                "title": row.title,
+                "media_url": row.media_url,
+                "attempt_count": row.attempt_count or 0,
+                "media_size": row.media_size,
+                "prepared_at": row.prepared_at,
+                "scheduled_time": row.scheduled_time,
+                "due_at": row.due_at,
+                "openid": row.openid,
+                "access_token": row.access_token,
+            }
+            for row in rows
+        }
+    finally:
+        db.close()  # Close the session
+
+def new_claim_token() -> str:
+    """Lease owner written to Content.claimed_by; unique per claimed batch."""
+    return f"{WORKER_ID}:{uuid.uuid4().hex[:12]}"
+
+def retry_delay(attempt: int, retry_after: float = None) -> float:
+    """
+    Exponential backoff with equal jitter: half the capped delay is fixed, half is random,
+    so a batch that failed together doesn't come back as a synchronized retry storm.
+    """
+    delay = min(settings.PUBLISH_RETRY_MAX_SECONDS, settings.PUBLISH_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+    delay = delay / 2 + random.uniform(0, delay / 2)
+    return max(delay, retry_after or 0)
+
+def record_post_result(content_id: int, claim_token: str = None, attempt_count: int = 0, error: PublishError = None):
+    """
+    Store the outcome of a publish attempt and release any lease on the row.
+    Returns the retry time if the post was sent back for another attempt.
+    """
+    attempts = attempt_count + 1
+    next_attempt_at = None
+    if error is None:
+        status = ContentStatus.PUBLISHED
+    elif error.transient and attempts < settings.PUBLISH_MAX_ATTEMPTS:
+        status = ContentStatus.RETRY
+        next_attempt_at = datetime.utcnow() + timedelta(seconds=retry_delay(attempts, error.retry_after))
+    else:
+        status = ContentStatus.DEAD
+
+    db = SessionLocal()
+    try:
+        # Only the lease holder may finish the row; a reclaimed row belongs to the new worker
+        query = db.query(Content).filter(Content.id == content_id)
+        if claim_token:
+            query = query.filter(Content.claimed_by == claim_token)
+        else:
+            query = query.filter(Content.claimed_by.is_(None))
+        updated = query.update(
+            {
+                Content.status: status,
+                Content.attempt_count: attempts,
+                Content.next_attempt_at: next_attempt_at,
+                Content.last_error: str(error) if error else None,
+                Content.claimed_by: None,
+                Content.lease_until: None,
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    if not updated:
+        return None
+    PUBLISH_RESULTS.inc(result=status)
+    if status == ContentStatus.RETRY:
+        logger.warning(f"🔁 Content ID {content_id} attempt {attempts} failed, retrying at {next_attempt_at}: {error}")
+        schedule_retries([(content_id, next_attempt_at)])
+    elif status == ContentStatus.DEAD:
+        logger.error(f"💀 Content ID {content_id} moved to dead-letter after {attempts} attempt(s): {error}")
+    return next_attempt_at
+
+def publish_key(content_id: int, attempt_count: int) -> str:
+    """Idempotency key of one publish attempt: the same post and attempt can only start once."""
+    return f"{content_id}-{attempt_count + 1}"
+
+def begin_publishing(content_id: int, claim_token: str, attempt_count: int) -> bool:
+    """
+    Atomically move a leased row to publishing right before the upstream call.
+
+    The UPDATE only matches while this worker still holds the lease and the
+    attempt's publish key has not been used, so a misfired duplicate job, a
+    second process or a reclaimed lease can never reach TikTok for the same
+    attempt. Rows left in publishing are settled by reconcile_stale_publishing().
+    """
+    key = publish_key(content_id, attempt_count)
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        updated = db.query(Content).filter(
+            Content.id == content_id,
+            Content.status == ContentStatus.CLAIMED,
+            Content.claimed_by == claim_token,
+            or_(Content.publish_key.is_(None), Content.publish_key != key),
+        ).update(
+            {
+                Content.status: ContentStatus.PUBLISHING,
+                Content.publish_key: key,
+                Content.publish_id: None,
+                Content.publishing_started_at: now,
+                Content.lease_until: now + timedelta(seconds=settings.CLAIM_LEASE_SECONDS),
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+        return bool(updated)
+    finally:
+        db.close()
+
+def store_publish_id(content_id: int, claim_token: str, publish_id: str):
+    """Remember TikTok's publish_id so a crashed attempt can be reconciled instead of reposted."""
+    db = SessionLocal()
+    try:
+        db.query(Content).filter(Content.id == content_id, Content.claimed_by == claim_token).update(
+            {Content.publish_id: publish_id}, synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+
+async def refresh_rejected_token(user_id: int):
+    """TikTok rejected the stored access token: refresh it now so the retry picks up a valid one."""
+    try:
+        if await refresh_user_token(publisher.client, user_id):
+            logger.info(f"🔑 Refreshed the rejected TikTok access token of user {user_id} before retrying.")
+    except Exception as e:
+        logger.warning(f"⚠️ Could not refresh the rejected TikTok access token of user {user_id}: {e}")
+
+async def post_content_to_tiktok(content_id: int, post: dict, request=None):
+    """
+    Function to post scheduled content to TikTok, run on the publishing engine loop.
+    `post` is the context dispatch_due_batch() loaded for a leased row; its claim_token
+    is what lets begin_publishing() take the row, so there is no unleased path.
+    """
+    logger.info(f"🟢 Starting TikTok post process for Content ID {content_id} at {datetime.utcnow()}")
+
+    error = None
+    owned = False  # Set once this call holds the row in publishing; only then is a result recorded
+    try:
+        if post["due_at"]:
+            DISPATCH_LAG_SECONDS.observe(max((datetime.utcnow() - post["due_at"]).total_seconds(), 0))
 
         # ✅ Check for access token in session first
-        access_token = None
         if request:
-            access_token = request.session.get("tiktok_session", {}).get("access_token")
-
-        if not access_token:
-            # ✅ If not found in session, fetch from the database
-            user_tiktok_data = db.query(TikTokAccount).filter(TikTokAccount.user_id == content.user_id).first()
-            if user_tiktok_data and user_tiktok_data.access_token:
-                access_token = user_tiktok_data.access_token
-            else:
-                logger.error(f"❌ User {content.user_id} is not authenticated with TikTok, and no access token found in the database.")
-                return
-
-        # ✅ Check if media file exists
-        media_path = os.path.abspath(os.path.join(os.getcwd(), "static", content.media_url.lstrip("/")))
-        if not os.path.exists(media_path):
-            logger.error(f"❌ Media file not found: {media_path}")
+            post["access_token"] = request.session.get("tiktok_session", {}).get("access_token") or post["access_token"]
+
+        if not post["access_token"]:
+            raise PublishError(f"User {post['user_id']} is not authenticated with TikTok, and no access token found in the database.", transient=False)
+
+        # ✅ Check the media (media_url is /static/..., a key in the media storage backend).
+        # Pre-flight already validated ready rows; only confirm the file is still the same size.
+        media_key = resolve_media_key(post["media_url"])
+        if post["prepared_at"] is None:
+            await asyncio.to_thread(probe_video, media_key)
+        elif await asyncio.to_thread(stored_size, media_key) != post["media_size"]:
+            raise PublishError(f"Media file missing or changed since pre-flight: {media_key}", transient=False)
+
+        # ✅ Take the row into publishing atomically; anyone else already past this point wins
+        claim_token = post["claim_token"]
+        owned = await asyncio.to_thread(begin_publishing, content_id, claim_token, post["attempt_count"])
+        if not owned:
+            PUBLISH_RESULTS.inc(result="duplicate_skipped")
+            logger.warning(f"⚠️ Content ID {content_id} attempt {post['attempt_count'] + 1} already started elsewhere; skipping.")
             return
 
-        logger.info(f"📢 Posting Content ID {content_id}: {content.title}, Media: {content.media_url}")
+        logger.info(f"📢 Posting Content ID {content_id}: {post['title']}, Media: {post['media_url']}")
 
-        # ✅ Post to TikTok
-        url = "https://open.tiktokapis.com/v2/post/publish/creator_info/query/"
-        headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
-        data = {"video_url": content.media_url, "title": content.title}
+        # ✅ Upload the file to TikTok in chunks over the engine's shared, pooled client
+        publish_id = await upload_video(
+            publisher.client, post["access_token"], media_key, post["title"],
+            on_publish_id=lambda publish_id: asyncio.to_thread(store_publish_id, content_id, claim_token, publish_id),
+        )
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=data, headers=headers)
+        if post["scheduled_time"]:
+            PUBLISH_LAG_SECONDS.observe(max((datetime.utcnow() - post["scheduled_time"]).total_seconds(), 0))
+        logger.info(f"✅ Content ID {content_id} successfully posted to TikTok at {datetime.utcnow()} (publish_id={publish_id}).")
 
-        if response.status_code == 200:
-            logger.info(f"✅ Content ID {content_id} successfully posted to TikTok at {datetime.utcnow()}.")
+    except PublishError as e:
+        error = e
+        if e.auth_failed:
+            await refresh_rejected_token(post["user_id"])
+        if e.in_doubt:
+            # Don't retry blindly: the row stays in publishing until its status is reconciled
+            logger.warning(f"⚠️ Content ID {content_id} may have been published; leaving it for reconciliation: {e}")
         else:
-            logger.error(f"❌ Failed to post Content ID {content_id}. TikTok Response: {response.json()}")
-
+            logger.error(f"❌ Failed to post Content ID {content_id}: {e}")
     except Exception as e:
+        # Timeouts, dropped connections and anything unexpected get the retry budget
+        error = PublishError(f"{type(e).__name__}: {e}")
         logger.exception(f"❌ Error posting Content ID {content_id} to TikTok: {str(e)}")
-    finally:    
-        db.close()  # Close the session
-        logger.info(f"🛑 Database session closed for Content ID {content_id}")
+    finally:
+        # Failures before the row was taken into publishing still end the lease (e.g. missing media)
+        if (owned or error is not None) and not (error and error.in_doubt):
+            try:
+                await asyncio.to_thread(record_post_result, content_id, post["claim_token"], post["attempt_count"], error)
+            except Exception as e:
+                logger.exception(f"❌ Error recording result for Content ID {content_id}: {str(e)}")
 
-# ✅ Wrapper to make async function synchronous for APScheduler
+# ✅ Hand the post to the publishing engine; the scheduler thread returns immediately
 def sync_post_content_to_tiktok(content_id: int, request=None):
     logger.info(f"⏳ Executing scheduled TikTok post for Content ID {content_id} at {datetime.utcnow()}")
-    async_to_sync(post_content_to_tiktok)(content_id, request)
+    # Under a burst the executor threads queue here, so posts are admitted at the configured rate
+    admission.wait()
+    dispatch_due_batch([content_id])
+
+def lease_posts(content_ids, lease_seconds: int = None):
+    """
+    Move still-scheduled (or ready) rows to claimed under a fresh lease token and return
+    (token, ids it got). Anything else that fired the same post (another process
+    sharing the job store, a restarted dispatcher) finds the row claimed and skips it.
+    """
+    lease_seconds = lease_seconds or settings.CLAIM_LEASE_SECONDS
+    claim_token = new_claim_token()
+    db = SessionLocal()
+    try:
+        db.query(Content).filter(
+            Content.id.in_(content_ids),
+            Content.status.in_([ContentStatus.SCHEDULED, ContentStatus.READY, ContentStatus.RETRY]),
+        ).update(
+            {
+                Content.status: ContentStatus.CLAIMED,
+                Content.claimed_by: claim_token,
+                Content.lease_until: datetime.utcnow() + timedelta(seconds=lease_seconds),
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+        rows = db.query(Content.id).filter(
+            Content.id.in_(content_ids),
+            Content.claimed_by == claim_token,
+        ).all()
+        return claim_token, [row.id for row in rows]
+    finally:
+        db.close()
+
+def dispatch_due_batch(content_ids, claim_token: str = None):
+    """
+    Load a batch of due posts in one query and submit them to the publishing engine together.
+    Rows not already leased by the caller (claim mode) are leased here first.
+    """
+    logger.info(f"🚀 Dispatching {len(content_ids)} due post(s) at {datetime.utcnow()}")
+    if claim_token is None:
+        claim_token, leased = lease_posts(content_ids)
+        leased = set(leased)
+        skipped = [content_id for content_id in content_ids if content_id not in leased]
+        if skipped:
+            logger.warning(f"⚠️ Skipping post(s) already handled elsewhere: {skipped}")
+        content_ids = [content_id for content_id in content_ids if content_id in leased]
+        if not content_ids:
+            return
+    posts = load_post_contexts(content_ids)
+    for content_id in content_ids:
+        post = posts.get(content_id)
+        if post is None:
+            logger.error(f"❌ Content ID {content_id} not found in the database.")
+            continue
+        post["claim_token"] = claim_token
+        publisher.submit(post_content_to_tiktok, content_id, post, rate_key=post["openid"])
+
+dispatcher = DueContentDispatcher(
+    session_factory=SessionLocal,
+    dispatch_batch=dispatch_due_batch,
+    window=timedelta(minutes=settings.DISPATCH_WINDOW_MINUTES),
+    lookback=timedelta(seconds=JOB_MISFIRE_GRACE_TIME),
+)
+
+def claimable_branches(now: datetime):
+    """
+    The kinds of claimable row, each as (filter, order column) served by one index,
+    so every branch is an ordered index range scan rather than a filesort that would
+    lock every row it examined.
+    """
+    grace_start = now - timedelta(seconds=JOB_MISFIRE_GRACE_TIME)
+    # A smoothed post waits for its slot inside the user's tolerance window
+    smoothed_due = or_(Content.next_attempt_at.is_(None), Content.next_attempt_at <= now)
+    return [
+        # (status, scheduled_time)
+        (and_(Content.status == ContentStatus.SCHEDULED, Content.scheduled_time.between(grace_start, now), smoothed_due),
+         Content.scheduled_time),
+        (and_(Content.status == ContentStatus.READY, Content.scheduled_time.between(grace_start, now), smoothed_due),
+         Content.scheduled_time),
+        # (status, next_attempt_at)
+        (and_(Content.status == ContentStatus.RETRY, Content.next_attempt_at <= now), Content.next_attempt_at),
+        # Expired leases: the status prefix of either index; claimed rows are few (at most what is in flight)
+        (and_(Content.status == ContentStatus.CLAIMED, Content.lease_until < now), Content.lease_until),
+    ]
+
+def claim_due_posts(batch_size: int = None, lease_seconds: int = None):
+    """
+    Lease a batch of due posts to this worker and return (lease token, ids).
+
+    Rows are locked with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent workers
+    each get a disjoint batch instead of waiting on or double-firing the same rows.
+    Rows whose lease expired (worker died mid-batch) become claimable again.
+    Each kind of due row is read by its own indexed query; the earliest due of
+    all of them are leased and the rest are released at commit.
+    """
+    batch_size = batch_size or settings.CLAIM_BATCH_SIZE
+    lease_seconds = lease_seconds or settings.CLAIM_LEASE_SECONDS
+    claim_token = new_claim_token()
+    now = datetime.utcnow()
+
+    db = SessionLocal()
+    try:
+        candidates = []
+        for condition, order_column in claimable_branches(now):
+            candidates.extend(
+                db.query(Content.id, func.coalesce(Content.next_attempt_at, Content.scheduled_time, now).label("due_at"))
+                .filter(condition)
+                .order_by(order_column)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+        candidates.sort(key=lambda row: row.due_at)
+        content_ids = [row.id for row in candidates[:batch_size]]
+        if content_ids:
+            db.query(Content).filter(Content.id.in_(content_ids)).update(
+                {
+                    Content.status: ContentStatus.CLAIMED,
+                    Content.claimed_by: claim_token,
+                    Content.lease_until: now + timedelta(seconds=lease_seconds),
+                },
+                synchronize_session=False,
+            )
+        db.commit()
+        return claim_token, content_ids
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def claim_and_dispatch():
+    """
+    Poll job for claim mode: lease only as many due rows as this worker can start
+    before the next poll (free publishing slots, capped by the TikTok rate budget
+    and admission), and publish them as one batch. Rows left unclaimed stay
+    available to other workers instead of aging in this one's queue past their lease.
+    """
+    capacity = min(settings.CLAIM_BATCH_SIZE, publisher.free_capacity(settings.CLAIM_POLL_SECONDS))
+    if capacity <= 0:
+        return
+    admitted = admission.admit(capacity)
+    if not admitted:
+        return
+    claim_token, content_ids = claim_due_posts(batch_size=admitted)
+    admission.refund(admitted - len(content_ids))
+    if content_ids:
+        logger.info(f"🔒 {claim_token} claimed {len(content_ids)} due post(s)")
+        dispatch_due_batch(content_ids, claim_token)
+
+def smoothed_publish_time(content_id: int, scheduled_time: datetime, tolerance_seconds: int) -> datetime:
+    """
+    Deterministic slot for a post inside [scheduled_time, scheduled_time + tolerance].
+    Multiplicative hashing of the id spreads posts picked for the same round minute
+    evenly over the window, and a reschedule of the same post keeps its offset.
+    """
+    if not tolerance_seconds or tolerance_seconds <= 0:
+        return scheduled_time
+    fraction = ((content_id * 2654435761) & 0xFFFFFFFF) / 2 ** 32
+    return scheduled_time + timedelta(seconds=int(fraction * tolerance_seconds))
+
+def smooth_content_schedule(db: Session, content: Content) -> datetime:
+    """
+    Apply the owner's burst-smoothing window to a newly scheduled post and return
+    when it should actually run. The chosen scheduled_time is kept for display;
+    the spread-out slot goes in next_attempt_at, which every pickup path honours.
+    """
+    tolerance = db.query(User.publish_tolerance_seconds).filter(User.id == content.user_id).scalar()
+    if tolerance is None:
+        tolerance = settings.PUBLISH_SMOOTHING_SECONDS
+    # Windows saved before the cap existed are clamped here too
+    tolerance = min(tolerance, settings.PUBLISH_TOLERANCE_MAX_SECONDS)
+    run_at = smoothed_publish_time(content.id, content.scheduled_time, tolerance)
+    content.next_attempt_at = run_at if run_at != content.scheduled_time else None
+    db.commit()
+    return run_at
+
+def expand_due_series(series_ids=None) -> int:
+    """
+    Materialize the next occurrence(s) of recurring series that fall inside the
+    expansion window as Content rows, and schedule them like one-off posts.
+    Series rows are locked with SKIP LOCKED, so concurrent workers never expand
+    the same series; the (series_id, scheduled_time) unique key backs that up.
+    Each series expands in its own savepoint, so one failing series is logged and
+    skipped without holding back the rest. Returns the number of posts created.
+    """
+    now = datetime.utcnow()
+    horizon = now + timedelta(minutes=max(settings.SERIES_EXPANSION_WINDOW_MINUTES, settings.PREFLIGHT_LEAD_MINUTES))
+    db = SessionLocal()
+    try:
+        query = db.query(ContentSeries).filter(
+            ContentSeries.active.is_(True),
+            ContentSeries.next_occurrence_at <= horizon,
+        )
+        if series_ids:
+            query = query.filter(ContentSeries.id.in_(series_ids))
+        due_series = query.order_by(ContentSeries.next_occurrence_at).limit(settings.CLAIM_BATCH_SIZE).with_for_update(skip_locked=True).all()
+
+        created = []
+        for series in due_series:
+            series_id = series.id
+            try:
+                with db.begin_nested():
+                    occurrences = expand_series(db, series, horizon, now - timedelta(seconds=JOB_MISFIRE_GRACE_TIME))
+                created.extend(occurrences)
+            except IntegrityError as e:
+                logger.warning(f"⚠️ Occurrence of series {series_id} already expanded elsewhere: {e.orig}")
+            except Exception as e:
+                logger.exception(f"❌ Error expanding series {series_id}, skipping it this pass: {e}")
+        db.commit()
+
+        for content in created:
+            run_at = smooth_content_schedule(db, content)
+            schedule_content_post(content.id, run_at)
+        if created:
+            logger.info(f"🔁 Expanded {len(created)} occurrence(s) from {len(due_series)} recurring series.")
+        return len(created)
+    finally:
+        db.close()
+
+def schedule_retries(retries):
+    """
+    Queue (content_id, run_at) pairs for another attempt in the current scheduler mode.
+    Claim mode needs nothing: workers pick up retry rows once next_attempt_at passes.
+    """
+    if settings.SCHEDULER_MODE == "dispatcher":
+        for content_id, run_at in retries:
+            dispatcher.add(content_id, run_at)
+    elif settings.SCHEDULER_MODE != "claim":
+        template = post_job_state_template()
+        job_store.add_job_states(
+            [post_job_state(template, scheduler, content_id, run_at) for content_id, run_at in retries],
+            replace_existing=True,
+        )
+        if scheduler.running:
+            scheduler.wakeup()
+
+def redrive_dead_posts(db: Session, user_id: int, content_ids=None):
+    """
+    Send a user's dead-letter posts back for publishing with a fresh attempt budget.
+    Limited to `content_ids` when given. Returns the ids that were re-driven.
+    """
+    query = db.query(Content.id).filter(Content.user_id == user_id, Content.status == ContentStatus.DEAD)
+    if content_ids:
+        query = query.filter(Content.id.in_(content_ids))
+    redriven = [row.id for row in query.all()]
+    if not redriven:
+        return []
+
+    now = datetime.utcnow()
+    db.query(Content).filter(Content.id.in_(redriven), Content.status == ContentStatus.DEAD).update(
+        {
+            Content.status: ContentStatus.RETRY,
+            Content.attempt_count: 0,
+            Content.next_attempt_at: now,
+            Content.last_error: None,
+            # The attempt count restarts, so its publish keys do too; the old key would block attempt 1
+            Content.publish_key: None,
+            Content.publish_id: None,
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+    schedule_retries([(content_id, now) for content_id in redriven])
+    logger.info(f"♻️ Re-drove {len(redriven)} dead-letter post(s) for user {user_id}")
+    return redriven
+
+def release_expired_leases(batch_size: int = None) -> int:
+    """
+    Hand claimed rows whose lease ran out back as retries, for the jobs and dispatcher
+    modes. A row leased there waits in memory (rate limiter, publishing slots) and its
+    one-shot job or heap entry is already spent, so after a crash, a deploy or a
+    skipped duplicate nothing would pick it up again; claim mode re-claims them itself.
+    Those rows never reached begin_publishing, so the attempt count is kept.
+    Returns the rows released.
+    """
+    batch_size = batch_size or settings.CLAIM_BATCH_SIZE
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        expired = [
+            row.id
+            for row in db.query(Content.id)
+            .filter(Content.status == ContentStatus.CLAIMED, Content.lease_until < now)
+            .order_by(Content.lease_until)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        ]
+        if expired:
+            db.query(Content).filter(Content.id.in_(expired)).update(
+                {
+                    Content.status: ContentStatus.RETRY,
+                    Content.next_attempt_at: now,
+                    Content.claimed_by: None,
+                    Content.lease_until: None,
+                },
+                synchronize_session=False,
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    if not expired:
+        return 0
+
+    schedule_retries([(content_id, now) for content_id in expired])
+    logger.warning(f"⏰ Released {len(expired)} expired lease(s) for retry: {expired}")
+    return len(expired)
+
+async def fetch_publish_statuses(items):
+    """Publish statuses for [(content_id, access_token, publish_id)], concurrently. Failures map to None."""
+    async def fetch(content_id, access_token, publish_id):
+        try:
+            return content_id, await fetch_publish_status(publisher.client, access_token, publish_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not fetch publish status for Content ID {content_id}: {e}")
+            return content_id, None
+
+    return dict(await asyncio.gather(*(fetch(*item) for item in items)))
+
+def reconcile_stale_publishing(batch_size: int = None) -> int:
+    """
+    Settle rows left in publishing after their lease ran out (worker crash, or a
+    final chunk whose response was lost) from TikTok's publish status, so a post
+    that did go out is marked published instead of being posted again.
+    Returns the rows settled.
+    """
+    batch_size = batch_size or settings.CLAIM_BATCH_SIZE
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(
+                Content.id, Content.claimed_by, Content.attempt_count, Content.publish_id,
+                Content.publishing_started_at, TikTokAccount.access_token,
+            )
+            .outerjoin(TikTokAccount, TikTokAccount.user_id == Content.user_id)
+            .filter(Content.status == ContentStatus.PUBLISHING, Content.lease_until < now)
+            .limit(batch_size)
+            .all()
+        )
+    finally:
+        db.close()
+    if not rows:
+        return 0
+
+    to_check = [(row.id, row.access_token, row.publish_id) for row in rows if row.publish_id and row.access_token]
+    statuses = publisher.call(fetch_publish_statuses, to_check).result(timeout=settings.PUBLISH_HTTP_TIMEOUT * 2) if to_check else {}
+
+    settled = 0
+    for row in rows:
+        status = statuses.get(row.id)
+        if not row.publish_id:
+            # TikTok never issued an upload, so nothing can have been published
+            error = PublishError("Publishing was interrupted before the upload started")
+        elif status in ("PUBLISH_COMPLETE", "SEND_TO_USER_INBOX"):
+            error = None
+        elif status == "FAILED":
+            error = PublishError(f"TikTok reported publish_id {row.publish_id} as failed")
+        elif status == "PROCESSING_UPLOAD" and row.publishing_started_at < now - UPLOAD_URL_TTL:
+            # The upload URL has expired, so the abandoned upload can no longer complete
+            error = PublishError(f"Upload for publish_id {row.publish_id} was abandoned")
+        else:
+            continue  # Still processing at TikTok, or status unknown; check again next pass
+        record_post_result(row.id, row.claimed_by, row.attempt_count, error)
+        settled += 1
+
+    logger.info(f"🧾 Reconciled {settled}/{len(rows)} post(s) stuck in publishing.")
+    return settled
+
+def content_job_id(content_id: int) -> str:
+    return f"{JOB_ID_PREFIX}{content_id}"
 
 # ✅ Function to start the scheduler
 def start_scheduler():
-    """Start the APScheduler background scheduler."""
+    """Start the APScheduler background scheduler and restore any missing post jobs."""
     if not scheduler.running:
         logger.info("🟢 Starting APScheduler...")
+        publisher.start()
         scheduler.start()
+        start_preflight()
+        start_token_refresh()
+        scheduler.add_job(expand_due_series, "interval", seconds=settings.SERIES_EXPANSION_POLL_SECONDS,
+                          id="expand_series", jobstore="memory", replace_existing=True,
+                          next_run_time=datetime.now(scheduler.timezone))
+        scheduler.add_job(reconcile_stale_publishing, "interval", seconds=settings.PUBLISH_RECONCILE_SECONDS,
+                          id="reconcile_publishing", jobstore="memory", replace_existing=True)
+        if settings.SCHEDULER_MODE != "claim":
+            # Leases taken by jobs or the dispatcher are only ever retried through this sweep
+            scheduler.add_job(release_expired_leases, "interval", seconds=settings.PUBLISH_RECONCILE_SECONDS,
+                              id="release_expired_leases", jobstore="memory", replace_existing=True,
+                              next_run_time=datetime.now(scheduler.timezone))
+        if settings.SCHEDULER_MODE == "dispatcher":
+            start_dispatcher()
+            return
+        if settings.SCHEDULER_MODE == "claim":
+            start_claiming()
+            return
+        db = SessionLocal()
+        try:
+            rehydrate_scheduled_posts(db)
+        except Exception as e:
+            logger.exception(f"❌ Error rehydrating scheduled posts: {str(e)}")
+        finally:
+            db.close()
+        # Jobs enqueued by other processes (the web app) don't wake this scheduler; poll the store
+        scheduler.add_job(poll_job_store, "interval", seconds=settings.JOB_STORE_POLL_SECONDS,
+                          id="poll_job_store", jobstore="memory", replace_existing=True)
     else:
         logger.info("✅ APScheduler is already running.")
 
+def poll_job_store():
+    """No-op; running it makes the scheduler re-read due jobs from the database store."""
+
+def start_dispatcher():
+    """Run the rolling-window dispatcher instead of one date job per Content row."""
+    refill_seconds = settings.DISPATCH_REFILL_SECONDS
+    if dispatcher.window < timedelta(seconds=refill_seconds * 2):
+        logger.warning("⚠️ DISPATCH_WINDOW_MINUTES should span at least two refills; widening the window.")
+        dispatcher.window = timedelta(seconds=refill_seconds * 2)
+
+    # The tick runs every second; keep APScheduler's per-run log lines out of INFO
+    logging.getLogger("apscheduler.executors.default").setLevel(logging.WARNING)
+
+    dispatcher.refill()
+    scheduler.add_job(dispatcher.refill, "interval", seconds=refill_seconds,
+                      id="dispatcher_refill", jobstore="memory", replace_existing=True)
+    scheduler.add_job(dispatch_tick, "interval", seconds=settings.DISPATCH_TICK_SECONDS,
+                      id="dispatcher_tick", jobstore="memory", replace_existing=True)
+    logger.info(f"🪣 Dispatcher mode: {dispatcher.window} window, refill every {refill_seconds}s")
+
+def dispatch_tick():
+    """Dispatcher mode tick: publish due posts from the window, up to what admission allows."""
+    admitted = admission.admit()
+    if admitted == 0:
+        return
+    dispatched = dispatcher.dispatch_due(limit=admitted)
+    if admitted is not None:
+        admission.refund(admitted - dispatched)
+
+def start_claiming():
+    """Poll for due rows and lease them; safe to run in every process and on every node."""
+    logging.getLogger("apscheduler.executors.default").setLevel(logging.WARNING)
+    scheduler.add_job(claim_and_dispatch, "interval", seconds=settings.CLAIM_POLL_SECONDS,
+                      id="claim_due_posts", jobstore="memory", replace_existing=True)
+    logger.info(f"🔒 Claim mode: {WORKER_ID} polling every {settings.CLAIM_POLL_SECONDS}s")
+
+def start_preflight():
+    """Validate and hash media for posts coming due, PREFLIGHT_LEAD_MINUTES ahead of time."""
+    if settings.PREFLIGHT_LEAD_MINUTES <= 0:
+        return
+    scheduler.add_job(prepare_due_posts, "interval", seconds=settings.PREFLIGHT_POLL_SECONDS,
+                      id="preflight", jobstore="memory", replace_existing=True,
+                      next_run_time=datetime.now(scheduler.timezone))
+    logger.info(f"🧪 Pre-flight: preparing posts {settings.PREFLIGHT_LEAD_MINUTES} min ahead, every {settings.PREFLIGHT_POLL_SECONDS}s")
+
+def start_token_refresh():
+    """Keep access tokens fresh for accounts with posts coming due, off the publish path."""
+    if not settings.TIKTOK_CLIENT_KEY:
+        logger.warning("⚠️ TIKTOK_CLIENT_KEY is not set; access tokens will not be refreshed.")
+        return
+    scheduler.add_job(refresh_due_tokens, "interval", seconds=settings.TOKEN_REFRESH_POLL_SECONDS,
+                      id="token_refresh", jobstore="memory", replace_existing=True,
+                      next_run_time=datetime.now(scheduler.timezone))
+    logger.info(f"🔑 Token refresh: accounts with posts due in {settings.TOKEN_REFRESH_WINDOW_MINUTES} min, every {settings.TOKEN_REFRESH_POLL_SECONDS}s")
+
+def stop_scheduler():
+    """Stop the scheduler, then let in-flight posts finish on the publishing engine."""
+    if scheduler.running:
+        logger.info("🛑 Stopping APScheduler...")
+        scheduler.shutdown()
+    publisher.stop()
+
+def post_job_state_template(target: BackgroundScheduler = scheduler) -> dict:
+    """Serialized state of a validated post job, used as a template for post_job_state()."""
+    now = datetime.utcnow()
+    return Job(
+        target,
+        id=content_job_id(0),
+        func=sync_post_content_to_tiktok,
+        trigger=DateTrigger(run_date=now, timezone=target.timezone),
+        executor="default",
+        args=(0,),
+        kwargs={},
+        name=sync_post_content_to_tiktok.__name__,
+        misfire_grace_time=JOB_MISFIRE_GRACE_TIME,
+        coalesce=True,
+        max_instances=1,
+        next_run_time=now,
+    ).__getstate__()
+
+def post_job_state(template: dict, target: BackgroundScheduler, content_id: int, run_date: datetime) -> dict:
+    trigger = DateTrigger(run_date=run_date, timezone=target.timezone)
+    return dict(
+        template,
+        id=content_job_id(content_id),
+        args=(content_id,),
+        trigger=trigger,
+        next_run_time=trigger.run_date,
+    )
+
+def rehydrate_scheduled_posts(db: Session, target: BackgroundScheduler = scheduler, jobstore_alias: str = "default") -> int:
+    """
+    Recreate jobs for future Content rows (and pending retries) that have no job in the job store.
+
+    Missing rows are found with one anti-join query and written with bulk
+    INSERTs, so startup cost does not grow with one add_job() round-trip per row.
+    The target scheduler must already be started. Returns the number of jobs created.
+    """
+    jobstore = target._lookup_jobstore(jobstore_alias)
+    jobs_t = jobstore.jobs_t
+    job_id = literal(JOB_ID_PREFIX, String).concat(cast(Content.id, String))
+    now = datetime.utcnow()
+
+    rows = (
+        db.query(Content.id, func.coalesce(Content.next_attempt_at, Content.scheduled_time))
+        .outerjoin(jobs_t, jobs_t.c.id == job_id)
+        .filter(
+            or_(
+                and_(Content.status.in_([ContentStatus.SCHEDULED, ContentStatus.READY]), Content.scheduled_time > now),
+                Content.status == ContentStatus.RETRY,
+            ),
+            jobs_t.c.id.is_(None),
+        )
+        .all()
+    )
+
+    if not rows:
+        logger.info("♻️ No scheduled post jobs to rehydrate.")
+        return 0
+
+    # Validate the job options once, then stamp out per-row states from the template
+    # instead of paying for Job() argument inspection on every row.
+    template = post_job_state_template(target)
+    states = [post_job_state(template, target, content_id, max(run_at, now)) for content_id, run_at in rows]
+
+    created = jobstore.add_job_states(states)
+    if created:
+        target.wakeup()
+    logger.info(f"♻️ Rehydrated {created} scheduled post job(s) from the contents table.")
+    return created
+
 # ✅ Function to schedule content posting
 def schedule_content_post(content_id: int, end_time: datetime, request=None):
-    """Schedules a job to post content at the specified end_time."""
+    """
+    Schedules a job to post content at the specified end_time.
+
+    The job is persisted in the database job store, so only picklable arguments
+    are stored; the request is not, and the access token is read from the
+    database at post time. A process that doesn't run the scheduler (the web app
+    when a separate worker publishes) writes the job straight to the store.
+    """
     try:
-        # ✅ Verify APScheduler is running before scheduling a job
-        if not scheduler.running:
-            logger.error("⚠️ APScheduler is NOT running. Attempting to start it...")
-            scheduler.start()
+        # ✅ In claim mode the committed row is the queue entry; workers will lease it when due
+        if settings.SCHEDULER_MODE == "claim":
+            logger.info(f"✅ Content ID {content_id} queued for claiming at {end_time}.")
+            return
+
+        # ✅ In dispatcher mode the window refill picks the row up; only track it if it is already due soon
+        if settings.SCHEDULER_MODE == "dispatcher":
+            dispatcher.add(content_id, end_time)
+            logger.info(f"✅ Content ID {content_id} queued for dispatch at {end_time}.")
+            return
 
-        # ✅ Remove existing job (if any) to prevent duplicates
-        job_id = f"content_post_{content_id}"
-        existing_job = scheduler.get_job(job_id)
-        if existing_job:
-            logger.warning(f"🔄 Rescheduling existing job {job_id}")
-            scheduler.remove_job(job_id)
+        # ✅ No scheduler in this process: enqueue for the worker through the shared job store
+        if not scheduler.running:
+            state = post_job_state(post_job_state_template(), scheduler, content_id, end_time)
+            job_store.add_job_states([state], replace_existing=True)
+            logger.info(f"✅ Content ID {content_id} enqueued for {end_time}.")
+            return
 
-        # ✅ Schedule the job
+        # ✅ Schedule the job, replacing any existing one to prevent duplicates
         scheduler.add_job(
             sync_post_content_to_tiktok,  # Wrapped function to make it sync
             'date',  # Runs at a specific time
             run_date=end_time,
-            args=[content_id, request],  # Pass content_id and request
-            id=job_id,  # Unique job ID
-            misfire_grace_time=3600,  # Allow retry if missed
+            args=[content_id],  # Pass content_id only, the job state is pickled
+            id=content_job_id(content_id),  # Unique job ID
+            replace_existing=True,
         )
         logger.info(f"✅ Content ID {content_id} scheduled for {end_time}.")
 
@@ -0,0 +1,74 @@
+import logging
+from datetime import datetime, timedelta
+from itertools import islice
+from dateutil.rrule import rrulestr
+from sqlalchemy.orm import Session
+from app.models.user import Content, ContentSeries
+from app.utils.media_store import add_media_refs
+
+logger = logging.getLogger(__name__)
+
+
+def parse_rrule(rule: str, dtstart: datetime):
+    """Parse an RRULE (with or without the "RRULE:" prefix). Raises ValueError if it is invalid."""
+    rule = rule.strip()
+    if rule.upper().startswith("RRULE:"):
+        rule = rule[6:]
+    if not rule:
+        raise ValueError("Empty recurrence rule")
+    return rrulestr(rule, dtstart=dtstart)
+
+
+def check_min_interval(rule: str, dtstart: datetime, min_interval: timedelta, sample: int = 50):
+    """
+    Raise ValueError when two of the rule's first `sample` occurrences are closer than
+    `min_interval`. This catches SECONDLY/MINUTELY rules as well as coarser ones
+    expanded with BYMINUTE/BYSECOND lists.
+    """
+    previous = None
+    for occurrence in islice(parse_rrule(rule, dtstart), sample):
+        if previous is not None and occurrence - previous < min_interval:
+            raise ValueError(f"Occurrences must be at least {int(min_interval.total_seconds() // 60)} minutes apart")
+        previous = occurrence
+
+
+def next_occurrence(rule: str, dtstart: datetime, after: datetime, inclusive: bool = False):
+    """First occurrence of the rule after `after` (or at it, if inclusive); None when the rule is exhausted."""
+    return parse_rrule(rule, dtstart).after(after, inc=inclusive)
+
+
+def expand_series(db: Session, series: ContentSeries, horizon: datetime, skip_before: datetime):
+    """
+    Turn the series' occurrences up to `horizon` into Content rows and advance
+    next_occurrence_at past them. Occurrences before `skip_before` (missed while
+    nothing was running) are skipped, like a misfired one-off post.
+    Returns the new Content rows; the caller commits.
+    """
+    rule = parse_rrule(series.rrule, series.dtstart)
+    created = []
+    occurrence = series.next_occurrence_at
+    while occurrence is not None and occurrence <= horizon:
+        if occurrence >= skip_before:
+            content = Content(
+                user_id=series.user_id,
+                platform=series.platform,
+                media_url=series.media_url,
+                title=series.title,
+                description=series.description,
+                tags=series.tags,
+                scheduled_time=occurrence,
+                series_id=series.id,
+            )
+            db.add(content)
+            created.append(content)
+        else:
+            logger.warning(f"⚠️ Skipping missed occurrence {occurrence} of series {series.id}")
+        occurrence = rule.after(occurrence)
+
+    # Each occurrence references the series' media, like any other post
+    add_media_refs(db, series.media_url, len(created))
+    series.next_occurrence_at = occurrence
+    if occurrence is None:
+        series.active = False
+        logger.info(f"🔚 Series {series.id} has no further occurrences.")
+    return created
@@ -0,0 +1,27 @@
+"""
+The logged-in user for a request, loaded once.
+
+The session user and their linked TikTok account come back in one joined query
+and are kept on request.state, so a route and its helpers share one load
+instead of querying User and TikTokAccount separately.
+"""
+from typing import Optional
+from fastapi import Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from app.models.user import User
+
+
+async def load_session_user(request: Request, db: AsyncSession) -> Optional[User]:
+    """The session's user with `tiktok_account` loaded, or None. Queried at most once per request."""
+    if hasattr(request.state, "session_user"):
+        return request.state.session_user
+
+    user = None
+    user_id = request.session.get("user_id")
+    if user_id:
+        user = await db.scalar(select(User).options(joinedload(User.tiktok_account)).where(User.id == user_id))
+    request.state.session_user = user
+    return user
+
@@ -0,0 +1,217 @@
+"""
+Media storage backends.
+
+Media is addressed by key: the path of its /static/ URL, e.g. "media/ab/cd/<sha>.mp4"
+for /static/media/ab/cd/<sha>.mp4 (or "uploads/clip.mp4" for files uploaded before
+the media store). The local backend keeps keys under static/, where they are served
+directly; the S3 backend keeps them in a bucket (AWS, or any S3-compatible server
+such as MinIO), so web and worker nodes no longer need to share a disk.
+
+Every backend streams: puts go from a file on disk, reads yield chunks and take
+an optional byte range, so memory per transfer stays bounded.
+"""
+import logging
+import os
+import posixpath
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from app.core.config import settings
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # Only needed for MEDIA_STORAGE_BACKEND=s3
+    boto3 = None
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 1024 * 1024
+STATIC_URL_PREFIX = "/static/"
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def url_to_key(url: str) -> str:
+    """Storage key of a /static/... media URL. Raises ValueError for anything else, or a path escaping static/."""
+    if not url or not url.startswith(STATIC_URL_PREFIX):
+        raise ValueError(f"Not a media URL: {url}")
+    key = posixpath.normpath(url[len(STATIC_URL_PREFIX):])
+    if key.startswith("..") or key.startswith("/") or key == ".":
+        raise ValueError(f"Media path escapes the static directory: {url}")
+    return key
+
+
+class MediaStorage(ABC):
+    """Backend interface. Missing keys raise FileNotFoundError."""
+
+    @abstractmethod
+    def put_file(self, key: str, path: str):
+        """Store the file at `path` under `key`. The local file may be moved."""
+
+    @abstractmethod
+    def iter_range(self, key: str, start: int = 0, end: int = None, chunk_size: int = READ_CHUNK_SIZE):
+        """Yield the bytes of [start, end) (to the end of the object when end is None) in chunks."""
+
+    @abstractmethod
+    def size(self, key: str) -> int:
+        """Size of the object in bytes."""
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.size(key)
+            return True
+        except FileNotFoundError:
+            return False
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str):
+        """Delete every key starting with `prefix` (a blob and its variants share one)."""
+
+    def local_path(self, key: str):
+        """Path of the object on this machine's disk, or None when it isn't stored locally."""
+        return None
+
+    def read_head(self, key: str, length: int) -> bytes:
+        return b"".join(self.iter_range(key, 0, length, chunk_size=length))
+
+
+class LocalStorage(MediaStorage):
+    def __init__(self, root: str = None):
+        self._root = root
+
+    @property
+    def root(self) -> str:
+        # Resolved per call, like the rest of the app's static paths, relative to the working directory
+        return self._root or os.path.join(os.getcwd(), "static")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def put_file(self, key: str, path: str):
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.replace(path, target)
+        except OSError:
+            # Staging on another filesystem: copy then swap in atomically
+            partial = f"{target}.part"
+            shutil.copyfile(path, partial)
+            os.replace(partial, target)
+            os.remove(path)
+
+    def iter_range(self, key: str, start: int = 0, end: int = None, chunk_size: int = READ_CHUNK_SIZE):
+        with open(self._path(key), "rb") as f:
+            f.seek(start)
+            remaining = None if end is None else end - start
+            while remaining is None or remaining > 0:
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self._path(key))
+
+    def delete_prefix(self, prefix: str):
+        directory, name_prefix = posixpath.split(prefix)
+        directory = self._path(directory) if directory else self.root
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if name.startswith(name_prefix) and os.path.isfile(os.path.join(directory, name)):
+                os.remove(os.path.join(directory, name))
+
+    def local_path(self, key: str):
+        return self._path(key)
+
+
+class S3Storage(MediaStorage):
+    """S3 or an S3-compatible server (set MEDIA_S3_ENDPOINT_URL for MinIO and friends)."""
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: str = None, region: str = None):
+        if boto3 is None:
+            raise RuntimeError("MEDIA_STORAGE_BACKEND=s3 needs boto3; install it with `pip install boto3`")
+        if not bucket:
+            raise RuntimeError("MEDIA_STORAGE_BACKEND=s3 needs MEDIA_S3_BUCKET")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        # Credentials come from the usual AWS environment variables / instance profile
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            config=BotoConfig(
+                max_pool_connections=settings.PUBLISH_HTTP_MAX_CONNECTIONS,
+                # Path-style addressing works with MinIO and other endpoints without wildcard DNS
+                s3={"addressing_style": "path" if endpoint_url else "auto"},
+            ),
+        )
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    @staticmethod
+    def _missing(error: "ClientError") -> bool:
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def put_file(self, key: str, path: str):
+        # upload_file streams from disk, switching to multipart for large files
+        self.client.upload_file(path, self.bucket, self._key(key))
+        os.remove(path)
+
+    def iter_range(self, key: str, start: int = 0, end: int = None, chunk_size: int = READ_CHUNK_SIZE):
+        if end is not None and end <= start:
+            return
+        byte_range = f"bytes={start}-{'' if end is None else end - 1}"
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(key), Range=byte_range)
+        except ClientError as e:
+            if self._missing(e):
+                raise FileNotFoundError(key) from e
+            raise
+        body = response["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def size(self, key: str) -> int:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))["ContentLength"]
+        except ClientError as e:
+            if self._missing(e):
+                raise FileNotFoundError(key) from e
+            raise
+
+    def delete_prefix(self, prefix: str):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            objects = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+            if objects:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": objects, "Quiet": True})
+
+
+def get_storage() -> MediaStorage:
+    """The configured backend, created once per process."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            backend = settings.MEDIA_STORAGE_BACKEND
+            if backend == "s3":
+                _storage = S3Storage(
+                    settings.MEDIA_S3_BUCKET,
+                    prefix=settings.MEDIA_S3_PREFIX,
+                    endpoint_url=settings.MEDIA_S3_ENDPOINT_URL,
+                    region=settings.MEDIA_S3_REGION,
+                )
+            elif backend == "local":
+                _storage = LocalStorage()
+            else:
+                raise RuntimeError(f"Unknown MEDIA_STORAGE_BACKEND {backend!r}; expected 'local' or 's3'")
+            logger.info(f"🗄️ Media storage backend: {backend}")
+        return _storage
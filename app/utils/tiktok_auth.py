@@ -0,0 +1,207 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+import httpx
+from sqlalchemy import and_, exists, or_
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.user import Content, ContentStatus, TikTokAccount
+from app.utils.metrics import TIKTOK_REQUEST_SECONDS
+from app.utils.publisher import publisher
+
+logger = logging.getLogger(__name__)
+
+TIKTOK_TOKEN_URL = "https://open.tiktokapis.com/v2/oauth/token/"
+
+
+class TokenRefreshError(Exception):
+    pass
+
+
+def token_fields(token_response: dict, now: datetime = None) -> dict:
+    """TikTokAccount column values from an OAuth token response (authorization_code or refresh_token grant)."""
+    now = now or datetime.utcnow()
+    fields = {
+        "access_token": token_response["access_token"],
+        "refresh_token": token_response.get("refresh_token"),
+    }
+    if token_response.get("expires_in"):
+        fields["access_token_expires_at"] = now + timedelta(seconds=int(token_response["expires_in"]))
+    if token_response.get("refresh_expires_in"):
+        fields["refresh_token_expires_at"] = now + timedelta(seconds=int(token_response["refresh_expires_in"]))
+    return fields
+
+
+async def refresh_access_token(client: httpx.AsyncClient, refresh_token: str) -> dict:
+    """Exchange a refresh token for a new access token. Returns the token response."""
+    with TIKTOK_REQUEST_SECONDS.time(endpoint="oauth_refresh"):
+        response = await client.post(
+            TIKTOK_TOKEN_URL,
+            data={
+                "client_key": settings.TIKTOK_CLIENT_KEY,
+                "client_secret": settings.TIKTOK_CLIENT_SECRET,
+                "grant_type": "refresh_token",
+                "refresh_token": refresh_token,
+            },
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+    data = response.json() if response.headers.get("Content-Type", "").startswith("application/json") else {}
+    if response.status_code != 200 or not data.get("access_token"):
+        raise TokenRefreshError(f"{response.status_code} {data.get('error') or ''} {data.get('error_description') or response.text[:200]}")
+    return data
+
+
+async def refresh_accounts(client: httpx.AsyncClient, accounts, concurrency: int) -> dict:
+    """
+    Refresh many accounts concurrently over one client. `accounts` is a list of
+    (account_id, refresh_token). Returns {account_id: token response or exception}.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def refresh(account_id, refresh_token):
+        async with semaphore:
+            try:
+                return account_id, await refresh_access_token(client, refresh_token)
+            except Exception as e:
+                return account_id, e
+
+    return dict(await asyncio.gather(*(refresh(account_id, token) for account_id, token in accounts)))
+
+
+def claim_accounts(db, query, now: datetime):
+    """
+    Lease the (id, refresh_token) rows `query` selects for refreshing and commit.
+    Rows are locked with SKIP LOCKED and skipped while another worker's lease runs,
+    so concurrent workers never spend the same refresh token twice.
+    """
+    rows = (
+        query.filter(or_(TikTokAccount.refreshing_until.is_(None), TikTokAccount.refreshing_until < now))
+        .limit(settings.TOKEN_REFRESH_BATCH_SIZE)
+        .with_for_update(skip_locked=True, of=TikTokAccount)
+        .all()
+    )
+    accounts = [(row.id, row.refresh_token) for row in rows]
+    if accounts:
+        db.query(TikTokAccount).filter(TikTokAccount.id.in_([account_id for account_id, _ in accounts])).update(
+            {TikTokAccount.refreshing_until: now + timedelta(seconds=settings.TOKEN_REFRESH_LEASE_SECONDS)},
+            synchronize_session=False,
+        )
+    db.commit()
+    return accounts
+
+
+def accounts_due_for_refresh(db, window: timedelta, now: datetime = None, user_ids=None):
+    """
+    Claim accounts with a post due inside `window` whose access token expires before
+    that window ends (plus the lease time, so a claimed post still has a valid token).
+    Limited to the accounts of `user_ids` when given. Returns [(account_id, refresh_token)].
+    """
+    now = now or datetime.utcnow()
+    horizon = now + window
+    expires_before = horizon + timedelta(seconds=settings.CLAIM_LEASE_SECONDS)
+    has_due_post = exists().where(
+        Content.user_id == TikTokAccount.user_id,
+        or_(
+            and_(
+                Content.status.in_([ContentStatus.SCHEDULED, ContentStatus.READY, ContentStatus.CLAIMED]),
+                Content.scheduled_time <= horizon,
+            ),
+            and_(Content.status == ContentStatus.RETRY, Content.next_attempt_at <= horizon),
+        ),
+    )
+    query = db.query(TikTokAccount.id, TikTokAccount.refresh_token).filter(
+        TikTokAccount.refresh_token.isnot(None),
+        or_(TikTokAccount.access_token_expires_at.is_(None), TikTokAccount.access_token_expires_at < expires_before),
+        or_(TikTokAccount.refresh_token_expires_at.is_(None), TikTokAccount.refresh_token_expires_at > now),
+        has_due_post,
+    )
+    if user_ids is not None:
+        query = query.filter(TikTokAccount.user_id.in_(user_ids))
+    return claim_accounts(db, query, now)
+
+
+def save_refreshed_tokens(db, results: dict, now: datetime = None) -> int:
+    """Store refresh results from refresh_accounts() and release the leases. Returns the accounts refreshed."""
+    now = now or datetime.utcnow()
+    refreshed = 0
+    for account_id, result in results.items():
+        values = {TikTokAccount.refreshing_until: None}
+        if isinstance(result, Exception):
+            # The current token stays in place; the next pass tries again
+            logger.warning(f"⚠️ TikTok token refresh failed for account {account_id}: {result}")
+        else:
+            fields = token_fields(result, now)
+            values.update({getattr(TikTokAccount, name): value for name, value in fields.items() if value is not None})
+            refreshed += 1
+        db.query(TikTokAccount).filter(TikTokAccount.id == account_id).update(values, synchronize_session=False)
+    db.commit()
+    return refreshed
+
+
+def refresh_due_tokens(window: timedelta = None, user_ids=None) -> int:
+    """
+    Background job: refresh access tokens ahead of the posts that need them, so the
+    publish path only ever reads a valid token. Refreshes run concurrently on the
+    publishing engine's loop and shared client. Pre-flight also calls it for the
+    owners of the posts it just prepared (`user_ids`). Returns the accounts refreshed.
+    """
+    window = window or timedelta(minutes=settings.TOKEN_REFRESH_WINDOW_MINUTES)
+    if user_ids is not None and not user_ids:
+        return 0
+    db = SessionLocal()
+    try:
+        accounts = accounts_due_for_refresh(db, window, user_ids=user_ids)
+        if not accounts:
+            return 0
+
+        try:
+            publisher.start()
+            future = publisher.call(refresh_accounts, publisher.client, accounts, settings.TOKEN_REFRESH_CONCURRENCY)
+            rounds = -(-len(accounts) // settings.TOKEN_REFRESH_CONCURRENCY)
+            results = future.result(timeout=settings.PUBLISH_HTTP_TIMEOUT * (rounds + 1))
+        except Exception:
+            # Release the leases so the next pass doesn't wait for them to lapse
+            db.query(TikTokAccount).filter(TikTokAccount.id.in_([account_id for account_id, _ in accounts])).update(
+                {TikTokAccount.refreshing_until: None}, synchronize_session=False,
+            )
+            db.commit()
+            raise
+
+        refreshed = save_refreshed_tokens(db, results)
+        logger.info(f"🔑 Refreshed {refreshed}/{len(accounts)} TikTok access token(s) ahead of due posts.")
+        return refreshed
+    finally:
+        db.close()
+
+
+def _claim_user_account(user_id: int):
+    db = SessionLocal()
+    try:
+        query = db.query(TikTokAccount.id, TikTokAccount.refresh_token).filter(
+            TikTokAccount.user_id == user_id,
+            TikTokAccount.refresh_token.isnot(None),
+        )
+        return claim_accounts(db, query, datetime.utcnow())
+    finally:
+        db.close()
+
+
+def _save_refreshed_tokens(results: dict) -> int:
+    db = SessionLocal()
+    try:
+        return save_refreshed_tokens(db, results)
+    finally:
+        db.close()
+
+
+async def refresh_user_token(client: httpx.AsyncClient, user_id: int) -> bool:
+    """
+    Refresh one user's access token right away, after TikTok rejected it. Runs on the
+    publishing loop; the DB work goes to threads. Returns False when it failed or another
+    worker already holds the refresh (the retry then reads whatever that worker stores).
+    """
+    accounts = await asyncio.to_thread(_claim_user_account, user_id)
+    if not accounts:
+        return False
+    results = await refresh_accounts(client, accounts, 1)
+    return await asyncio.to_thread(_save_refreshed_tokens, results) > 0
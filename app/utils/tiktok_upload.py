@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import mmap
+import os
+import posixpath
+import httpx
+from app.core.config import settings
+from app.utils.metrics import TIKTOK_REQUEST_SECONDS
+from app.utils.publisher import PublishError
+from app.utils.storage import MediaStorage, get_storage, url_to_key
+
+logger = logging.getLogger(__name__)
+
+TIKTOK_VIDEO_INIT_URL = "https://open.tiktokapis.com/v2/post/publish/video/init/"
+TIKTOK_PUBLISH_STATUS_URL = "https://open.tiktokapis.com/v2/post/publish/status/fetch/"
+
+# TikTok FILE_UPLOAD limits: chunks of 5-64 MB, files under 5 MB go up as one chunk,
+# and the last chunk absorbs the remainder (up to 128 MB)
+MIN_CHUNK_SIZE = 5 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+# Slice size handed to the HTTP client while streaming a chunk; bounds memory per upload
+STREAM_PIECE_SIZE = 256 * 1024
+
+# TikTok rejects videos over 4 GB
+MAX_VIDEO_SIZE = 4 * 1024 ** 3
+
+VIDEO_CONTENT_TYPES = {
+    ".mp4": "video/mp4",
+    ".mov": "video/quicktime",
+    ".webm": "video/webm",
+}
+
+# Error codes TikTok returns for an access token that has expired or been revoked
+AUTH_ERROR_CODES = {"access_token_invalid"}
+
+# ISO BMFF (mp4/mov) files open with a box whose type sits at bytes 4-8; WebM is EBML
+ISO_BMFF_BOX_TYPES = {b"ftyp", b"moov", b"mdat", b"wide", b"free", b"skip"}
+EBML_MAGIC = b"\x1a\x45\xdf\xa3"
+
+
+def resolve_media_key(media_url: str) -> str:
+    """Map a /static/... media URL to its storage key, refusing paths outside static/."""
+    try:
+        return url_to_key(media_url)
+    except ValueError as e:
+        raise PublishError(str(e), transient=False)
+
+
+def probe_video(media_key: str, storage: MediaStorage = None) -> int:
+    """
+    Cheap container check that the stored file is a video TikTok will accept.
+    Returns its size; raises a permanent PublishError when it can't be posted.
+    Only the first bytes are read, so this is cheap on remote storage too.
+    """
+    storage = storage or get_storage()
+    extension = posixpath.splitext(media_key)[1].lower()
+    if extension not in VIDEO_CONTENT_TYPES:
+        raise PublishError(f"Unsupported media type {extension or '(none)'}: {media_key}", transient=False)
+    try:
+        video_size = storage.size(media_key)
+    except FileNotFoundError:
+        raise PublishError(f"Media file not found: {media_key}", transient=False)
+
+    if video_size == 0 or video_size > MAX_VIDEO_SIZE:
+        raise PublishError(f"Media file size {video_size} is outside TikTok's limits: {media_key}", transient=False)
+
+    header = storage.read_head(media_key, 12)
+    if extension == ".webm":
+        valid = header.startswith(EBML_MAGIC)
+    else:
+        valid = header[4:8] in ISO_BMFF_BOX_TYPES
+    if not valid:
+        raise PublishError(f"Media file is not a valid {extension} container: {media_key}", transient=False)
+    return video_size
+
+
+def plan_chunks(video_size: int, chunk_size: int):
+    """Return (chunk_size, total_chunk_count) following TikTok's chunking rules."""
+    if video_size < MIN_CHUNK_SIZE:
+        return video_size, 1
+    chunk_size = max(MIN_CHUNK_SIZE, min(chunk_size, MAX_CHUNK_SIZE, video_size))
+    return chunk_size, video_size // chunk_size
+
+
+def chunk_bounds(index: int, video_size: int, chunk_size: int, total_chunks: int):
+    start = index * chunk_size
+    end = video_size if index == total_chunks - 1 else start + chunk_size
+    return start, end
+
+
+async def _iter_view(view: memoryview, start: int, end: int):
+    # Slices of the memory map are views, not copies; only the piece in flight is materialized
+    for offset in range(start, end, STREAM_PIECE_SIZE):
+        yield view[offset:min(offset + STREAM_PIECE_SIZE, end)]
+
+
+async def _iter_storage(storage: MediaStorage, media_key: str, start: int, end: int):
+    # Ranged read from remote storage; each blocking read runs off the event loop
+    pieces = storage.iter_range(media_key, start, end, STREAM_PIECE_SIZE)
+    try:
+        while (piece := await asyncio.to_thread(next, pieces, None)) is not None:
+            yield piece
+    finally:
+        pieces.close()
+
+
+def _raise_for_response(response: httpx.Response, action: str):
+    retry_after = response.headers.get("Retry-After")
+    error = {}
+    if response.headers.get("Content-Type", "").startswith("application/json"):
+        error = response.json().get("error", {})
+    # An expired or revoked access token is fixed by a refresh, so it is retried too
+    auth_failed = response.status_code == 401 or error.get("code") in AUTH_ERROR_CODES
+    transient = (response.status_code == 429 or response.status_code >= 500
+                 or error.get("code") == "rate_limit_exceeded" or auth_failed)
+    raise PublishError(
+        f"TikTok {action} responded {response.status_code}: {error.get('message') or response.text[:500]}",
+        transient=transient,
+        retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+        auth_failed=auth_failed,
+    )
+
+
+async def init_video_upload(client: httpx.AsyncClient, access_token: str, title: str, video_size: int,
+                            chunk_size: int, total_chunks: int):
+    """Start a FILE_UPLOAD direct post. Returns (publish_id, upload_url)."""
+    with TIKTOK_REQUEST_SECONDS.time(endpoint="video_init"):
+        response = await client.post(
+            TIKTOK_VIDEO_INIT_URL,
+            headers={"Authorization": f"Bearer {access_token}", "Content-Type": "application/json; charset=UTF-8"},
+            json={
+                "post_info": {"title": title or "", "privacy_level": settings.TIKTOK_PRIVACY_LEVEL},
+                "source_info": {
+                    "source": "FILE_UPLOAD",
+                    "video_size": video_size,
+                    "chunk_size": chunk_size,
+                    "total_chunk_count": total_chunks,
+                },
+            },
+        )
+    if response.status_code != 200:
+        _raise_for_response(response, "video init")
+    data = response.json().get("data", {})
+    return data["publish_id"], data["upload_url"]
+
+
+async def upload_chunk(client: httpx.AsyncClient, upload_url: str, read_range, start: int, end: int,
+                       video_size: int, content_type: str):
+    """
+    PUT one chunk, retrying only that chunk on transient failures so a dropped
+    connection doesn't restart the whole upload. `read_range(start, end)` returns
+    an async iterator over the chunk's bytes.
+
+    If the last chunk may have reached TikTok without us seeing the response, the
+    video may be published; the error is raised with in_doubt=True so the caller
+    settles it from the publish status instead of uploading again.
+    """
+    final = end == video_size
+    in_doubt = False
+    headers = {
+        "Content-Type": content_type,
+        "Content-Length": str(end - start),
+        "Content-Range": f"bytes {start}-{end - 1}/{video_size}",
+    }
+    attempts = settings.TIKTOK_CHUNK_MAX_RETRIES + 1
+    for attempt in range(1, attempts + 1):
+        try:
+            # A fresh generator per attempt re-reads the chunk from the mapping or storage
+            with TIKTOK_REQUEST_SECONDS.time(endpoint="video_chunk"):
+                response = await client.put(upload_url, headers=headers, content=read_range(start, end))
+            if response.status_code in (200, 201, 206):
+                return
+            _raise_for_response(response, "chunk upload")
+        except (PublishError, httpx.TransportError) as e:
+            transient = getattr(e, "transient", True)
+            # Connection never established means nothing was sent
+            in_doubt = in_doubt or (final and isinstance(e, httpx.TransportError)
+                                    and not isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)))
+            if not transient or attempt == attempts:
+                raise PublishError(f"Chunk {headers['Content-Range']} failed after {attempt} attempt(s): {e}",
+                                   transient=transient, in_doubt=in_doubt)
+            logger.warning(f"🔁 Retrying chunk {headers['Content-Range']} (attempt {attempt}): {e}")
+            await asyncio.sleep(min(2 ** attempt, 30))
+
+
+async def upload_video(client: httpx.AsyncClient, access_token: str, media_key: str, title: str,
+                       on_publish_id=None, storage: MediaStorage = None) -> str:
+    """
+    Publish a stored video through TikTok's chunked FILE_UPLOAD flow and return the publish_id.
+    A file on local disk is memory-mapped; anything else is read with ranged gets
+    per chunk. Either way it is streamed in fixed-size pieces, so memory stays
+    bounded however large the video is. `on_publish_id` is awaited with the
+    publish_id as soon as TikTok issues it, before any bytes are sent.
+    """
+    storage = storage or get_storage()
+    media_path = storage.local_path(media_key)
+    try:
+        video_size = os.path.getsize(media_path) if media_path else await asyncio.to_thread(storage.size, media_key)
+    except FileNotFoundError:
+        raise PublishError(f"Media file not found: {media_key}", transient=False)
+    if video_size == 0:
+        raise PublishError(f"Media file is empty: {media_key}", transient=False)
+    content_type = VIDEO_CONTENT_TYPES.get(posixpath.splitext(media_key)[1].lower(), "video/mp4")
+
+    chunk_size, total_chunks = plan_chunks(video_size, settings.TIKTOK_UPLOAD_CHUNK_SIZE)
+    publish_id, upload_url = await init_video_upload(client, access_token, title, video_size, chunk_size, total_chunks)
+    if on_publish_id:
+        await on_publish_id(publish_id)
+    logger.info(f"⬆️ Uploading {media_key} ({video_size} bytes) in {total_chunks} chunk(s), publish_id={publish_id}")
+
+    async def upload_chunks(read_range):
+        for index in range(total_chunks):
+            start, end = chunk_bounds(index, video_size, chunk_size, total_chunks)
+            await upload_chunk(client, upload_url, read_range, start, end, video_size, content_type)
+
+    if media_path is None:
+        await upload_chunks(lambda start, end: _iter_storage(storage, media_key, start, end))
+        return publish_id
+
+    with open(media_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            await upload_chunks(lambda start, end: _iter_view(view, start, end))
+        finally:
+            view.release()
+
+    return publish_id
+
+
+async def fetch_publish_status(client: httpx.AsyncClient, access_token: str, publish_id: str) -> str:
+    """TikTok's status for a publish_id, e.g. PROCESSING_UPLOAD, PUBLISH_COMPLETE or FAILED."""
+    with TIKTOK_REQUEST_SECONDS.time(endpoint="publish_status"):
+        response = await client.post(
+            TIKTOK_PUBLISH_STATUS_URL,
+            headers={"Authorization": f"Bearer {access_token}", "Content-Type": "application/json; charset=UTF-8"},
+            json={"publish_id": publish_id},
+        )
+    if response.status_code != 200:
+        _raise_for_response(response, "publish status")
+    return response.json().get("data", {}).get("status")
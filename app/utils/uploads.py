@@ -0,0 +1,213 @@
+import hashlib
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# Room for the multipart framing and text fields around the file itself
+MULTIPART_OVERHEAD = 1024 * 1024
+
+
+@dataclass
+class StoredUpload:
+    path: str
+    size: int
+    sha256: str
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Upload exceeds the {max_bytes // (1024 * 1024)} MB limit")
+
+
+def _write_chunk(file, digest, chunk: bytes):
+    digest.update(chunk)
+    file.write(chunk)
+
+
+@dataclass
+class StagedForm:
+    """A multipart form whose file part was written straight to the staging area."""
+    fields: dict
+    upload: StoredUpload
+    filename: str
+
+    def field(self, name: str) -> str:
+        value = self.fields.get(name)
+        if value is None:
+            raise HTTPException(status_code=422, detail=f"Missing form field: {name}")
+        return value
+
+    def discard(self):
+        """Remove the staged file unless it was already moved into storage."""
+        if os.path.exists(self.upload.path):
+            os.remove(self.upload.path)
+
+
+class _FormReceiver:
+    """python-multipart callbacks: text fields are buffered, the file part's bytes queued for writing."""
+
+    def __init__(self, file_field: str, max_bytes: int):
+        self.file_field = file_field
+        self.max_bytes = max_bytes
+        self.fields = {}
+        self.filename = None
+        self.file_size = 0
+        self.file_seen = False
+        self.pending = []  # File bytes parsed from the last body chunk, written off the loop
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._name = None
+        self._is_file = False
+        self._data = bytearray()
+        self._field_bytes = 0
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self):
+        self._disposition = b""
+        self._name = None
+        self._is_file = False
+        self._data = bytearray()
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if b"name" not in options:
+            raise HTTPException(status_code=400, detail='Multipart part without a "name"')
+        self._name = options[b"name"].decode("utf-8", errors="replace")
+        if b"filename" in options:
+            if self._name != self.file_field or self.file_seen:
+                raise HTTPException(status_code=400, detail=f"Unexpected file field: {self._name}")
+            self._is_file = True
+            self.file_seen = True
+            self.filename = options[b"filename"].decode("utf-8", errors="replace")
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        size = end - start
+        if self._is_file:
+            self.file_size += size
+            if self.file_size > self.max_bytes:
+                raise _too_large(self.max_bytes)
+            self.pending.append(data[start:end])
+        else:
+            # Text fields are small; the multipart overhead allowance bounds them
+            self._field_bytes += size
+            if self._field_bytes > MULTIPART_OVERHEAD:
+                raise HTTPException(status_code=413, detail="Form fields are too large")
+            self._data.extend(data[start:end])
+
+    def on_part_end(self):
+        if not self._is_file:
+            self.fields[self._name] = self._data.decode("utf-8", errors="replace")
+
+
+async def receive_form(request: Request, file_field: str, directory: str, max_bytes: int) -> StagedForm:
+    """
+    Parse a multipart request as its body arrives, writing the `file_field` part
+    straight into `directory` while hashing it. Unlike UploadFile, which spools to
+    a temporary file that would then be copied again, the bytes hit disk once.
+    The size limit is enforced while streaming, and the file only appears under
+    its final name once the body is complete, so a rejected or failed upload
+    leaves nothing behind. Callers discard() the form when they don't adopt the file.
+    """
+    content_type, params = parse_options_header(request.headers.get("Content-Type"))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data body")
+
+    await run_in_threadpool(os.makedirs, directory, exist_ok=True)
+    path = os.path.join(directory, uuid.uuid4().hex)
+    partial_path = f"{path}.part"
+    receiver = _FormReceiver(file_field, max_bytes)
+    parser = MultipartParser(params[b"boundary"], receiver.callbacks())
+    digest = hashlib.sha256()
+
+    file = await run_in_threadpool(open, partial_path, "wb")
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if receiver.pending:
+                data = b"".join(receiver.pending)
+                receiver.pending.clear()
+                await run_in_threadpool(_write_chunk, file, digest, data)
+        parser.finalize()
+        if not receiver.file_seen:
+            raise HTTPException(status_code=422, detail=f"Missing file field: {file_field}")
+        await run_in_threadpool(file.close)
+        await run_in_threadpool(os.replace, partial_path, path)
+    except BaseException:
+        await run_in_threadpool(file.close)
+        if os.path.exists(partial_path):
+            await run_in_threadpool(os.remove, partial_path)
+        raise
+
+    return StagedForm(
+        fields=receiver.fields,
+        upload=StoredUpload(path=path, size=receiver.file_size, sha256=digest.hexdigest()),
+        filename=receiver.filename,
+    )
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject oversized uploads before their body is read: on the Content-Length
+    header when present, otherwise as soon as the streamed body passes the limit.
+    `limits` maps path prefixes to a maximum body size in bytes.
+    """
+
+    def __init__(self, app, limits: dict):
+        self.app = app
+        self.limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            return await self.app(scope, receive, send)
+        limit = next((max_bytes for prefix, max_bytes in self.limits if scope["path"].startswith(prefix)), None)
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            logger.warning(f"⚠️ Rejected {content_length.decode()} byte upload to {scope['path']}")
+            response = JSONResponse({"detail": _too_large(limit).detail}, status_code=413)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside the body parse, which FastAPI passes through as-is
+                    raise _too_large(limit)
+            return message
+
+        return await self.app(scope, limited_receive, send)
@@ -0,0 +1,45 @@
+"""
+Standalone publisher process.
+
+Runs only the scheduler and the publishing pipeline from app.utils.scheduler,
+with its own connection pool (WORKER_DB_POOL_SIZE / WORKER_DB_MAX_OVERFLOW).
+Run the web app with RUN_SCHEDULER_IN_WEB=false so it only enqueues posts:
+
+    python -m app.worker
+"""
+import os
+
+# Must be set before app modules read Settings and build the engine
+os.environ.setdefault("PROCESS_ROLE", "worker")
+
+import logging
+import signal
+import threading
+from app.core.config import settings
+from app.utils.metrics import start_metrics_server
+from app.utils.scheduler import start_scheduler, stop_scheduler
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    stop = threading.Event()
+
+    def handle_signal(signum, frame):
+        logger.info(f"🛑 Received signal {signum}, shutting down worker...")
+        stop.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    logger.info(f"🟢 Starting publisher worker (mode={settings.SCHEDULER_MODE}, pool_size={settings.DB_POOL_SIZE})")
+    if settings.WORKER_METRICS_PORT:
+        start_metrics_server(settings.WORKER_METRICS_PORT)
+    start_scheduler()
+    stop.wait()
+    stop_scheduler()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Startup rehydration benchmark for the scheduler job store.
+
+Fills a throwaway SQLite database with N future Content rows and compares
+rehydrate_scheduled_posts() (one anti-join query + bulk INSERTs) against
+calling scheduler.add_job() once per row, which is what startup would cost
+without the bulk path.
+
+    python -m benchmarks.rehydrate --rows 100000 --baseline-rows 5000
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models.user import Content
+from app.utils.jobstore import BulkSQLAlchemyJobStore
+from app.utils.scheduler import content_job_id, rehydrate_scheduled_posts, sync_post_content_to_tiktok
+
+
+def make_database(path: str, rows: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    start = datetime.utcnow() + timedelta(days=1)
+    with engine.begin() as connection:
+        connection.execute(Content.__table__.insert(), [
+            {
+                "user_id": 1 + i % 500,
+                "platform": "tiktok",
+                "media_url": f"/static/uploads/video_{i}.mp4",
+                "title": f"Post {i}",
+                "scheduled_time": start + timedelta(seconds=i),
+            }
+            for i in range(rows)
+        ])
+    return engine
+
+
+def make_scheduler(engine):
+    target = BackgroundScheduler(jobstores={"default": BulkSQLAlchemyJobStore(engine=engine)})
+    target.start(paused=True)
+    return target
+
+
+def bench_bulk(engine, session_factory):
+    target = make_scheduler(engine)
+    db = session_factory()
+    try:
+        started = time.perf_counter()
+        created = rehydrate_scheduled_posts(db, target)
+        cold = time.perf_counter() - started
+
+        # Second startup: every row already has its job, only the anti-join runs
+        started = time.perf_counter()
+        rehydrate_scheduled_posts(db, target)
+        warm = time.perf_counter() - started
+    finally:
+        db.close()
+        target.shutdown(wait=False)
+    return created, cold, warm
+
+
+def bench_per_row(engine, session_factory, rows: int):
+    target = make_scheduler(engine)
+    target.remove_all_jobs()
+    db = session_factory()
+    try:
+        contents = db.query(Content.id, Content.scheduled_time).order_by(Content.id).limit(rows).all()
+    finally:
+        db.close()
+
+    started = time.perf_counter()
+    for content_id, scheduled_time in contents:
+        target.add_job(
+            sync_post_content_to_tiktok, "date",
+            run_date=scheduled_time, args=[content_id], id=content_job_id(content_id),
+        )
+    elapsed = time.perf_counter() - started
+    target.shutdown(wait=False)
+    return len(contents), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="future Content rows to rehydrate")
+    parser.add_argument("--baseline-rows", type=int, default=5_000, help="rows to add one by one for the baseline")
+    args = parser.parse_args()
+    logging.getLogger("apscheduler").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_database(os.path.join(tmp, "bench.db"), args.rows)
+        session_factory = sessionmaker(bind=engine)
+
+        created, cold, warm = bench_bulk(engine, session_factory)
+        print(f"bulk rehydrate : {created} jobs in {cold:.2f}s ({created / cold:,.0f} jobs/s)")
+        print(f"warm restart   : anti-join over {args.rows} rows in {warm * 1000:.1f}ms, 0 jobs created")
+
+        baseline_rows, elapsed = bench_per_row(engine, session_factory, args.baseline_rows)
+        per_job = elapsed / max(baseline_rows, 1)
+        print(f"per-row add_job: {baseline_rows} jobs in {elapsed:.2f}s ({baseline_rows / elapsed:,.0f} jobs/s)")
+        print(f"                 extrapolated to {args.rows} rows: {per_job * args.rows:.1f}s")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
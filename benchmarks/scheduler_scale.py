@@ -0,0 +1,277 @@
+"""
+Scheduler scale benchmark: N scheduled posts, no network.
+
+Points the app's session factory and job store at a throwaway SQLite database
+filled with N Content rows, and publishing at an httpx.MockTransport standing
+in for TikTok. Reports:
+
+  - schedule_content_post() cost per post, for first adds and reschedules,
+    with the scheduler running and in enqueue-only (web without scheduler) mode
+  - in-process memory per pending post for an in-memory APScheduler job store
+    and for the dispatcher's heap
+  - dispatch latency (due time to the TikTok init call) and posts/sec when
+    --publish-rows posts all come due at once, in claim or dispatcher mode
+
+    python -m benchmarks.scheduler_scale --rows 100000 --publish-rows 10000 --mode claim
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import httpx
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import create_engine, func
+
+from app.core.database import Base, SessionLocal
+from app.models.user import Content, ContentStatus, TikTokAccount, User
+from app.utils import scheduler as scheduler_module
+from app.utils.dispatcher import DueContentDispatcher
+from app.utils.publisher import publisher
+from app.utils.rate_limiter import AdmissionGate
+
+MEDIA_URL = "/static/uploads/bench.mp4"
+
+
+def make_database(path: str, rows: int, accounts: int):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    start = datetime.utcnow() + timedelta(days=1)
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {"id": user_id, "email": f"user{user_id}@example.com"} for user_id in range(1, accounts + 1)
+        ])
+        connection.execute(TikTokAccount.__table__.insert(), [
+            {"user_id": user_id, "openid": f"openid-{user_id}", "username": f"user{user_id}", "access_token": f"token-{user_id}"}
+            for user_id in range(1, accounts + 1)
+        ])
+        connection.execute(Content.__table__.insert(), [
+            {
+                "user_id": 1 + i % accounts,
+                "platform": "tiktok",
+                "media_url": MEDIA_URL,
+                "title": f"Post {i + 1}",
+                "scheduled_time": start + timedelta(seconds=i),
+            }
+            for i in range(rows)
+        ])
+    return engine
+
+
+def make_media(root: str, size: int = 64 * 1024):
+    path = os.path.join(root, MEDIA_URL.lstrip("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\x00\x00\x00\x18ftypmp42" + b"\x00" * (size - 12))
+
+
+def use_database(engine):
+    """Bind the app's sessions and job store to the benchmark database."""
+    SessionLocal.configure(bind=engine)
+    scheduler_module.job_store.engine = engine
+
+
+def load_schedule(limit: int):
+    db = SessionLocal()
+    try:
+        return db.query(Content.id, Content.scheduled_time).order_by(Content.id).limit(limit).all()
+    finally:
+        db.close()
+
+
+def time_calls(contents, shift: timedelta):
+    started = time.perf_counter()
+    for content_id, scheduled_time in contents:
+        scheduler_module.schedule_content_post(content_id, scheduled_time + shift)
+    return time.perf_counter() - started
+
+
+def bench_add(rows: int):
+    """schedule_content_post() cost in jobs mode, with and without a running scheduler."""
+    scheduler_module.settings.SCHEDULER_MODE = "jobs"
+    contents = load_schedule(rows)
+    results = {}
+
+    # Web process without a scheduler: job state written straight to the store
+    results["enqueue add"] = time_calls(contents, timedelta(0))
+    results["enqueue reschedule"] = time_calls(contents, timedelta(minutes=5))
+    with scheduler_module.job_store.engine.begin() as connection:
+        connection.execute(scheduler_module.job_store.jobs_t.delete())
+
+    # Scheduler running (paused so nothing fires): add_job() per post
+    scheduler_module.scheduler.start(paused=True)
+    try:
+        results["add_job add"] = time_calls(contents, timedelta(0))
+        results["add_job reschedule"] = time_calls(contents, timedelta(minutes=5))
+    finally:
+        scheduler_module.scheduler.shutdown(wait=False)
+    return len(contents), results
+
+
+def measure_memory(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    holder = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return holder, allocated
+
+
+def bench_memory(rows: int):
+    """Bytes held in-process per pending post by an in-memory job store and by the dispatcher heap."""
+    contents = load_schedule(rows)
+
+    def build_memory_store():
+        target = BackgroundScheduler(jobstores={"default": MemoryJobStore()})
+        target.start(paused=True)
+        for content_id, scheduled_time in contents:
+            target.add_job(
+                scheduler_module.sync_post_content_to_tiktok, "date",
+                run_date=scheduled_time, args=[content_id], id=scheduler_module.content_job_id(content_id),
+            )
+        return target
+
+    target, memory_store = measure_memory(build_memory_store)
+    target.shutdown(wait=False)
+
+    def build_dispatcher():
+        heap = DueContentDispatcher(SessionLocal, lambda ids: None, window=timedelta(days=365), lookback=timedelta(0))
+        heap.refill()
+        return heap
+
+    heap, dispatcher_heap = measure_memory(build_dispatcher)
+    return {"memory job store": (len(contents), memory_store), "dispatcher heap": (len(heap), dispatcher_heap)}
+
+
+def make_transport(latency: float, init_times: dict):
+    async def handler(request: httpx.Request):
+        if latency:
+            await asyncio.sleep(latency)
+        if request.method == "POST":
+            title = json.loads(request.content)["post_info"]["title"]
+            init_times[int(title.split()[-1])] = datetime.utcnow()
+            return httpx.Response(200, json={
+                "data": {"publish_id": f"v_pub_{title.split()[-1]}", "upload_url": "https://upload.example/video"},
+                "error": {"code": "ok"},
+            })
+        await request.aread()
+        return httpx.Response(201)
+
+    return httpx.MockTransport(handler)
+
+
+def count_finished():
+    db = SessionLocal()
+    try:
+        return db.query(func.count(Content.id)).filter(
+            Content.status.in_([ContentStatus.PUBLISHED, ContentStatus.RETRY, ContentStatus.DEAD])
+        ).scalar()
+    finally:
+        db.close()
+
+
+def bench_publish(rows: int, mode: str, latency: float, paced: bool, timeout: float, admission_rate: float = 0):
+    """Make `rows` posts due now and publish them all through the engine against the mock."""
+    due_at = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        ids = [row.id for row in db.query(Content.id).order_by(Content.id).limit(rows)]
+        db.query(Content).filter(Content.id.in_(ids)).update(
+            {Content.scheduled_time: due_at, Content.status: ContentStatus.SCHEDULED}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    init_times = {}
+    publisher.transport = make_transport(latency, init_times)
+    if not paced:
+        publisher.rate_limiter = None
+    scheduler_module.admission = AdmissionGate(admission_rate, admission_rate)
+    publisher.start()
+
+    started = time.perf_counter()
+    deadline = started + timeout
+    dispatcher = scheduler_module.dispatcher
+    dispatcher.lookback = timedelta(minutes=1)
+    finished = 0
+    try:
+        while finished < len(ids) and time.perf_counter() < deadline:
+            if mode == "claim":
+                scheduler_module.claim_and_dispatch()
+            else:
+                dispatcher.refill()
+                scheduler_module.dispatch_tick()
+            time.sleep(0.05)
+            finished = count_finished()
+        elapsed = time.perf_counter() - started
+    finally:
+        publisher.stop()
+
+    lags = sorted((init_times[content_id] - due_at).total_seconds() for content_id in init_times)
+    return finished, elapsed, lags
+
+
+def percentile(values, fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="Content rows in the database")
+    parser.add_argument("--add-rows", type=int, default=10_000, help="posts to add and reschedule one by one")
+    parser.add_argument("--memory-rows", type=int, default=100_000, help="pending posts to hold in memory")
+    parser.add_argument("--publish-rows", type=int, default=10_000, help="posts made due at once and published")
+    parser.add_argument("--accounts", type=int, default=1_000, help="TikTok accounts the posts are spread over")
+    parser.add_argument("--mode", choices=["claim", "dispatcher"], default="claim", help="how due posts are picked up")
+    parser.add_argument("--latency-ms", type=float, default=0, help="simulated TikTok response time")
+    parser.add_argument("--paced", action="store_true", help="keep the per-account/global rate limiter on")
+    parser.add_argument("--admission-rate", type=float, default=0, help="posts/sec admitted into publishing (0 = unbounded)")
+    parser.add_argument("--timeout", type=float, default=600, help="give up publishing after this many seconds")
+    args = parser.parse_args()
+    logging.getLogger("apscheduler").setLevel(logging.WARNING)
+    logging.getLogger("app").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # Media URLs resolve against the working directory
+        os.chdir(tmp)
+        try:
+            engine = make_database(os.path.join(tmp, "bench.db"), args.rows, args.accounts)
+            make_media(tmp)
+            use_database(engine)
+            print(f"database: {args.rows} posts over {args.accounts} accounts (SQLite)")
+
+            added, results = bench_add(min(args.add_rows, args.rows))
+            for name, elapsed in results.items():
+                print(f"{name:<20}: {added} posts in {elapsed:.2f}s ({elapsed / added * 1e6:,.0f} µs/post)")
+
+            for name, (count, allocated) in bench_memory(min(args.memory_rows, args.rows)).items():
+                print(f"{name:<20}: {count} posts, {allocated / 1024 ** 2:.1f} MiB ({allocated / max(count, 1):,.0f} B/post)")
+
+            finished, elapsed, lags = bench_publish(
+                min(args.publish_rows, args.rows), args.mode, args.latency_ms / 1000, args.paced, args.timeout,
+                args.admission_rate,
+            )
+            print(f"publish ({args.mode:<10}): {finished} posts in {elapsed:.2f}s ({finished / elapsed:,.0f} posts/s)")
+            if lags:
+                print(f"dispatch latency    : p50 {percentile(lags, 0.5):.3f}s  p95 {percentile(lags, 0.95):.3f}s  "
+                      f"p99 {percentile(lags, 0.99):.3f}s  max {lags[-1]:.3f}s  mean {statistics.fmean(lags):.3f}s")
+            engine.dispose()
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,15 @@ export function initializeCalendar() {
       },
       events: async function (fetchInfo, successCallback, failureCallback) {
         try {
-          const response = await fetch("/dashboard/api/events");
+          // Only the visible range, so a load costs the events in view
+          const params = new URLSearchParams({
+            start: fetchInfo.startStr,
+            end: fetchInfo.endStr,
+          });
+          const response = await fetch(`/dashboard/api/events?${params}`);
+          if (!response.ok) {
+            throw new Error(`Events request failed: ${response.status}`);
+          }
           const data = await response.json();
 
           // Map events properly
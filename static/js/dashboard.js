@@ -41,8 +41,16 @@ document.addEventListener("DOMContentLoaded", function () {
         });
         const result = await response.json();
         if (result.success) {
-          // Update the profile image on the page
-          profileImg.src = result.newPhotoUrl;
+          // Update the profile image on the page: WebP source, JPEG fallback in the <img>
+          const webpSource = profileImg.parentElement.querySelector("source[type='image/webp']");
+          if (webpSource) webpSource.remove();
+          if (result.newPhotoFallbackUrl) {
+            const source = document.createElement("source");
+            source.type = "image/webp";
+            source.srcset = result.newPhotoUrl;
+            profileImg.before(source);
+          }
+          profileImg.src = result.newPhotoFallbackUrl || result.newPhotoUrl;
           alert("Profile photo updated successfully!");
         } else {
           alert("Failed to upload profile photo.");
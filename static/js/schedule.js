@@ -7,6 +7,9 @@ export function initializeSchedule() {
   const tagsInput = document.getElementById("tags");
   const endTimeInput = document.getElementById("end-time");
   let uploadedFile = null; // Store the uploaded file
+  let uploadChunkSize = 8 * 1024 * 1024; // Replaced by the server's suggested chunk size
+  const MAX_CHUNK_RETRIES = 5;
+  const scheduleButtonLabel = scheduleButton?.textContent;
   const accountSection = document.getElementById("tiktok-account-placeholder"); // TikTok account section
 
   console.log("initializeSchedule called"); // Debug log
@@ -106,14 +109,18 @@ export function initializeSchedule() {
       formData.append("title", title);
       formData.append("description", description);
       formData.append("tags", tags);
-      formData.append("image", uploadedFile);
       formData.append("start_time", startTime); // Append the dynamically set start-time
       formData.append("end_time", endTime); // Append the user-selected end-time
 
       console.log([...formData.entries()]); // Log form data
 
       try {
-        const response = await fetch("/dashboard/api/content-data/", {
+        // Send the file in resumable chunks, then create the post from the finished upload
+        scheduleButton.disabled = true;
+        const uploadId = await uploadResumable(uploadedFile, (sent, total) => {
+          scheduleButton.textContent = `Uploading ${Math.floor((sent / total) * 100)}%`;
+        });
+        const response = await fetch(`/dashboard/api/uploads/${uploadId}/finalize`, {
           method: "POST",
           body: formData,
         });
@@ -122,6 +129,7 @@ export function initializeSchedule() {
         console.log(result); // Log the entire response
 
         if (response.ok) {
+          forgetUpload(uploadedFile);
           alert("Content scheduled successfully!");
           titleInput.value = "";
           descriptionInput.value = "";
@@ -134,9 +142,89 @@ export function initializeSchedule() {
       } catch (error) {
         console.error("Error scheduling content:", error);
         alert("An error occurred while scheduling content.");
+      } finally {
+        scheduleButton.disabled = false;
+        scheduleButton.textContent = scheduleButtonLabel;
       }
     });
 
+    // Resumable upload: create once, PATCH slices at the server's offset, resume after failures
+    async function uploadResumable(file, onProgress) {
+      let uploadId = localStorage.getItem(uploadKey(file));
+      let offset = uploadId ? await fetchUploadOffset(uploadId) : null;
+
+      if (offset === null) {
+        const response = await fetch("/dashboard/api/uploads", {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({ filename: file.name, length: file.size }),
+        });
+        const result = await response.json();
+        if (!response.ok) {
+          throw new Error(result.detail || "Could not start the upload");
+        }
+        uploadId = result.upload_id;
+        uploadChunkSize = result.chunk_size || uploadChunkSize;
+        offset = 0;
+        localStorage.setItem(uploadKey(file), uploadId);
+      }
+
+      let failures = 0;
+      while (offset < file.size) {
+        onProgress(offset, file.size);
+        try {
+          const response = await fetch(`/dashboard/api/uploads/${uploadId}`, {
+            method: "PATCH",
+            headers: {
+              "Upload-Offset": String(offset),
+              "Content-Type": "application/offset+octet-stream",
+            },
+            body: file.slice(offset, offset + uploadChunkSize),
+          });
+          if (response.status === 404) {
+            // Expired or aborted on the server: start over
+            forgetUpload(file);
+            return uploadResumable(file, onProgress);
+          }
+          if (!response.ok && response.status !== 409) {
+            throw new Error(`Chunk upload failed with status ${response.status}`);
+          }
+          offset = Number(response.headers.get("Upload-Offset") ?? (await fetchUploadOffset(uploadId)));
+          failures = 0;
+        } catch (error) {
+          failures += 1;
+          if (failures > MAX_CHUNK_RETRIES) {
+            throw error;
+          }
+          console.warn(`Upload interrupted, resuming (attempt ${failures})`, error);
+          await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** failures));
+          const serverOffset = await fetchUploadOffset(uploadId).catch(() => null);
+          if (serverOffset !== null) {
+            offset = serverOffset;
+          }
+        }
+      }
+      onProgress(file.size, file.size);
+      return uploadId;
+    }
+
+    // Bytes the server already has, or null if the upload is unknown
+    async function fetchUploadOffset(uploadId) {
+      const response = await fetch(`/dashboard/api/uploads/${uploadId}`, { method: "HEAD" });
+      if (!response.ok) {
+        return null;
+      }
+      return Number(response.headers.get("Upload-Offset"));
+    }
+
+    function uploadKey(file) {
+      return `upload:${file.name}:${file.size}:${file.lastModified}`;
+    }
+
+    function forgetUpload(file) {
+      localStorage.removeItem(uploadKey(file));
+    }
+
     // Drag-and-Drop Handlers
     function handleDragOver(event) {
       event.preventDefault();
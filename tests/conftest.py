@@ -0,0 +1,66 @@
+"""
+Shared fixtures: every test gets its own SQLite database behind SessionLocal, so the
+scheduler and upload code run their real queries without a MySQL server.
+"""
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine
+from app.core.database import Base, SessionLocal
+from app.models.user import Content, ContentStatus, User
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    previous = SessionLocal.kw["bind"]
+    SessionLocal.configure(bind=engine)
+    yield engine
+    SessionLocal.configure(bind=previous)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(db_engine):
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def user(db):
+    user = User(id=1, email="creator@example.com")
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def make_content(db, user):
+    """Insert a post for the test user and return its id."""
+
+    def make(scheduled_time: datetime = None, status: str = ContentStatus.SCHEDULED, **columns) -> int:
+        content = Content(
+            user_id=user.id,
+            platform="tiktok",
+            media_url="/static/uploads/video.mp4",
+            title="Post",
+            scheduled_time=scheduled_time or datetime.utcnow(),
+            status=status,
+            **columns,
+        )
+        db.add(content)
+        db.commit()
+        return content.id
+
+    return make
+
+
+@pytest.fixture
+def retries(monkeypatch):
+    """(content_id, run_at) pairs handed to schedule_retries(), instead of touching the job store."""
+    from app.utils import scheduler
+
+    queued = []
+    monkeypatch.setattr(scheduler, "schedule_retries", queued.extend)
+    return queued
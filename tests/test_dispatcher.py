@@ -0,0 +1,25 @@
+"""The dispatcher's window refills."""
+from datetime import datetime, timedelta
+from app.core.database import SessionLocal
+from app.models.user import ContentStatus
+from app.utils.dispatcher import DueContentDispatcher
+
+
+def test_refill_loads_due_rows_retries_and_late_inserts(make_content):
+    now = datetime.utcnow()
+    batches = []
+    dispatcher = DueContentDispatcher(SessionLocal, batches.append, window=timedelta(minutes=10), lookback=timedelta(minutes=1))
+    scheduled = make_content(now + timedelta(minutes=1))
+    ready = make_content(now + timedelta(minutes=2), status=ContentStatus.READY)
+    make_content(now + timedelta(hours=1))  # Beyond the window
+    make_content(now, status=ContentStatus.PUBLISHED)
+    retry = make_content(now - timedelta(days=1), status=ContentStatus.RETRY, next_attempt_at=now + timedelta(minutes=3))
+
+    assert dispatcher.refill(now) == 3
+
+    # Inserted elsewhere for a time the first refill already covered
+    late = make_content(now + timedelta(minutes=4))
+    assert dispatcher.refill(now + timedelta(seconds=30)) == 1
+
+    assert dispatcher.dispatch_due(now + timedelta(minutes=10)) == 4
+    assert batches == [[scheduled, ready, retry, late]]
@@ -0,0 +1,101 @@
+"""Leasing, idempotent publish starts and dead-letter re-drive of scheduled posts."""
+import asyncio
+from datetime import datetime, timedelta
+from app.models.user import Content, ContentStatus
+from app.utils import scheduler
+from app.utils.publisher import PublishError
+
+
+def test_redriven_dead_post_can_publish_again(db, make_content, retries):
+    content_id = make_content()
+    claim_token, leased = scheduler.lease_posts([content_id])
+    assert leased == [content_id]
+    assert scheduler.begin_publishing(content_id, claim_token, 0)
+    scheduler.record_post_result(content_id, claim_token, 0, PublishError("Rejected", transient=False))
+    assert db.get(Content, content_id).status == ContentStatus.DEAD
+
+    assert scheduler.redrive_dead_posts(db, 1) == [content_id]
+    assert [content_id for content_id, _ in retries] == [content_id]
+
+    claim_token, leased = scheduler.lease_posts([content_id])
+    assert leased == [content_id]
+    assert scheduler.begin_publishing(content_id, claim_token, 0)
+    scheduler.record_post_result(content_id, claim_token, 0, None)
+    db.expire_all()
+    content = db.get(Content, content_id)
+    assert content.status == ContentStatus.PUBLISHED
+    assert content.publish_key == f"{content_id}-1"
+
+
+def expire_lease(db, content_id):
+    db.query(Content).filter(Content.id == content_id).update({Content.lease_until: datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+
+
+def test_expired_lease_is_released_for_retry(db, make_content, retries):
+    stale_id, live_id = make_content(), make_content()
+    stale_token, _ = scheduler.lease_posts([stale_id])
+    scheduler.lease_posts([live_id])
+    expire_lease(db, stale_id)
+
+    assert scheduler.release_expired_leases() == 1
+    assert [content_id for content_id, _ in retries] == [stale_id]
+    db.expire_all()
+    stale, live = db.get(Content, stale_id), db.get(Content, live_id)
+    assert (stale.status, stale.claimed_by, stale.attempt_count) == (ContentStatus.RETRY, None, 0)
+    assert live.status == ContentStatus.CLAIMED
+
+    # The old holder lost the row; whoever leases the retry publishes it
+    claim_token, leased = scheduler.lease_posts([stale_id])
+    assert leased == [stale_id]
+    assert not scheduler.begin_publishing(stale_id, stale_token, 0)
+    assert scheduler.begin_publishing(stale_id, claim_token, 0)
+
+
+def test_leased_post_is_not_leased_twice(make_content):
+    content_id = make_content()
+    _, first = scheduler.lease_posts([content_id])
+    _, second = scheduler.lease_posts([content_id])
+    assert (first, second) == ([content_id], [])
+
+
+def test_claim_mode_reclaims_expired_lease(db, make_content):
+    content_id = make_content(datetime.utcnow() - timedelta(seconds=5))
+    first_token, claimed = scheduler.claim_due_posts()
+    assert claimed == [content_id]
+    assert scheduler.claim_due_posts()[1] == []
+
+    expire_lease(db, content_id)
+    second_token, claimed = scheduler.claim_due_posts()
+    assert claimed == [content_id] and second_token != first_token
+    # The first worker's late result no longer applies to the row
+    assert scheduler.record_post_result(content_id, first_token, 0, PublishError("Timed out")) is None
+    db.expire_all()
+    assert db.get(Content, content_id).claimed_by == second_token
+
+
+def test_publish_starts_once_per_attempt(make_content):
+    content_id = make_content()
+    claim_token, _ = scheduler.lease_posts([content_id])
+    assert not scheduler.begin_publishing(content_id, "another-worker", 0)
+    assert scheduler.begin_publishing(content_id, claim_token, 0)
+    assert not scheduler.begin_publishing(content_id, claim_token, 0)
+
+
+def test_duplicate_post_is_skipped_without_a_result(db, make_content, monkeypatch):
+    content_id = make_content(media_size=100, prepared_at=datetime.utcnow())
+    claim_token, _ = scheduler.lease_posts([content_id])
+    monkeypatch.setattr(scheduler, "stored_size", lambda media_key: 100)
+    uploads, starts = [], []
+    monkeypatch.setattr(scheduler, "upload_video", lambda *args, **kwargs: uploads.append(args))
+    begin_publishing = scheduler.begin_publishing
+    monkeypatch.setattr(scheduler, "begin_publishing", lambda *args: starts.append(begin_publishing(*args)) or starts[-1])
+    post = scheduler.load_post_contexts([content_id])[content_id]
+    post.update(access_token="token", claim_token="stale-token")
+
+    asyncio.run(scheduler.post_content_to_tiktok(content_id, post))
+
+    assert (starts, uploads) == ([False], [])
+    db.expire_all()
+    content = db.get(Content, content_id)
+    assert (content.status, content.claimed_by, content.attempt_count) == (ContentStatus.CLAIMED, claim_token, 0)
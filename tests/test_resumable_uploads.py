@@ -0,0 +1,99 @@
+"""Offsets of resumable uploads under retried, out-of-order, interrupted and concurrent PATCHes."""
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from starlette.requests import ClientDisconnect
+from app.core.database import SessionLocal
+from app.models.user import UploadSession
+from app.utils import resumable_uploads
+
+
+@pytest.fixture
+def upload_id(db, user, tmp_path, monkeypatch):
+    monkeypatch.setattr(resumable_uploads, "RESUMABLE_DIR", str(tmp_path / "resumable"))
+    upload = UploadSession(
+        id="a" * 32, user_id=user.id, filename="video.mp4", length=10, offset=0,
+        expires_at=datetime.utcnow() + timedelta(hours=1),
+    )
+    resumable_uploads._create_staging_file(upload.id)
+    db.add(upload)
+    db.commit()
+    return upload.id
+
+
+async def body(*chunks, disconnect=False, before=None):
+    if before is not None:
+        await before.wait()
+    for chunk in chunks:
+        yield chunk
+        await asyncio.sleep(0)
+    if disconnect:
+        raise ClientDisconnect()
+
+
+def patch(upload_id: str, offset: int, chunks) -> int:
+    """One PATCH on its own session, like a request: load the upload, then append."""
+    async def run():
+        db = SessionLocal()
+        try:
+            upload = resumable_uploads.get_upload(db, upload_id, 1)
+            return await resumable_uploads.append_chunk(db, upload, offset, chunks)
+        finally:
+            db.close()
+
+    return run()
+
+
+def stored(upload_id: str):
+    db = SessionLocal()
+    try:
+        offset = db.get(UploadSession, upload_id).offset
+    finally:
+        db.close()
+    with open(resumable_uploads.staging_path(upload_id), "rb") as file:
+        return offset, file.read()
+
+
+def test_patches_in_order_append(upload_id):
+    assert asyncio.run(patch(upload_id, 0, body(b"abc", b"de"))) == 5
+    assert asyncio.run(patch(upload_id, 5, body(b"fghij"))) == 10
+    assert stored(upload_id) == (10, b"abcdefghij")
+
+
+def test_out_of_order_patch_is_rejected(upload_id):
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(patch(upload_id, 4, body(b"efg")))
+    assert raised.value.status_code == 409
+    assert stored(upload_id) == (0, b"")
+
+
+def test_interrupted_patch_keeps_what_arrived(upload_id):
+    assert asyncio.run(patch(upload_id, 0, body(b"abc", disconnect=True))) == 3
+    assert asyncio.run(patch(upload_id, 3, body(b"defghij"))) == 10
+    assert stored(upload_id) == (10, b"abcdefghij")
+
+
+def test_chunk_past_declared_length_is_rejected(upload_id):
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(patch(upload_id, 0, body(b"abcdef", b"ghijkl")))
+    assert raised.value.status_code == 413
+    assert stored(upload_id) == (0, b"")
+
+
+def test_concurrent_patches_at_one_offset_land_once(upload_id):
+    async def race():
+        go = asyncio.Event()
+        first = asyncio.ensure_future(patch(upload_id, 0, body(b"abcde", before=go)))
+        second = asyncio.ensure_future(patch(upload_id, 0, body(b"vwxyz", before=go)))
+        await asyncio.sleep(0.1)  # Both have checked the offset and are waiting on their bodies
+        go.set()
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    results = asyncio.run(race())
+    landed = [result for result in results if result == 5]
+    rejected = [result for result in results if isinstance(result, HTTPException)]
+    assert len(landed) == 1 and len(rejected) == 1
+    assert rejected[0].status_code == 409
+    offset, data = stored(upload_id)
+    assert offset == 5 and data in (b"abcde", b"vwxyz")